@@ -0,0 +1,273 @@
+""" This module is created by Martin Vasko.
+    Registry of analysers. Every analyser declares languages and extensions
+    of files it analyses, recipe of base image of new language, command,
+    result artifacts and parser of them. Built-in analysers are registered
+    together with plugins of entry point group secpo.analysers when registry
+    is used for the first time. Target is analysed by all analysers of its
+    languages and analysers that allow it run in parallel in one container.
+"""
+
+try:
+    from importlib import metadata
+except ImportError:
+    try:
+        import importlib_metadata as metadata
+    except ImportError:
+        metadata = None
+
+from secpo.result_parsers import BanditParser, CppcheckParser, \
+    EslintParser, PhanParser, ReekParser, ShellcheckParser
+
+
+class Analyser:
+    """
+    Declaration of analyser.
+    """
+    RUN = 'RUN '
+
+    def __init__(self, name, languages, command, artifacts=None, parser=None,
+                 extensions=None, recipe=None, parallel=True,
+                 incremental=False, shardable=False):
+        """
+        :param name: Unique name of analyser.
+        :param languages: Names of programming languages of analyser.
+        :param command: Shell command, {files} is replaced by analysed files.
+        :param artifacts: Result files relative to docker working directory.
+        :param parser: Class:`ResultParser` of artifacts.
+        :param extensions: Extensions of files of languages which are not
+                           known yet.
+        :param recipe: Recipe of base image of language which is not known
+                       yet. Dictionary with image, os_tools, specific_tools,
+                       other with WORKDIR command, analysis and tools.
+        :param parallel: Whether analyser can run together with others.
+        :param incremental: Whether analyser works on changed files only.
+        :param shardable: Whether results of file do not depend on other
+                          files, so files can be analysed in shards.
+        """
+        self.name = name
+        self.languages = list(languages)
+        self.command = command
+        self.artifacts = list(artifacts or [])
+        self.parser = parser
+        self.extensions = list(extensions or [])
+        self.recipe = recipe
+        self.parallel = parallel
+        self.incremental = incremental
+        self.shardable = shardable
+
+    def render(self, files):
+        """
+        :param files: Analysed files as single string.
+        :return: Shell command of analyser.
+        """
+        return self.command.format(files=files)
+
+    def __repr__(self):
+        return 'Analyser({!r})'.format(self.name)
+
+
+BUILTIN_ANALYSERS = [
+    Analyser('cppcheck', ['CL', 'CPP'],
+             'cppcheck --xml --enable=all --suppress=missingIncludeSystem '
+             '{files} 2> result.xml || true',
+             ['result.xml'], CppcheckParser, incremental=True,
+             shardable=True),
+    Analyser('phpstan', ['PHP'],
+             './vendor/phpstan/phpstan/phpstan analyse -l 8 {files} || true',
+             shardable=True),
+    Analyser('phan', ['PHP'],
+             './vendor/phan/phan/phan --allow-polyfill-parser -S '
+             '--analyze-twice -m text -o phan.txt {files} || true',
+             ['phan.txt'], PhanParser),
+    Analyser('shellcheck', ['SHELL'],
+             'shellcheck {files} > shellcheck.txt || true',
+             ['shellcheck.txt'], ShellcheckParser, shardable=True),
+    Analyser('jshint', ['JAVASCRIPT'], 'jshint . || true'),
+    Analyser('eslint', ['JAVASCRIPT'], 'npx eslint . > eslint.txt || true',
+             ['eslint.txt'], EslintParser),
+    Analyser('bandit', ['PYTHON'],
+             'bandit -f html -o bandit.html {files} || true',
+             ['bandit.html'], BanditParser, shardable=True),
+    Analyser('bandit2', ['PYTHON'],
+             'python2 -m bandit -f html -o bandit2.html {files} || true',
+             ['bandit2.html'], BanditParser, shardable=True),
+    Analyser('reek', ['RUBY'], 'reek -t -f html > reek.html || true',
+             ['reek.html'], ReekParser)]
+
+
+class AnalyserRegistry:
+    """
+    Analysers keyed by programming language. Plugins are loaded lazily from
+    entry points, plugin is Class:`Analyser`, list of them or callable
+    returning them.
+    """
+    ENTRY_POINT_GROUP = 'secpo.analysers'
+    RED_COLOR = '\033[91m{}\033[00m'
+    # Analysers started in background of one RUN instruction
+    PARALLEL_START = '({command}) & pids="$pids $!"'
+    PARALLEL_WAIT = 'status=0; for pid in $pids; do wait $pid || status=$?; ' \
+                    'done; exit $status'
+
+    def __init__(self, analysers=None, entry_points=True):
+        """ Initialize """
+        self._builtin = BUILTIN_ANALYSERS if analysers is None else analysers
+        self._entry_points = entry_points
+        self._analysers = None
+        self._languages = None
+
+    def entry_points(self):
+        """
+        :return: Entry points of group ENTRY_POINT_GROUP.
+        """
+        if not self._entry_points or metadata is None:
+            return []
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, 'select'):
+            return entry_points.select(group=self.ENTRY_POINT_GROUP)
+        # Dictionary of groups before Python 3.10
+        return entry_points.get(self.ENTRY_POINT_GROUP, [])
+
+    def _plugins(self):
+        plugins = []
+        for entry_point in self.entry_points():
+            try:
+                plugin = entry_point.load()
+                if callable(plugin) and not isinstance(plugin, Analyser):
+                    plugin = plugin()
+            except Exception as error:
+                print(self.RED_COLOR.format("Analyser plugin {} cannot be "
+                                            "loaded: {}".format(
+                                                    entry_point.name, error)))
+                continue
+            if isinstance(plugin, Analyser):
+                plugin = [plugin]
+            plugins += list(plugin)
+        return plugins
+
+    def load(self):
+        """
+        Register built-in analysers and plugins, only first call loads them.
+        """
+        if self._analysers is not None:
+            return
+        self._analysers = {}
+        self._languages = {}
+        for analyser in list(self._builtin) + self._plugins():
+            self.register(analyser)
+
+    def register(self, analyser):
+        """
+        Register analyser, analyser with the same name is replaced.
+        :param analyser: Class:`Analyser`.
+        """
+        self.load()
+        self._analysers[analyser.name] = analyser
+        for language in analyser.languages:
+            names = self._languages.setdefault(language, [])
+            if analyser.name not in names:
+                names.append(analyser.name)
+
+    def unregister(self, name):
+        """
+        Remove analyser from registry.
+        :param name: Name of analyser.
+        """
+        self.load()
+        self._analysers.pop(name, None)
+        for names in self._languages.values():
+            if name in names:
+                names.remove(name)
+        self._languages = {language: names for language, names
+                           in self._languages.items() if names}
+
+    def analysers(self, languages):
+        """
+        :param languages: Names of programming languages.
+        :return: List of Class:`Analyser` of all languages, every analyser
+                 only once.
+        """
+        self.load()
+        names = []
+        for language in languages:
+            names += self._languages.get(language, [])
+        return [self._analysers[name] for name in dict.fromkeys(names)]
+
+    def languages(self):
+        """
+        :return: Names of languages that have analyser.
+        """
+        self.load()
+        return list(self._languages)
+
+    def extensions(self, language):
+        """
+        :return: Extensions of language declared by analysers.
+        """
+        extensions = []
+        for analyser in self.analysers([language]):
+            extensions += analyser.extensions
+        return list(dict.fromkeys(extensions))
+
+    def recipe(self, language):
+        """
+        :return: Recipe of base image of language declared by analyser or
+                 None.
+        """
+        for analyser in self.analysers([language]):
+            if analyser.recipe:
+                return analyser.recipe
+        return None
+
+    def artifacts(self, languages):
+        """
+        :return: Result artifacts of all analysers of languages.
+        """
+        artifacts = []
+        for analyser in self.analysers(languages):
+            artifacts += analyser.artifacts
+        return list(dict.fromkeys(artifacts))
+
+    def has_parser(self, language):
+        return any(analyser.parser for analyser
+                   in self.analysers([language]))
+
+    def parse_results(self, language, result_directory):
+        """
+        Parse findings of result artifacts of all analysers of language.
+        :param language: Name of programming language.
+        :param result_directory: Directory with copied result artifacts.
+        :return: Generator of Class:`Finding`.
+        """
+        for analyser in self.analysers([language]):
+            if not analyser.parser:
+                continue
+            for artifact in analyser.artifacts:
+                file = result_directory / artifact
+                if file.is_file():
+                    for finding in analyser.parser().parse_file(file):
+                        yield finding
+
+    def commands(self, analysed):
+        """
+        Create RUN instructions of analysers. Analysers that allow it are
+        started at once in one instruction, others follow one by one.
+        :param analysed: List of tuples of Class:`Analyser` and its files.
+        :return: RUN instructions separated by new line.
+        """
+        parallel = [analyser.render(files) for analyser, files in analysed
+                    if analyser.parallel]
+        sequential = [analyser.render(files) for analyser, files in analysed
+                      if not analyser.parallel]
+        instructions = []
+        if len(parallel) > 1:
+            instructions.append(Analyser.RUN + 'pids=""; ' + '; '.join(
+                    self.PARALLEL_START.format(command=command)
+                    for command in parallel) + '; ' + self.PARALLEL_WAIT)
+        else:
+            sequential = parallel + sequential
+        instructions += [Analyser.RUN + command for command in sequential]
+        return '\n'.join(instructions)
+
+
+# Registry shared by all subsystems
+REGISTRY = AnalyserRegistry()
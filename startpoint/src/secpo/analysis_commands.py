@@ -1,12 +1,46 @@
 """ This module was created by Martin Vasko
-    Contains only runtime analysis commands that are utilized for docker.
+    Contains only runtime analysis commands that are utilized for docker and
+    vagrant. Commands of analysers and their result artifacts are declared
+    in analyser registry.
 """
-import enum
 
+from secpo.analyser_registry import REGISTRY
 
-class RunAnalysisCommands(enum.Enum):
-    PHP = 'RUN ./vendor/phpstan/phpstan/phpstan analyse -l 8 {files} ||true \n'\
-          'RUN ./vendor/phan/phan/phan --allow-polyfill-parser -S '\
-          '--analyze-twice -m text -o result.txt {files} || true'
-    SHELL = 'RUN shellcheck {files} > result.txt || true'
-    VAGRANT_CMD = 8*' ' + '{tool} {options} {files}\n'
+VAGRANT_CMD = 8*' ' + '{tool} {options} {files}\n'
+# Directory inside image where result artifacts are collected after analysis
+RESULTS_DIR = '/secpo/results'
+COLLECT_RESULTS = 'RUN rm -rf {results} && mkdir -p {results} && ' \
+                  'for artifact in {artifacts}; do if [ -f "$artifact" ]; ' \
+                  'then cp "$artifact" {results}/; fi; done'
+
+
+def analysis_commands(analysed):
+    """
+    Return RUN commands of analysers.
+    :param analysed: List of tuples of Class:`Analyser` and its files.
+    :return: RUN commands separated by new line.
+    """
+    return REGISTRY.commands(analysed)
+
+
+def result_artifacts(languages):
+    """
+    Return declared result artifacts of languages.
+    :param languages: Names of programming languages.
+    :return: List of artifacts, empty when no language declares them.
+    """
+    return REGISTRY.artifacts(languages)
+
+
+def collect_results_command(languages):
+    """
+    Return command that collects result artifacts of languages into
+    RESULTS_DIR, so they can be copied as one small archive.
+    :param languages: Names of programming languages.
+    :return: RUN command or empty string when no artifact is declared.
+    """
+    artifacts = result_artifacts(languages)
+    if not artifacts:
+        return ''
+    return COLLECT_RESULTS.format(results=RESULTS_DIR,
+                                  artifacts=' '.join(artifacts))
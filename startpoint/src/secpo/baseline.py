@@ -0,0 +1,264 @@
+""" This module is created by Martin Vasko.
+    Every run persists fingerprint index of findings of every target.
+    Fingerprint of baseline is created from tool, rule, normalized file and
+    normalized source line of finding, so it survives moved code. Findings
+    of current run are compared with index of chosen baseline run in one
+    pass and split into new, fixed and unchanged findings.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+
+from secpo.findings import Finding
+from secpo.path_operation import PathOperation
+from secpo.result_cache import ResultCache
+
+
+class SourceContext:
+    """
+    Reads normalized source lines of tested directory. Only lines of few
+    recently used files are kept in memory.
+    """
+    MAX_FILES = 8
+
+    def __init__(self, root):
+        """ Initialize """
+        self.root = Path(root)
+        self._files = OrderedDict()
+
+    def _lines(self, file):
+        if file in self._files:
+            self._files.move_to_end(file)
+            return self._files[file]
+        try:
+            with open(str(self.root / file), 'r', encoding='utf-8',
+                      errors='replace') as read_file:
+                lines = read_file.read().splitlines()
+        except OSError:
+            lines = []
+        self._files[file] = lines
+        if len(self._files) > self.MAX_FILES:
+            self._files.popitem(last=False)
+        return lines
+
+    def line(self, file, number):
+        """
+        :param file: File relative to tested directory.
+        :param number: Line number starting from one.
+        :return: Source line without whitespace or empty string.
+        """
+        if not file or number < 1:
+            return ''
+        lines = self._lines(file)
+        if number > len(lines):
+            return ''
+        return ''.join(lines[number - 1].split())
+
+
+def context_fingerprint(finding, context=None):
+    """
+    Fingerprint of finding that does not depend on line number. Code of
+    finding is used instead of line, message when code is not available.
+    :param finding: Class:`Finding`.
+    :param context: Class:`SourceContext` of tested directory.
+    :return: Hexadecimal fingerprint.
+    """
+    code = context.line(finding.file, finding.line) if context else ''
+    identity = '\0'.join([finding.tool, finding.rule, finding.file,
+                          code or finding.message])
+    return hashlib.sha256(identity.encode('utf-8')) \
+        .hexdigest()[:Finding.FINGERPRINT_LENGTH]
+
+
+class BaselineDiff:
+    """
+    Findings of target split by comparison with baseline.
+    """
+    def __init__(self):
+        """ Initialize """
+        self.new = 0
+        self.unchanged = 0
+        self.fixed = []
+
+    def add(self, other):
+        self.new += other.new
+        self.unchanged += other.unchanged
+        self.fixed += other.fixed
+
+
+class BaselineStore:
+    """
+    Fingerprint indexes of runs. Every run is directory with one JSON Lines
+    file per target. Only last runs are kept.
+    """
+    BASELINES_DIR = 'baselines'
+    INDEX_SUFFIX = '.jsonl'
+    TEMPORARY_SUFFIX = '.tmp'
+    RUN_ID_FORMAT = '%Y%m%d-%H%M%S'
+    BASELINE = 'baseline'
+    MAX_RUNS = 20
+    SUMMARY = "Run {run_id}: {new} new, {fixed} fixed, {unchanged} " \
+              "unchanged findings against baseline {baseline}."
+    RUN_SUMMARY = "Findings of run {run_id} are stored as baseline."
+
+    def __init__(self, directory=None, run_id=None, baseline=None):
+        """ Initialize """
+        if directory:
+            self.directory = Path(directory)
+        else:
+            self.directory = ResultCache.default_directory() / \
+                self.BASELINES_DIR
+        self.run_id = run_id or self.create_run_id()
+        self.baseline = baseline
+        self.diff = BaselineDiff()
+        self._lock = threading.Lock()
+
+    def create_run_id(self):
+        """
+        :return: Identifier of run created from current time which is not
+                 used by any stored run.
+        """
+        run_id = datetime.now().strftime(self.RUN_ID_FORMAT)
+        candidate = run_id
+        suffix = 0
+        while (self.directory / candidate).exists():
+            suffix += 1
+            candidate = '{}-{}'.format(run_id, suffix)
+        return candidate
+
+    def runs(self):
+        """
+        :return: Identifiers of stored runs from the oldest.
+        """
+        if not self.directory.is_dir():
+            return []
+        runs = [run for run in self.directory.iterdir() if run.is_dir()]
+        runs.sort(key=lambda run: run.stat().st_mtime)
+        return [run.name for run in runs]
+
+    def exists(self, run_id):
+        return (self.directory / run_id).is_dir()
+
+    def index_file(self, run_id, target):
+        """
+        :param run_id: Identifier of run.
+        :param target: Identifier of target.
+        :return: Path of fingerprint index of target in run.
+        """
+        name = hashlib.sha256(target.encode('utf-8')).hexdigest()[:32]
+        return self.directory / run_id / (name + self.INDEX_SUFFIX)
+
+    def load(self, run_id, target):
+        """
+        Load fingerprint index of target.
+        :return: Dictionary of fingerprint and list of findings.
+        """
+        index = {}
+        try:
+            with open(str(self.index_file(run_id, target)), 'r') as read_file:
+                for line in read_file:
+                    record = json.loads(line)
+                    index.setdefault(record.pop(self.BASELINE), []) \
+                        .append(Finding.from_dict(record))
+        except OSError:
+            pass
+        return index
+
+    @staticmethod
+    def target(path, key, roots=None):
+        """
+        Identifier of target does not depend on numbering of path
+        components, which changes when directories are added or removed.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param roots: Input directories of run, path is identified relative
+                      to the deepest one that contains it.
+        :return: Identifier of target.
+        """
+        path = Path(path).resolve()
+        resolved = [Path(root).resolve() for root in roots or []]
+        root = max([root for root in resolved
+                    if root == path or root in path.parents],
+                   key=lambda root: len(root.parts), default=path)
+        return '{}#{}#{}'.format(root, path.relative_to(root).as_posix(),
+                                 PathOperation.language(key))
+
+    def stage(self, findings, path, key, roots=None):
+        """
+        Streaming stage which stores findings of target in index of current
+        run. When baseline is chosen, only new findings are passed on.
+        :param findings: Iterable of Class:`Finding`.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param roots: Input directories of run.
+        :return: Generator of findings.
+        """
+        target = self.target(path, key, roots)
+        index_file = self.index_file(self.run_id, target)
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary = index_file.with_suffix(self.TEMPORARY_SUFFIX)
+        baseline = self.load(self.baseline, target) if self.baseline else None
+        context = SourceContext(path)
+        diff = BaselineDiff()
+        try:
+            with open(str(temporary), 'w') as write_file:
+                for finding in findings:
+                    fingerprint = context_fingerprint(finding, context)
+                    record = finding.to_dict()
+                    record[self.BASELINE] = fingerprint
+                    write_file.write(json.dumps(record, sort_keys=True) + '\n')
+                    if baseline is None:
+                        yield finding
+                    elif baseline.get(fingerprint):
+                        baseline[fingerprint].pop()
+                        diff.unchanged += 1
+                    else:
+                        diff.new += 1
+                        yield finding
+        except BaseException:
+            # Index of target is stored only when all findings are known
+            temporary.unlink()
+            raise
+        os.replace(str(temporary), str(index_file))
+        if baseline is not None:
+            diff.fixed = [finding for remaining in baseline.values()
+                          for finding in remaining]
+        with self._lock:
+            self.diff.add(diff)
+
+    @property
+    def new_findings(self):
+        """
+        :return: Number of new findings against baseline, zero without it.
+        """
+        return self.diff.new if self.baseline else 0
+
+    def prune(self):
+        """
+        Remove the oldest runs above limit, baseline of this run is kept.
+        """
+        runs = [run for run in self.runs()
+                if run not in [self.run_id, self.baseline]]
+        for run in runs[:max(len(runs) + 2 - self.MAX_RUNS, 0)]:
+            shutil.rmtree(str(self.directory / run), ignore_errors=True)
+
+    def summary(self):
+        """
+        Print comparison of run with baseline.
+        :return: Text of summary.
+        """
+        if self.baseline:
+            text = self.SUMMARY.format(run_id=self.run_id, new=self.diff.new,
+                                       fixed=len(self.diff.fixed),
+                                       unchanged=self.diff.unchanged,
+                                       baseline=self.baseline)
+        else:
+            text = self.RUN_SUMMARY.format(run_id=self.run_id)
+        print(text)
+        return text
@@ -0,0 +1,370 @@
+""" This module is created by Martin Vasko.
+    Batch analysis of many targets in one process. Targets are read from
+    JSON Lines manifest one by one, every target has path, languages and
+    options. Targets with identical content are analysed only once, all
+    targets share one scheduler, base images, warm containers and result
+    cache, and result of every target is written as JSON Lines record right
+    when the target finishes.
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+from pathlib import Path
+import threading
+
+from secpo.analyser_registry import REGISTRY
+from secpo.path_operation import PathOperation
+from secpo.pipeline_report import PipelineReport
+
+
+class BatchTarget:
+    """
+    Target of manifest.
+    """
+    # Options of run that can differ between targets and their types
+    OPTIONS = {'merge_groups': bool, 'incremental': bool, 'shards': int,
+               'shard_weight': str, 'result_filter': bool, 'no_cache': bool}
+
+    def __init__(self, identifier, path=None, languages=None, options=None,
+                 error=None):
+        """ Initialize """
+        self.id = identifier
+        self.path = path
+        self.languages = languages
+        self.options = options or {}
+        # Reason why target cannot be analysed
+        self.error = error
+
+    @classmethod
+    def parse(cls, line, number):
+        """
+        Parse line of manifest. Invalid line is turned into target with
+        error, so it is reported in output instead of stopping the batch.
+        :param line: JSON object with path and optional id, languages and
+                     options.
+        :param number: Line number of manifest, default identifier.
+        :return: Class:`BatchTarget`.
+        """
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            return cls(number, error="Invalid JSON: {}".format(error))
+        if not isinstance(record, dict):
+            return cls(number, error="Target has to be JSON object.")
+        identifier = record.get('id', number)
+        path = record.get('path')
+        if not isinstance(path, str) or not path:
+            return cls(identifier, error="Target has no path.")
+        languages = record.get('languages')
+        if languages is not None:
+            if not isinstance(languages, list) or \
+                    not all(isinstance(language, str)
+                            for language in languages):
+                return cls(identifier, path,
+                           error="Languages have to be list of names.")
+            languages = [language.upper() for language in languages]
+        options = {}
+        for name, value in (record.get('options') or {}).items():
+            name = name.replace('-', '_')
+            if name not in cls.OPTIONS:
+                return cls(identifier, path,
+                           error="Unknown option: {}".format(name))
+            if type(value) is not cls.OPTIONS[name]:
+                return cls(identifier, path,
+                           error="Option {} has to be {}.".format(
+                                   name, cls.OPTIONS[name].__name__))
+            options[name] = value
+        return cls(identifier, path, languages, options)
+
+    def record(self, state, **fields):
+        """
+        :param state: State of target.
+        :param fields: Other fields of record, e.g. findings.
+        :return: Output record of target.
+        """
+        record = {'id': self.id, 'path': self.path, 'state': state}
+        if self.error:
+            record['error'] = self.error
+        record.update(fields)
+        return record
+
+
+def target_digest(path_operation, cache, options):
+    """
+    Hash of content of target. Targets with the same analysed files in the
+    same layout, languages and options have the same hash regardless of
+    their location.
+    :param path_operation: Class:`PathOperation` with resolved containers.
+    :param cache: Class:`ResultCache` that creates keys of content.
+    :param options: Options of target.
+    :return: Hexadecimal digest and root directory of target.
+    """
+    components = path_operation.path_components
+    root = Path(os.path.commonpath([str(component[0])
+                                    for component in components.values()]))
+    configuration = json.dumps({'languages': sorted(components),
+                                'options': options}, sort_keys=True)
+    return cache.key(root, path_operation.analysed_files(root),
+                     configuration), root
+
+
+class FindingsCollector:
+    """
+    Collects normalized findings of one target in place of
+    Class:`FindingsExport`, so they are written in record of target.
+    """
+    enabled = True
+
+    def __init__(self, root):
+        """ Initialize """
+        self.root = root
+        self.findings = []
+        self._lock = threading.Lock()
+
+    def add(self, findings, target=None):
+        """
+        Collect findings of path component. It is safe to call from more
+        threads.
+        :param findings: Iterable of Class:`Finding`.
+        :param target: Tested directory of path component.
+        :return: Number of added findings.
+        """
+        directory = os.path.relpath(str(target), str(self.root)) \
+            if target is not None else os.curdir
+        records = []
+        for finding in findings:
+            record = finding.to_dict()
+            record['target'] = Path(directory).as_posix()
+            records.append(record)
+        self.collect(records)
+        return len(records)
+
+    def collect(self, records):
+        """
+        Keep records of findings until target finishes.
+        :param records: List of dictionaries of findings.
+        """
+        with self._lock:
+            self.findings += records
+
+    def close(self):
+        pass
+
+
+class BatchRunner:
+    """
+    Analyses targets of manifest by facades that share subsystems.
+    """
+    # State of target that cannot be analysed
+    ERROR = 'error'
+    # Targets that are prepared or analysed at once for every job slot
+    PENDING_PER_JOB = 2
+    PROGRESS = '[batch {finished}] {path} {state}'
+    SUMMARY = "Batch of {total} targets: {done} done, {cached} cached, " \
+              "{failed} failed, {errors} errors, {duplicates} duplicates."
+
+    def __init__(self, args, shared, facade_class, output):
+        """
+        :param args: Parsed command line arguments shared by targets.
+        :param shared: Class:`SharedSubsystems` of all targets.
+        :param facade_class: Class of facade of target, Class:`RunFacade`.
+        :param output: Text file where records of targets are written.
+        """
+        self.args = args
+        self.shared = shared
+        self.facade_class = facade_class
+        self.output = output
+        self.pending = shared.scheduler.jobs * self.PENDING_PER_JOB
+        # Identifier of target and future of its state by content hash
+        self._digests = {}
+        # States of finished targets
+        self.states = []
+        self.duplicates = 0
+
+    def target_args(self, target):
+        """
+        :param target: Class:`BatchTarget`.
+        :return: Command line arguments of target.
+        """
+        args = dict(vars(self.args), input=[target.path], coordinator=None,
+                    jsonl=None, sarif=None)
+        args.update(target.options)
+        return argparse.Namespace(**args)
+
+    def prepare(self, target):
+        """
+        Resolve path components of target and hash its content.
+        :param target: Class:`BatchTarget`.
+        :return: Class:`PathOperation`, digest and root directory.
+        """
+        if not Path(target.path).exists():
+            raise ValueError("Path {} does not exist.".format(target.path))
+        path_operation = PathOperation(self.target_args(target))
+        if target.languages:
+            unknown = set(target.languages) - set(path_operation.languages())
+            if unknown:
+                raise ValueError("Unknown languages: {}".format(
+                        ', '.join(sorted(unknown))))
+            path_operation.selected_languages = target.languages
+        try:
+            path_operation.resolve_containers()
+        except SystemExit:
+            # Single run exits when there is nothing to analyse
+            raise ValueError("No analysed files in {}.".format(target.path))
+        digest, root = target_digest(path_operation,
+                                     self.shared.result_cache,
+                                     target.options)
+        return path_operation, digest, root
+
+    def collector(self, target, root):
+        """
+        :param target: Class:`BatchTarget`.
+        :param root: Root directory of target.
+        :return: Collector of findings of target.
+        """
+        return FindingsCollector(root)
+
+    def pipeline_report(self, target):
+        """
+        :param target: Class:`BatchTarget`.
+        :return: Class:`PipelineReport` of target.
+        """
+        return PipelineReport()
+
+    @staticmethod
+    def state(report):
+        """
+        :param report: Class:`PipelineReport` of target.
+        :return: State of target.
+        """
+        states = list(report.states(report.DOCKER).values())
+        if states and all(state == report.CACHED for state in states):
+            return report.CACHED
+        if report.succeeded():
+            return report.DONE
+        return report.FAILED
+
+    async def analyse(self, target):
+        """
+        Analyse target unless target with the same content was already
+        analysed.
+        :param target: Class:`BatchTarget`.
+        :return: Output record of target.
+        """
+        if target.error:
+            return target.record(self.ERROR)
+        loop = asyncio.get_event_loop()
+        try:
+            path_operation, digest, root = await loop.run_in_executor(
+                    None, self.prepare, target)
+        except (OSError, ValueError) as error:
+            target.error = str(error)
+            return target.record(self.ERROR)
+        if digest in self._digests:
+            identifier, finished = self._digests[digest]
+            state = await asyncio.shield(finished)
+            self.duplicates += 1
+            return target.record(state, digest=digest,
+                                 duplicate_of=identifier)
+        finished = loop.create_future()
+        self._digests[digest] = (target.id, finished)
+        state = self.ERROR
+        findings = self.collector(target, root)
+        try:
+            facade = await loop.run_in_executor(None, functools.partial(
+                    self.facade_class, path_subsystem=path_operation,
+                    shared=self.shared))
+            facade.findings_export = findings
+            report = await facade.target_operation(
+                    self.pipeline_report(target))
+            state = self.state(report)
+            return target.record(state, digest=digest,
+                                 targets=report.states(report.DOCKER),
+                                 findings=findings.findings)
+        except Exception as error:
+            await loop.run_in_executor(
+                    None, path_operation.delete_configurations)
+            target.error = str(error)
+            return target.record(state, digest=digest)
+        finally:
+            finished.set_result(state)
+
+    def write(self, record):
+        """
+        Write record of finished target and show progress.
+        :param record: Output record of target.
+        """
+        self.emit(record)
+        self.states.append(record['state'])
+        print(self.PROGRESS.format(finished=len(self.states),
+                                   path=record['path'],
+                                   state=record['state']))
+
+    def emit(self, record):
+        """
+        Write record to output as JSON Lines.
+        :param record: Output record of target.
+        """
+        self.output.write(json.dumps(record, sort_keys=True) + '\n')
+        self.output.flush()
+
+    async def run(self, manifest):
+        """
+        Analyse all targets of manifest. Manifest is read while targets are
+        analysed, only limited number of targets is pending at once.
+        :param manifest: Text file with JSON Lines.
+        :return: True when every target succeeded.
+        """
+        # Plugins are loaded before targets are prepared in more threads
+        REGISTRY.load()
+        loop = asyncio.get_event_loop()
+        slots = asyncio.Semaphore(self.pending)
+        tasks = []
+
+        async def analyse(target):
+            try:
+                self.write(await self.analyse(target))
+            finally:
+                slots.release()
+
+        number = 0
+        while True:
+            line = await loop.run_in_executor(None, manifest.readline)
+            if not line:
+                break
+            number += 1
+            if not line.strip():
+                continue
+            await slots.acquire()
+            tasks.append(asyncio.ensure_future(
+                    analyse(BatchTarget.parse(line, number))))
+            tasks = [task for task in tasks if not task.done()]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return self.succeeded()
+
+    def succeeded(self):
+        return all(state in PipelineReport.SUCCESSFUL_STATES
+                   for state in self.states)
+
+    def summary(self):
+        """
+        Print summary of batch.
+        :return: Text of summary.
+        """
+        states = self.states
+        text = self.SUMMARY.format(
+                total=len(states), done=states.count(PipelineReport.DONE),
+                cached=states.count(PipelineReport.CACHED),
+                failed=states.count(PipelineReport.FAILED),
+                errors=states.count(self.ERROR),
+                duplicates=self.duplicates)
+        print(text)
+        return text
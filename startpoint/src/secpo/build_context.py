@@ -0,0 +1,115 @@
+""" This module is created by Martin Vasko.
+    Build context of docker image is created by secpo itself. Instead of
+    whole tested directory only analysed source files, project manifests,
+    generated package files and Dockerfiles are archived. Files matching
+    patterns of .secpoignore are left out.
+"""
+
+import os
+from pathlib import Path
+import tarfile
+import tempfile
+
+from secpo.ignore_rules import IgnoreRules
+from secpo.path_operation import PathOperation
+
+
+class BuildContext:
+    """
+    Files of build context and their names inside archive.
+    """
+    IGNORE_FILE = IgnoreRules.IGNORE_FILE
+    # Context bigger than this is spooled to disk
+    SPOOL_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, path, files, required=None):
+        """ Initialize """
+        self.path = Path(path)
+        self._files = list(files)
+        # Files that are always part of context
+        self._required = list(required or [])
+        self.rules = IgnoreRules.load(self.path / self.IGNORE_FILE)
+
+    @classmethod
+    def generated_files(cls, path):
+        """
+        Dockerfiles and package files written by secpo into path.
+        """
+        names = [PathOperation.DOCKERFILE, PathOperation.BASE_DOCKERFILE]
+        names += [special[0] for special
+                  in PathOperation.SPECIAL_FILES.values()]
+        return [path / name for name in names if (path / name).is_file()]
+
+    @classmethod
+    def from_path(cls, path_operation, path, *dockerfiles):
+        """
+        Build context of path component with analysed files of all its
+        languages, project manifests and generated files.
+        :param path_operation: Class:`PathOperation` with indexed sources.
+        :param path: Build context of path component.
+        :param dockerfiles: Names of other Dockerfiles that are part of
+                            context.
+        :return: Class:`BuildContext`.
+        """
+        files = path_operation.analysed_files(path)
+        files += path_operation.indexed_files(PathOperation.PROJECT_FILES,
+                                              path)
+        required = cls.generated_files(path)
+        required += [path / dockerfile for dockerfile in dockerfiles]
+        return cls(path, files, required)
+
+    @classmethod
+    def recipe(cls, path, dockerfile=None):
+        """
+        Build context of analyser base image that needs only its recipe and
+        package files.
+        :param dockerfile: Name of recipe when other than default.
+        """
+        required = cls.generated_files(path)
+        if dockerfile:
+            required.append(path / dockerfile)
+        return cls(path, [], required)
+
+    @classmethod
+    def directory(cls, path):
+        """
+        Build context of whole directory.
+        """
+        path = Path(path)
+        files = []
+        for root, directories, names in os.walk(str(path)):
+            directories.sort()
+            files += [Path(root) / name for name in sorted(names)]
+        return cls(path, files)
+
+    def names(self):
+        """
+        :return: Sorted list of relative posix names and files of context.
+        """
+        members = {}
+        for file in self._files:
+            name = Path(file).relative_to(self.path).as_posix()
+            if not self.rules.ignored(name):
+                members[name] = file
+        for file in self._required:
+            members[Path(file).relative_to(self.path).as_posix()] = file
+        return sorted(members.items())
+
+    def write(self, fileobj):
+        """
+        Write context as tar archive into file object.
+        :param fileobj: Writable file object.
+        """
+        with tarfile.open(fileobj=fileobj, mode='w') as archive:
+            for name, file in self.names():
+                if os.path.isfile(str(file)):
+                    archive.add(str(file), arcname=name, recursive=False)
+
+    def archive(self):
+        """
+        :return: Seekable file with tar archive positioned at its beginning.
+        """
+        context = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        self.write(context)
+        context.seek(0)
+        return context
@@ -0,0 +1,139 @@
+""" This module is created by Martin Vasko.
+    Streaming parser of docker build output. Standard output and standard
+    error are read at the same time, every line is matched only once by one
+    compiled expression of all known markers and structured events are
+    emitted. Only a bounded tail of output is kept in memory.
+"""
+
+import asyncio
+from collections import deque
+import re
+
+
+class BuildEvent:
+    """
+    Event of build such as started or finished step and error.
+    """
+    def __init__(self, kind, text, stream, step=None):
+        """ Initialize """
+        self.kind = kind
+        self.text = text
+        self.stream = stream
+        self.step = step
+
+    def __repr__(self):
+        return "BuildEvent({!r}, {!r}, {!r}, {!r})".format(
+                self.kind, self.text, self.stream, self.step)
+
+
+class BuildLog:
+    """
+    Follows output of build process and turns it into events.
+    """
+    RED_COLOR = '\033[91m{}\033[00m'
+    STDOUT = 'stdout'
+    STDERR = 'stderr'
+    # Kinds of events
+    STEP_STARTED = 'step started'
+    STEP_DONE = 'step done'
+    ERROR = 'error'
+    SUCCESS = 'success'
+    # Markers of classic builder and of BuildKit plain progress
+    MARKERS = re.compile(
+        r'^(?:Step (?P<step>\d+/\d+) :'
+        r'|#(?P<kit_step>\d+) \[[^\]]*\d+/\d+\]'
+        r'|#(?P<kit_done>\d+) (?:DONE|CACHED)'
+        r'|(?P<step_done> ---> [0-9a-f]{12}$)'
+        r'|(?P<success>Successfully (?:tagged|built)'
+        r'|#\d+ naming to .* done)'
+        r'|(?P<error>E: |COPY failed:|Error response from daemon:'
+        r'|ERROR:?|#\d+ ERROR:|.*manifest unknown'
+        r'|.*returned a non-zero code:))')
+    CHUNK_SIZE = 64 * 1024
+    # Longer lines are split, so single line cannot exhaust memory
+    MAX_LINE_LENGTH = 64 * 1024
+    TAIL_LENGTH = 200
+
+    def __init__(self, on_event=None, echo=True, tail_length=TAIL_LENGTH):
+        """ Initialize """
+        self.on_event = on_event
+        self.echo = echo
+        # Last lines of output
+        self.tail = deque(maxlen=tail_length)
+        self.errors = deque(maxlen=tail_length)
+        self.step = None
+        self.succeeded = False
+
+    def _emit(self, kind, text, stream):
+        event = BuildEvent(kind, text, stream, self.step)
+        if kind == self.ERROR:
+            self.errors.append(event)
+        if self.on_event:
+            self.on_event(event)
+        return event
+
+    def feed(self, line, stream=STDOUT):
+        """
+        Process single line of output.
+        :param line: Line in bytes or string.
+        :param stream: Name of stream where line comes from.
+        :return: Class:`BuildEvent` or None when line is not a marker.
+        """
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.rstrip('\r\n')
+        self.tail.append(line)
+        if self.echo:
+            if stream == self.STDERR:
+                print(self.RED_COLOR.format(line))
+            else:
+                print(line)
+        match = self.MARKERS.match(line)
+        if not match:
+            return None
+        if match.group('step') or match.group('kit_step'):
+            self.step = match.group('step') or match.group('kit_step')
+            return self._emit(self.STEP_STARTED, line, stream)
+        if match.group('step_done') or match.group('kit_done'):
+            return self._emit(self.STEP_DONE, line, stream)
+        if match.group('success'):
+            self.succeeded = True
+            return self._emit(self.SUCCESS, line, stream)
+        return self._emit(self.ERROR, line, stream)
+
+    async def _read(self, reader, stream):
+        partial = b''
+        while True:
+            chunk = await reader.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            for line in lines:
+                self._feed_split(line, stream)
+            while len(partial) > self.MAX_LINE_LENGTH:
+                self.feed(partial[:self.MAX_LINE_LENGTH], stream)
+                partial = partial[self.MAX_LINE_LENGTH:]
+        if partial:
+            self.feed(partial, stream)
+
+    def _feed_split(self, line, stream):
+        for start in range(0, max(len(line), 1), self.MAX_LINE_LENGTH):
+            self.feed(line[start:start + self.MAX_LINE_LENGTH], stream)
+
+    async def follow(self, process):
+        """
+        Read both output pipes of process until it exits.
+        :param process: Process created with piped stdout and stderr.
+        :return: Whether process finished successfully.
+        """
+        await asyncio.gather(self._read(process.stdout, self.STDOUT),
+                             self._read(process.stderr, self.STDERR))
+        return await process.wait() == 0
+
+    @property
+    def last_line(self):
+        """
+        :return: Last line of output or empty string.
+        """
+        return self.tail[-1] if self.tail else ''
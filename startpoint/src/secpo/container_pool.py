@@ -0,0 +1,191 @@
+""" This module is created by Martin Vasko.
+    Pool of warm analyser containers. Instead of building image for every
+    tested directory, long-lived container of analyser base image is started
+    once. Filtered build context of every target is streamed into it and
+    analysis commands are executed through docker backend. Container is
+    reused for many targets and stopped when it is idle for too long.
+"""
+
+import asyncio
+import itertools
+import os
+import shlex
+import time
+
+
+class WarmContainer:
+    """
+    Running container of analyser base image.
+    """
+    def __init__(self, name, tag):
+        """ Initialize """
+        self.name = name
+        self.tag = tag
+        self.last_used = time.monotonic()
+
+
+class ContainerPool:
+    """
+    Pool of warm containers with maximal size and idle timeout.
+    """
+    # Container only waits for executed commands
+    IDLE_COMMAND = ['tail', '-f', '/dev/null']
+    NAME = 'secpo-warm-{pid}-{number}'
+    # Directory inside container where target is analysed
+    RUN_DIR = '/secpo/run'
+    PREPARE_RUN_DIR = 'rm -rf {run} && mkdir -p {parent} && ' \
+                      'cp -a {workdir} {run}'
+    RUN_PREFIX = 'RUN '
+    MAX_SIZE = 4
+    IDLE_TIMEOUT = 300
+
+    def __init__(self, max_size=MAX_SIZE, idle_timeout=IDLE_TIMEOUT,
+                 backend=None):
+        """
+        :param backend: Class:`DockerBackend` of containers, it is set by
+                        owner of pool when not given.
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.backend = backend
+        self._idle = []
+        self._size = 0
+        self._numbers = itertools.count()
+        self._condition = None
+        self._reaper = None
+
+    @classmethod
+    def analysis_commands(cls, dockerfile):
+        """
+        Return commands of RUN instructions from Dockerfile of tested
+        directory. They are executed inside warm container instead.
+        :param dockerfile: Text of Dockerfile.
+        :return: List of shell commands.
+        """
+        return [line[len(cls.RUN_PREFIX):].strip()
+                for line in dockerfile.splitlines()
+                if line.startswith(cls.RUN_PREFIX)]
+
+    async def _start(self, tag):
+        name = self.NAME.format(pid=os.getpid(), number=next(self._numbers))
+        if not await self.backend.start(name, tag, self.IDLE_COMMAND):
+            return None
+        return WarmContainer(name, tag)
+
+    async def _stop(self, container):
+        await self.backend.remove(container.name)
+
+    async def acquire(self, tag):
+        """
+        Return warm container of image tag. New container is started when
+        pool is not full. Otherwise the oldest idle container of another
+        image is stopped or caller waits until container is released.
+        :param tag: Tag of analyser base image.
+        :return: Class:`WarmContainer` or None when container cannot start.
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._reaper = asyncio.ensure_future(self._reap_idle())
+        victim = None
+        async with self._condition:
+            while True:
+                for container in self._idle:
+                    if container.tag == tag:
+                        self._idle.remove(container)
+                        return container
+                if self._size < self.max_size:
+                    break
+                if self._idle:
+                    # Make room for image of other language
+                    victim = self._idle.pop(0)
+                    break
+                await self._condition.wait()
+            if not victim:
+                self._size += 1
+        if victim:
+            await self._stop(victim)
+        container = await self._start(tag)
+        if not container:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+        return container
+
+    async def release(self, container):
+        """
+        Return container back to pool.
+        :param container: Class:`WarmContainer` that is not used anymore.
+        """
+        container.last_used = time.monotonic()
+        async with self._condition:
+            self._idle.append(container)
+            self._condition.notify()
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 1))
+            now = time.monotonic()
+            async with self._condition:
+                expired = [container for container in self._idle
+                           if now - container.last_used > self.idle_timeout]
+                for container in expired:
+                    self._idle.remove(container)
+                    self._size -= 1
+                self._condition.notify(len(expired))
+            for container in expired:
+                await self._stop(container)
+
+    async def run(self, tag, context, workdir, commands, destination,
+                  results=None):
+        """
+        Analyse target in warm container and copy content of analysed
+        directory to destination.
+        :param tag: Tag of analyser base image.
+        :param context: Class:`BuildContext` of tested directory streamed
+                        into container.
+        :param workdir: Working directory of base image with installed tools.
+        :param commands: Analysis commands.
+        :param destination: Directory on host where results are copied.
+        :param results: Directory of collected result artifacts that is
+                        copied instead of whole analysed directory.
+        :return: Whether analysis was successful.
+        """
+        container = await self.acquire(tag)
+        if not container:
+            return False
+        success = False
+        try:
+            prepare = self.PREPARE_RUN_DIR.format(
+                    run=self.RUN_DIR, parent=os.path.dirname(self.RUN_DIR),
+                    workdir=shlex.quote(workdir))
+            if not await self.backend.execute(container.name, prepare):
+                return False
+            # Only files of build context are sent, not whole directory
+            if not await self.backend.put_archive(container.name,
+                                                  self.RUN_DIR, context):
+                return False
+            analysis = ' && '.join(['cd ' + self.RUN_DIR] +
+                                   ['(' + command + ')'
+                                    for command in commands])
+            success = await self.backend.execute(container.name, analysis)
+            destination.mkdir(parents=True, exist_ok=True)
+            await self.backend.copy_from(container.name,
+                                         (results or self.RUN_DIR) + '/.',
+                                         destination)
+        finally:
+            await self.release(container)
+        return success
+
+    async def close(self):
+        """
+        Stop all containers of pool.
+        """
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        containers = self._idle
+        self._idle = []
+        self._size = 0
+        self._condition = None
+        await asyncio.gather(*[self._stop(container)
+                               for container in containers])
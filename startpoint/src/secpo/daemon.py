@@ -0,0 +1,333 @@
+""" This module is created by Martin Vasko.
+    Long-running secpod daemon. Daemon keeps analyser registry, docker
+    connection, base images, warm containers and result cache in memory and
+    serves runs submitted over Unix socket, so run of thin client does not
+    pay for start of secpo. Requests and events are JSON Lines, findings
+    and progress of pipeline are streamed back as soon as they are
+    produced and result of every target right when the target finishes.
+"""
+
+import asyncio
+import io
+import json
+import os
+from pathlib import Path
+
+from secpo.analyser_registry import REGISTRY
+from secpo.batch import BatchRunner, FindingsCollector
+from secpo.pipeline_report import PipelineReport
+from secpo.result_cache import ResultCache
+
+# Longest line of request or event
+LIMIT = 1 << 24
+
+
+def send(writer, event):
+    """
+    Write event as JSON line.
+    :param writer: Class:`asyncio.StreamWriter` of connection.
+    :param event: Dictionary with event name and its data.
+    """
+    writer.write((json.dumps(event, sort_keys=True) + '\n').encode('utf-8'))
+
+
+class EventStream:
+    """
+    Sends events to client in order they were produced. Events are
+    produced from event loop and from threads that process results, writer
+    is drained after every event.
+    """
+    def __init__(self, writer):
+        """ Initialize """
+        self.writer = writer
+        self._loop = asyncio.get_event_loop()
+        self._events = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._forward())
+
+    def put(self, event):
+        """
+        Send event. It is safe to call from more threads.
+        :param event: Dictionary with event name and its data.
+        """
+        self._loop.call_soon_threadsafe(self._events.put_nowait, event)
+
+    async def _forward(self):
+        while True:
+            event = await self._events.get()
+            if event is None:
+                break
+            send(self.writer, event)
+            await self.writer.drain()
+
+    async def close(self):
+        """
+        Wait until all produced events are sent.
+        """
+        self.put(None)
+        await self._task
+
+
+class StreamingCollector(FindingsCollector):
+    """
+    Sends findings of target to client right when they are parsed instead
+    of keeping them until target finishes.
+    """
+    def __init__(self, root, stream, target):
+        """ Initialize """
+        super(StreamingCollector, self).__init__(root)
+        self.stream = stream
+        self.target = target
+
+    def collect(self, records):
+        for record in records:
+            self.stream.put({'event': SecpoDaemon.FINDING,
+                             'id': self.target.id, 'path': self.target.path,
+                             'finding': record})
+
+
+class RequestRunner(BatchRunner):
+    """
+    Analyses targets of one request and streams their findings, progress
+    and records to client instead of output file.
+    """
+    def __init__(self, args, shared, facade_class, stream):
+        """ Initialize """
+        super(RequestRunner, self).__init__(args, shared, facade_class, None)
+        self.stream = stream
+
+    def collector(self, target, root):
+        return StreamingCollector(root, self.stream, target)
+
+    def pipeline_report(self, target):
+        report = PipelineReport()
+
+        def progress(pipeline, name, state, finished, total):
+            self.stream.put({'event': SecpoDaemon.PROGRESS,
+                             'id': target.id, 'path': target.path,
+                             'progress': {'pipeline': pipeline,
+                                          'target': name, 'state': state,
+                                          'finished': finished,
+                                          'total': total}})
+
+        report.on_progress = progress
+        return report
+
+    def emit(self, record):
+        # Findings were already streamed
+        record.pop('findings', None)
+        self.stream.put({'event': SecpoDaemon.TARGET, 'record': record})
+
+
+class SecpoDaemon:
+    """
+    Serves requests of clients connected to Unix socket. Every analyse
+    request is run of its own, all runs share subsystems of daemon.
+    """
+    SOCKET_NAME = 'secpod.sock'
+    RUNTIME_DIR = 'XDG_RUNTIME_DIR'
+    # Only user that started daemon can connect
+    SOCKET_MODE = 0o600
+    # Methods of requests
+    ANALYSE = 'analyse'
+    PING = 'ping'
+    SHUTDOWN = 'shutdown'
+    # Events sent to client
+    FINDING = 'finding'
+    PROGRESS = 'progress'
+    TARGET = 'target'
+    FINISHED = 'finished'
+    PONG = 'pong'
+    STOPPING = 'stopping'
+    ERROR = 'error'
+    # Events that end response to request
+    FINAL_EVENTS = [FINISHED, PONG, STOPPING, ERROR]
+
+    def __init__(self, args, shared, facade_class, socket_path=None):
+        """
+        :param args: Parsed command line arguments, defaults of runs.
+        :param shared: Class:`SharedSubsystems` of daemon.
+        :param facade_class: Class of facade of target, Class:`RunFacade`.
+        :param socket_path: Unix socket, default socket when not given.
+        """
+        self.args = args
+        self.shared = shared
+        self.facade_class = facade_class
+        self.socket = Path(socket_path or self.default_socket())
+        self.runs = 0
+        self._stopped = None
+        # Tasks of open connections
+        self._connections = set()
+        # Set when daemon accepts connections
+        self.ready = None
+
+    @classmethod
+    def default_socket(cls):
+        """
+        :return: Socket in runtime directory of user or in cache directory.
+        """
+        runtime_dir = os.environ.get(cls.RUNTIME_DIR)
+        if runtime_dir:
+            return Path(runtime_dir) / cls.SOCKET_NAME
+        return ResultCache.default_directory() / cls.SOCKET_NAME
+
+    async def _remove_stale_socket(self):
+        if not self.socket.exists():
+            return
+        try:
+            _, writer = await asyncio.open_unix_connection(str(self.socket))
+        except OSError:
+            # Nobody listens, socket of crashed daemon
+            self.socket.unlink()
+            return
+        writer.close()
+        raise RuntimeError("secpod already listens on {}.".format(
+                self.socket))
+
+    async def serve(self):
+        """
+        Serve requests until shutdown request is received.
+        """
+        self._stopped = asyncio.Event()
+        self.ready = self.ready or asyncio.Event()
+        # Plugins are loaded only once for all runs
+        REGISTRY.load()
+        self.socket.parent.mkdir(parents=True, exist_ok=True)
+        await self._remove_stale_socket()
+        server = await asyncio.start_unix_server(
+                self.handle, path=str(self.socket), limit=LIMIT)
+        os.chmod(str(self.socket), self.SOCKET_MODE)
+        print("secpod listens on {}".format(self.socket))
+        self.ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            # Idle connections would wait for next request forever
+            for connection in list(self._connections):
+                connection.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self.shared.close()
+            if self.socket.exists():
+                self.socket.unlink()
+
+    async def handle(self, reader, writer):
+        """
+        Serve requests of one connection one after another.
+        :param reader: Class:`asyncio.StreamReader` of connection.
+        :param writer: Class:`asyncio.StreamWriter` of connection.
+        """
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                    method = request.get('method')
+                except (ValueError, AttributeError):
+                    request, method = {}, None
+                if method == self.ANALYSE:
+                    await self.analyse(request, writer)
+                elif method == self.PING:
+                    send(writer, {'event': self.PONG, 'pid': os.getpid(),
+                                  'runs': self.runs})
+                elif method == self.SHUTDOWN:
+                    send(writer, {'event': self.STOPPING})
+                    await writer.drain()
+                    self._stopped.set()
+                    break
+                else:
+                    send(writer, {'event': self.ERROR,
+                                  'message': "Unknown request."})
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Client left before its run finished or daemon stops
+            pass
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    async def analyse(self, request, writer):
+        """
+        Analyse targets of request as one run.
+        :param request: Dictionary with targets in form of batch manifest
+                        and optional run_id and baseline.
+        :param writer: Class:`asyncio.StreamWriter` of connection.
+        """
+        shared = self.shared.for_run(request.get('run_id'),
+                                     request.get('baseline'))
+        baseline = shared.baseline
+        if baseline.baseline and not baseline.exists(baseline.baseline):
+            send(writer, {'event': self.ERROR,
+                          'message': "Baseline run {} does not exist!"
+                          .format(baseline.baseline)})
+            return
+        self.runs += 1
+        if shared.history:
+            shared.history.start_run(baseline.run_id, request)
+        stream = EventStream(writer)
+        runner = RequestRunner(self.args, shared, self.facade_class, stream)
+        status = 1
+        failure = None
+        try:
+            manifest = io.StringIO(''.join(
+                    json.dumps(target) + '\n'
+                    for target in request.get('targets') or []))
+            succeeded = await runner.run(manifest)
+            # New findings against baseline fail the run as well
+            if succeeded and not baseline.new_findings:
+                status = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            # Client still gets final event of its request
+            failure = "Run {} failed: {}".format(baseline.run_id, error)
+        finally:
+            baseline.prune()
+            if shared.history:
+                shared.history.finish_run(status)
+                shared.history.close()
+            # Events of targets are sent before result of request
+            await stream.close()
+        if failure:
+            send(writer, {'event': self.ERROR, 'message': failure,
+                          'run_id': baseline.run_id})
+            return
+        send(writer, {'event': self.FINISHED, 'status': status,
+                      'run_id': baseline.run_id,
+                      'new_findings': baseline.new_findings,
+                      'summary': runner.summary()})
+
+
+class DaemonClient:
+    """
+    Thin client of secpod.
+    """
+    def __init__(self, socket_path=None):
+        """ Initialize """
+        self.socket = Path(socket_path or SecpoDaemon.default_socket())
+
+    async def request(self, request):
+        """
+        Send request to daemon.
+        :param request: Dictionary with method and its data.
+        :return: Asynchronous generator of events until request is finished.
+        """
+        reader, writer = await asyncio.open_unix_connection(
+                str(self.socket), limit=LIMIT)
+        try:
+            send(writer, request)
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                event = json.loads(line.decode('utf-8'))
+                yield event
+                if event.get('event') in SecpoDaemon.FINAL_EVENTS:
+                    break
+        finally:
+            writer.close()
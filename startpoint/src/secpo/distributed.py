@@ -0,0 +1,574 @@
+""" This module is created by Martin Vasko.
+    Distributed analysis on more docker hosts. Coordinator keeps queue of
+    jobs, every job is build context of target with tag of its analyser
+    base image. Workers pull jobs over HTTP or directly from in-process
+    queue, analyse them by local docker daemon and send result artifacts
+    back, coordinator processes them the same way as results of local
+    containers. Jobs are leased to workers with free capacity and
+    workers which already have base image of job are preferred.
+    Coordinator listens on loopback by default, coordinator reachable from
+    other hosts requires token shared with its workers.
+"""
+
+import asyncio
+import base64
+from collections import OrderedDict
+from concurrent.futures import Future
+import hmac
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import io
+import itertools
+import json
+import os
+from pathlib import Path
+import socket
+from socketserver import ThreadingMixIn
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.request
+
+from secpo.build_context import BuildContext
+from secpo.docker_backend import EngineApiBackend
+from secpo.result_retriever import ResultRetriever
+from secpo.virtual_starter import VirtualStarter
+
+# Environment variable with token shared by coordinator and its workers
+TOKEN_VARIABLE = 'SECPO_COORDINATOR_TOKEN'
+TOKEN_HEADER = 'X-Secpo-Token'
+
+
+class WorkerState:
+    """
+    Worker known to coordinator.
+    """
+    def __init__(self, name, capacity, images):
+        """ Initialize """
+        self.name = name
+        self.capacity = capacity
+        # Tags of base images present in daemon of worker
+        self.images = set(images)
+        self.jobs = set()
+        self.seen = time.monotonic()
+
+    @property
+    def free(self):
+        return self.capacity - len(self.jobs)
+
+
+class JobQueue:
+    """
+    Queue of jobs of coordinator. Methods take and return JSON compatible
+    dictionaries, so they are called the same way by HTTP server and by
+    in-process transport. It is safe to call them from more threads.
+    """
+    # Seconds after silent worker is forgotten and its jobs are requeued
+    WORKER_TIMEOUT = 60
+    # Seconds of long polling of lease
+    LEASE_TIMEOUT = 5
+    METHODS = ['register', 'heartbeat', 'lease', 'complete']
+
+    def __init__(self, worker_timeout=WORKER_TIMEOUT):
+        """ Initialize """
+        self.worker_timeout = worker_timeout
+        self._pending = OrderedDict()
+        self._leased = {}
+        self._futures = {}
+        self._workers = {}
+        self._numbers = itertools.count()
+        self._condition = threading.Condition()
+        self.closed = False
+
+    def submit(self, job):
+        """
+        Add job into queue.
+        :param job: Dictionary with key, base_tag, results and context of
+                    target.
+        :return: Future of dictionary with success of job and archive of
+                 its result artifacts.
+        """
+        future = Future()
+        with self._condition:
+            job = dict(job, id=str(next(self._numbers)))
+            self._pending[job['id']] = job
+            self._futures[job['id']] = future
+            self._condition.notify_all()
+        return future
+
+    def close(self):
+        """
+        Stop workers and fail jobs that were not finished.
+        """
+        with self._condition:
+            self.closed = True
+            unfinished = list(self._pending) + list(self._leased)
+            self._pending.clear()
+            self._leased.clear()
+            self._condition.notify_all()
+        for job_id in unfinished:
+            self._resolve(job_id, False)
+
+    def _resolve(self, job_id, success, artifacts=None):
+        future = self._futures.pop(job_id, None)
+        if future and not future.done():
+            future.set_result({'success': success, 'artifacts': artifacts})
+
+    def _expire(self):
+        now = time.monotonic()
+        for name, worker in list(self._workers.items()):
+            if now - worker.seen <= self.worker_timeout:
+                continue
+            del self._workers[name]
+            for job_id in worker.jobs:
+                self._requeue(job_id)
+
+    def _requeue(self, job_id):
+        job = self._leased.pop(job_id, None)
+        if job:
+            self._pending[job_id] = job
+            self._pending.move_to_end(job_id, last=False)
+            self._condition.notify_all()
+
+    def _worker(self, name):
+        worker = self._workers.get(name)
+        if worker:
+            worker.seen = time.monotonic()
+        return worker
+
+    def _owns(self, worker, job):
+        state = self._worker(worker)
+        return state is not None and job in state.jobs and \
+            job in self._leased
+
+    def register(self, worker, capacity=1, images=None):
+        """
+        Register worker, jobs of worker with the same name are requeued.
+        :param worker: Name of worker.
+        :param capacity: Number of jobs worker runs at once.
+        :param images: Tags of base images present on worker.
+        """
+        with self._condition:
+            previous = self._workers.get(worker)
+            if previous:
+                for job_id in previous.jobs:
+                    self._requeue(job_id)
+            self._workers[worker] = WorkerState(worker, max(capacity, 1),
+                                                images or [])
+        return {'registered': worker}
+
+    def heartbeat(self, worker):
+        with self._condition:
+            known = self._worker(worker) is not None
+            self._expire()
+        return {'known': known, 'stop': self.closed}
+
+    def _select(self, worker):
+        """
+        Select job for worker. Job whose base image is present on worker is
+        preferred. Other job is left for a while to worker with free
+        capacity that has its base image.
+        """
+        if worker.free <= 0:
+            return None
+        for job in self._pending.values():
+            if job['base_tag'] in worker.images:
+                return job
+        for job in self._pending.values():
+            if not any(job['base_tag'] in other.images and other.free > 0
+                       for other in self._workers.values()
+                       if other is not worker):
+                return job
+        return None
+
+    def lease(self, worker, timeout=LEASE_TIMEOUT):
+        """
+        Wait for job of worker.
+        :param worker: Name of worker.
+        :param timeout: Seconds of waiting for job.
+        :return: Dictionary with job or None and whether worker has to stop.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self.closed:
+                state = self._worker(worker)
+                if state is None:
+                    return {'job': None, 'stop': False, 'known': False}
+                self._expire()
+                job = self._select(state)
+                if job:
+                    del self._pending[job['id']]
+                    self._leased[job['id']] = job
+                    state.jobs.add(job['id'])
+                    # Capacity of worker changed, other workers select again
+                    self._condition.notify_all()
+                    return {'job': job, 'stop': False}
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return {'job': None, 'stop': self.closed}
+
+    def complete(self, worker, job, success, images=None, artifacts=None):
+        """
+        Finish leased job.
+        :param success: Whether job was successful.
+        :param images: Base images that are present on worker now.
+        :param artifacts: Archive of result artifacts of job.
+        """
+        with self._condition:
+            state = self._worker(worker)
+            if state:
+                state.images.update(images or [])
+            # Job of forgotten worker could be leased to other worker
+            if not self._owns(worker, job):
+                return {'accepted': False}
+            state.jobs.discard(job)
+            del self._leased[job]
+            self._condition.notify_all()
+        self._resolve(job, bool(success), artifacts)
+        return {'accepted': True}
+
+    def call(self, method, payload):
+        """
+        Call method of queue by its name.
+        :param method: One of METHODS.
+        :param payload: Dictionary of arguments.
+        :return: Dictionary of response.
+        """
+        if method not in self.METHODS:
+            raise ValueError("Unknown method {}!".format(method))
+        return getattr(self, method)(**payload)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP interface of Class:`JobQueue`, method is path of POST.
+    """
+    def do_POST(self):
+        method = self.path.strip('/')
+        token = self.server.token
+        if token and not hmac.compare_digest(
+                self.headers.get(TOKEN_HEADER, '').encode('utf-8'),
+                token.encode('utf-8')):
+            self._respond(403, {'error': "Invalid token."})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8')
+                                 or '{}')
+            response = self.server.queue.call(method, payload)
+            status = 200
+        except (ValueError, TypeError) as error:
+            response = {'error': str(error)}
+            status = 400
+        self._respond(status, response)
+
+    def _respond(self, status, response):
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CoordinatorServer:
+    """
+    HTTP server of job queue running in background thread.
+    """
+    LOCALHOST = '127.0.0.1'
+    LOOPBACK = [LOCALHOST, 'localhost', '::1']
+
+    def __init__(self, queue, host=LOCALHOST, port=0, token=None):
+        """
+        :param queue: Class:`JobQueue` served to workers.
+        :param host: Listening address, loopback when not given.
+        :param port: Listening port, any free port when zero.
+        :param token: Token that workers have to send, required when
+                      coordinator listens on other than loopback address.
+        :raise ValueError: When coordinator reachable from other hosts has
+                           no token.
+        """
+        host = host or self.LOCALHOST
+        if host not in self.LOOPBACK and not token:
+            raise ValueError("Coordinator listening on {} requires token "
+                             "in {}.".format(host, TOKEN_VARIABLE))
+        self.queue = queue
+        self._server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+        self._server.queue = queue
+        self._server.token = token
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        if host in ['', '0.0.0.0']:
+            host = socket.gethostname()
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        print("Coordinator listens on {}.".format(self.url))
+
+    def close(self):
+        self.queue.close()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LocalTransport:
+    """
+    Transport of worker calling in-process queue.
+    """
+    def __init__(self, queue):
+        """ Initialize """
+        self.queue = queue
+
+    async def call(self, method, payload):
+        # Lease blocks, so queue is called outside of event loop
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.queue.call, method,
+                                          json.loads(json.dumps(payload)))
+
+
+class HttpTransport:
+    """
+    Transport of worker calling coordinator over HTTP.
+    """
+    TIMEOUT = 60
+
+    def __init__(self, url, token=None):
+        """ Initialize """
+        self.url = url.rstrip('/')
+        self.token = token
+
+    def _post(self, method, payload):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        request = urllib.request.Request(
+                self.url + '/' + method,
+                data=json.dumps(payload).encode('utf-8'), headers=headers)
+        with urllib.request.urlopen(request, timeout=self.TIMEOUT) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    async def call(self, method, payload):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._post, method, payload)
+
+
+def create_job(path_operation, path, key, base_tag, results):
+    """
+    Create job of path component. Build context of target is sent as tar
+    archive together with tag of its base image.
+    :param path_operation: Class:`PathOperation` with indexed sources.
+    :param path: Path of tested directory.
+    :param key: Key of path component.
+    :param base_tag: Tag of analyser base image.
+    :param results: Directory inside container with result artifacts.
+    :return: Dictionary of job.
+    """
+    dockerfile = path_operation.dockerfile(key)
+    base_dockerfile = path_operation.base_dockerfile(key)
+    with BuildContext.from_path(path_operation, path, dockerfile,
+                                base_dockerfile).archive() as archive:
+        context = base64.b64encode(archive.read()).decode('ascii')
+    return {'key': key, 'base_tag': base_tag, 'results': results,
+            'context': context, 'dockerfile': dockerfile,
+            'base_dockerfile': base_dockerfile}
+
+
+def pack_artifacts(directory, files):
+    """
+    Pack result artifacts of job, so they can be sent as JSON.
+    :param directory: Directory with copied results.
+    :param files: Artifacts inside directory.
+    :return: Base64 encoded tar archive.
+    """
+    stream = io.BytesIO()
+    with tarfile.open(fileobj=stream, mode='w') as archive:
+        for file in files:
+            archive.add(str(file), file.relative_to(directory).as_posix())
+    return base64.b64encode(stream.getvalue()).decode('ascii')
+
+
+def unpack_artifacts(artifacts, destination):
+    """
+    Extract result artifacts of finished job.
+    :param artifacts: Archive created by :func:`pack_artifacts`.
+    :param destination: Result directory of path component.
+    """
+    destination.mkdir(parents=True, exist_ok=True)
+    EngineApiBackend.extract(io.BytesIO(base64.b64decode(artifacts)),
+                             destination)
+
+
+class Worker:
+    """
+    Worker pulling jobs from coordinator and analysing them by local docker
+    daemon. Capacity limits number of jobs analysed at once.
+    """
+    RED_COLOR = '\033[91m{}\033[00m'
+    TAG = 'secpo-job-{worker}-{job}'
+    HEARTBEAT = 10
+    # Seconds before unreachable coordinator is asked again
+    RETRY = 5
+    # Calls of unreachable coordinator before job is given up
+    ATTEMPTS = 3
+
+    def __init__(self, transport, name=None, capacity=1, starter=None):
+        """ Initialize """
+        self.transport = transport
+        self.name = name or '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.capacity = max(capacity, 1)
+        self.starter = starter or VirtualStarter({})
+        self.completed = 0
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    async def local_images(self):
+        """
+        :return: Tags of base images that are present in local daemon.
+        """
+        registry = self.starter.registry
+        recipes = registry.recipes()
+        present = await asyncio.gather(*[registry.exists(recipe[0])
+                                         for recipe in recipes.values()])
+        return [recipe[0] for recipe, exists in zip(recipes.values(), present)
+                if exists]
+
+    async def call(self, method, payload):
+        """
+        Call coordinator, unreachable coordinator is asked again.
+        :param method: Method of Class:`JobQueue`.
+        :param payload: Dictionary of arguments.
+        :return: Dictionary of response.
+        :raise OSError: When coordinator stays unreachable.
+        """
+        for attempt in range(1, self.ATTEMPTS + 1):
+            try:
+                return await self.transport.call(method, payload)
+            except OSError as error:
+                if attempt == self.ATTEMPTS:
+                    raise
+                print(self.RED_COLOR.format("Coordinator is not reachable: "
+                                            "{}".format(error)))
+                await asyncio.sleep(self.RETRY)
+
+    async def register(self):
+        await self.call('register', {
+                'worker': self.name, 'capacity': self.capacity,
+                'images': await self.local_images()})
+
+    async def run(self):
+        """
+        Analyse jobs until coordinator stops worker.
+        """
+        await self.register()
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            await asyncio.gather(*[self._slot()
+                                   for _ in range(self.capacity)])
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self):
+        while not self._stopped:
+            await asyncio.sleep(self.HEARTBEAT)
+            try:
+                response = await self.transport.call(
+                        'heartbeat', {'worker': self.name})
+                if response.get('stop'):
+                    self.stop()
+                elif not response.get('known'):
+                    await self.register()
+            except OSError:
+                continue
+
+    async def _slot(self):
+        while not self._stopped:
+            try:
+                response = await self.transport.call('lease',
+                                                     {'worker': self.name})
+                if response.get('known') is False:
+                    await self.register()
+                    continue
+            except OSError as error:
+                print(self.RED_COLOR.format("Coordinator is not reachable: "
+                                            "{}".format(error)))
+                await asyncio.sleep(self.RETRY)
+                continue
+            if response.get('stop'):
+                self.stop()
+                break
+            job = response.get('job')
+            if job:
+                await self.execute(job)
+
+    async def execute(self, job):
+        """
+        Analyse job and send its result artifacts to coordinator. Failed
+        job is reported to coordinator and worker continues with other jobs.
+        :param job: Dictionary of leased job.
+        :return: Whether job was successful.
+        """
+        try:
+            artifacts = await self._analyse(job)
+        except Exception as error:
+            print(self.RED_COLOR.format("Job {} failed: {}".format(
+                    job['id'], error)))
+            artifacts = None
+        success = artifacts is not None
+        images = [job['base_tag']] if success else []
+        try:
+            await self.call('complete', {
+                    'worker': self.name, 'job': job['id'],
+                    'success': success, 'images': images,
+                    'artifacts': artifacts})
+        except OSError:
+            # Lease of job expires and coordinator leases it again
+            pass
+        self.completed += 1
+        return success
+
+    async def _analyse(self, job):
+        """
+        :return: Archive of result artifacts or None when job failed.
+        """
+        tag = self.TAG.format(worker=self.name, job=job['id']).lower()
+        success = False
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'context'
+            results = Path(directory) / 'results'
+            results.mkdir()
+            EngineApiBackend.extract(
+                    io.BytesIO(base64.b64decode(job['context'])), path)
+            backend = self.starter.backend
+            try:
+                if await self.starter.create_container(
+                        path, tag, job['base_tag'],
+                        BuildContext.directory(path), job['dockerfile'],
+                        job['base_dockerfile']) is not False:
+                    success = await backend.copy_from(
+                            tag, job['results'] + '/.', results)
+                if not success:
+                    return None
+                # Coordinator gets only artifacts it processes
+                return pack_artifacts(results, ResultRetriever.result_files(
+                        results, job['key']))
+            finally:
+                await backend.remove(tag)
+                await backend.remove_image(tag)
+
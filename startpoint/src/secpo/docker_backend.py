@@ -0,0 +1,708 @@
+""" This module is created by Martin Vasko.
+    Backends of docker interaction. Engine API backend talks to docker daemon
+    over its local Unix socket with pooled HTTP connections. It streams build
+    context as tar, reads build progress as JSON messages and copies results
+    by archive endpoint. CLI backend spawns docker client and is used as
+    fallback when socket is not available. Both backends stream build
+    context created by secpo when it is given.
+"""
+
+from abc import ABCMeta, abstractmethod
+import asyncio
+from asyncio import create_subprocess_exec
+import copy
+import http.client
+import json
+import os
+from pathlib import Path
+import shutil
+import socket
+import tarfile
+import threading
+from urllib.parse import quote, urlencode
+
+from secpo.build_context import BuildContext
+from secpo.build_log import BuildLog
+
+
+class DockerBackend(metaclass=ABCMeta):
+    """
+    Operations with docker daemon used by virtualization starter and result
+    retriever.
+    """
+    RED_COLOR = '\033[91m{}\033[00m'
+    CONTAINER = 'container'
+    IMAGE = 'image'
+
+    @abstractmethod
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        """
+        Build image from directory.
+        :param path: Build context.
+        :param tag: Tag of built image.
+        :param dockerfile: Name of Dockerfile inside build context.
+        :param on_event: Callback of Class:`BuildEvent` of build.
+        :param context: Class:`BuildContext` streamed instead of whole path.
+        :return: Last output line and whether build was successful.
+        """
+        pass
+
+    @abstractmethod
+    async def create(self, name, image):
+        """
+        Create container from image.
+        :return: Whether container was created.
+        """
+        pass
+
+    @abstractmethod
+    async def start(self, name, image, command):
+        """
+        Create and start long-lived container of image.
+        :param name: Name of container.
+        :param image: Tag of image.
+        :param command: Entrypoint of container and its arguments.
+        :return: Whether container was started.
+        """
+        pass
+
+    @abstractmethod
+    async def execute(self, container, command):
+        """
+        Run shell command inside running container.
+        :param container: Name of container.
+        :param command: Shell command.
+        :return: Whether command was successful.
+        """
+        pass
+
+    @abstractmethod
+    async def put_archive(self, container, destination, context):
+        """
+        Extract build context into directory of running container.
+        :param container: Name of container.
+        :param destination: Existing directory inside container.
+        :param context: Class:`BuildContext` of extracted files.
+        :return: Whether context was extracted.
+        """
+        pass
+
+    @abstractmethod
+    async def copy_from(self, container, source, destination):
+        """
+        Copy file or directory from container to host directory.
+        :param container: Name of container.
+        :param source: Path inside container.
+        :param destination: Directory on host.
+        :return: Whether copying was successful.
+        """
+        pass
+
+    @abstractmethod
+    async def disconnect(self, network, container):
+        """
+        Disconnect container from network.
+        :return: Whether container was disconnected.
+        """
+        pass
+
+    @abstractmethod
+    async def remove(self, container):
+        """
+        Remove container even when it is running.
+        :return: Whether container was removed.
+        """
+        pass
+
+    @abstractmethod
+    async def remove_image(self, tag):
+        """
+        Remove image even when it is tagged more times.
+        :return: Whether image was removed.
+        """
+        pass
+
+    @abstractmethod
+    async def prune(self, prune_type):
+        """
+        Prune unused objects of type.
+        :param prune_type: CONTAINER or IMAGE.
+        :return: Whether pruning was successful.
+        """
+        pass
+
+    @abstractmethod
+    async def image_exists(self, tag):
+        """
+        :return: True when image with tag is present in daemon.
+        """
+        pass
+
+    def kill_processes(self):
+        """
+        Abort running operations when end of program was initiated.
+        """
+        pass
+
+
+class CliBackend(DockerBackend):
+    """
+    Backend spawning docker command line client.
+    """
+    DOCKER_BUILD = ['docker', 'build', '-t']
+    DOCKER_FILE = '-f'
+    DOCKER_CREATE = ['docker', 'create', '--name', '{name}', '{image}']
+    DOCKER_RUN = ['docker', 'run', '-d', '--name', '{name}', '--entrypoint',
+                  '{entrypoint}', '{image}']
+    DOCKER_EXEC = ['docker', 'exec', '{cont_id}', 'sh', '-c', '{cmd}']
+    # Archive read from standard input is extracted into container
+    DOCKER_PUT = ['docker', 'cp', '-', '{cont_id}:{dst}']
+    DOCKER_CP = ['docker', 'cp', '{cont_id}:{src}', '{dst}']
+    DOCKER_DISCONNECT = ['docker', 'network', 'disconnect', '{network}',
+                         '{cont_id}']
+    DOCKER_RM = ['docker', 'rm', '-f', '{cont_id}']
+    DOCKER_RMI = ['docker', 'rmi', '-f', '{tag}']
+    DOCKER_PRUNE = ['docker', '{prune_type}', 'prune', '-f']
+    DOCKER_IMAGE_INSPECT = ['docker', 'image', 'inspect', '{tag}']
+    # Build context is read from standard input
+    STDIN = '-'
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, exec_cmd=None):
+        """ Initialize """
+        # Runner of short commands, it returns whether command succeeded
+        self._exec_cmd = exec_cmd or self._run
+        self._processes = []
+
+    async def _run(self, cmd, log=True):
+        try:
+            process = await create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError as error:
+            if log:
+                print(self.RED_COLOR.format(str(error)))
+            return False
+        stdout, stderr = await process.communicate()
+        if log and stdout:
+            print(stdout.decode('utf-8'), end='')
+        if log and stderr:
+            print(self.RED_COLOR.format(stderr.decode('utf-8')), end='')
+        return process.returncode == 0
+
+    @staticmethod
+    def _format(command, **kwargs):
+        return [part.format(**kwargs) for part in command]
+
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        # Create copy of class constant
+        command = copy.copy(self.DOCKER_BUILD)
+        command.append(tag)
+        if dockerfile:
+            command.append(self.DOCKER_FILE)
+            # Dockerfile of streamed context is part of archive
+            command.append(dockerfile if context
+                           else str(Path(path) / dockerfile))
+        command.append(self.STDIN if context else str(path))
+        try:
+            process = await create_subprocess_exec(
+                    *command, stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    stdin=asyncio.subprocess.PIPE if context else None)
+        except FileNotFoundError as error:
+            print(self.RED_COLOR.format(str(error)))
+            return '', False
+        self._processes.append(process)
+        build_log = BuildLog(on_event)
+        try:
+            if context:
+                success, _ = await asyncio.gather(
+                        build_log.follow(process),
+                        self._write_context(process.stdin, context.archive()))
+            else:
+                success = await build_log.follow(process)
+        finally:
+            if process in self._processes:
+                self._processes.remove(process)
+        return build_log.last_line, success
+
+    async def _write_context(self, stdin, archive):
+        try:
+            while True:
+                chunk = archive.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                stdin.write(chunk)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # Build failed before whole context was read
+            pass
+        finally:
+            archive.close()
+            stdin.close()
+
+    async def create(self, name, image):
+        return await self._exec_cmd(self._format(self.DOCKER_CREATE,
+                                                 name=name, image=image))
+
+    async def start(self, name, image, command):
+        return await self._exec_cmd(self._format(
+                self.DOCKER_RUN, name=name, entrypoint=command[0],
+                image=image) + list(command[1:]))
+
+    async def execute(self, container, command):
+        return await self._exec_cmd(self._format(self.DOCKER_EXEC,
+                                                 cont_id=container,
+                                                 cmd=command))
+
+    async def put_archive(self, container, destination, context):
+        command = self._format(self.DOCKER_PUT, cont_id=container,
+                               dst=destination)
+        try:
+            process = await create_subprocess_exec(
+                    *command, stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError as error:
+            print(self.RED_COLOR.format(str(error)))
+            return False
+        self._processes.append(process)
+        try:
+            (_, stderr), _ = await asyncio.gather(
+                    process.communicate(),
+                    self._write_context(process.stdin, context.archive()))
+        finally:
+            if process in self._processes:
+                self._processes.remove(process)
+        if stderr:
+            print(self.RED_COLOR.format(stderr.decode('utf-8')), end='')
+        return process.returncode == 0
+
+    async def copy_from(self, container, source, destination):
+        return await self._exec_cmd(self._format(self.DOCKER_CP,
+                                                 cont_id=container, src=source,
+                                                 dst=str(destination)))
+
+    async def disconnect(self, network, container):
+        return await self._exec_cmd(self._format(self.DOCKER_DISCONNECT,
+                                                 network=network,
+                                                 cont_id=container))
+
+    async def remove(self, container):
+        return await self._exec_cmd(self._format(self.DOCKER_RM,
+                                                 cont_id=container))
+
+    async def remove_image(self, tag):
+        return await self._exec_cmd(self._format(self.DOCKER_RMI, tag=tag))
+
+    async def prune(self, prune_type):
+        return await self._exec_cmd(self._format(self.DOCKER_PRUNE,
+                                                 prune_type=prune_type))
+
+    async def image_exists(self, tag):
+        return await self._run(self._format(self.DOCKER_IMAGE_INSPECT,
+                                            tag=tag), log=False)
+
+    def kill_processes(self):
+        for process in self._processes:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                continue
+        self._processes = []
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over Unix domain socket.
+    """
+    def __init__(self, socket_path, timeout=None):
+        """ Initialize """
+        super(UnixHTTPConnection, self).__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class EngineApiError(Exception):
+    """
+    Docker daemon answered with unexpected status.
+    """
+    def __init__(self, status, message):
+        """ Initialize """
+        super(EngineApiError, self).__init__(
+                "{status}: {message}".format(status=status, message=message))
+        self.status = status
+
+
+class EngineApiBackend(DockerBackend):
+    """
+    Backend talking to Docker Engine API over local Unix socket.
+    """
+    DOCKER_SOCKET = '/var/run/docker.sock'
+    POOL_SIZE = 8
+    TIMEOUT = 600
+    CHUNK_SIZE = 64 * 1024
+    JSON = 'application/json'
+    TAR = 'application/x-tar'
+    # Statuses of successful responses without content
+    NO_CONTENT = [200, 201, 204, 304]
+    # End of build progress stream
+    END = None
+    DIRECTORY_CONTENT = '/.'
+
+    def __init__(self, socket_path=DOCKER_SOCKET, pool_size=POOL_SIZE,
+                 timeout=TIMEOUT):
+        """ Initialize """
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle = []
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = UnixHTTPConnection(self.socket_path,
+                                                self.timeout)
+            self._busy.add(connection)
+            return connection
+
+    def _release(self, connection, reusable=True):
+        with self._lock:
+            self._busy.discard(connection)
+            if reusable and len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _send(self, method, url, body=None, headers=None):
+        connection = self._acquire()
+        try:
+            connection.request(method, url, body=body, headers=headers or {})
+            return connection, connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Pooled connection could be closed by daemon, try fresh one
+            self._release(connection, reusable=False)
+            if hasattr(body, 'seek'):
+                body.seek(0)
+            connection = self._acquire()
+            try:
+                connection.request(method, url, body=body,
+                                   headers=headers or {})
+                return connection, connection.getresponse()
+            except BaseException:
+                self._release(connection, reusable=False)
+                raise
+
+    def _request(self, method, url, body=None, headers=None):
+        """
+        Send request and read whole response.
+        :return: Status and content of response.
+        """
+        connection, response = self._send(method, url, body, headers)
+        try:
+            data = response.read()
+        except BaseException:
+            self._release(connection, reusable=False)
+            raise
+        self._release(connection, not response.will_close)
+        return response.status, data
+
+    def _json_request(self, method, url, content=None):
+        body = None
+        headers = {}
+        if content is not None:
+            body = json.dumps(content).encode('utf-8')
+            headers['Content-Type'] = self.JSON
+        return self._request(method, url, body, headers)
+
+    async def _call(self, function, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, function, *args)
+
+    async def _simple(self, method, url, content=None):
+        try:
+            status, data = await self._call(self._json_request, method, url,
+                                            content)
+        except (http.client.HTTPException, OSError) as error:
+            print(self.RED_COLOR.format(str(error)))
+            return False
+        if status not in self.NO_CONTENT:
+            print(self.RED_COLOR.format(self.error_message(status, data)))
+            return False
+        return True
+
+    @staticmethod
+    def error_message(status, data):
+        """
+        Extract message of daemon from error response.
+        """
+        try:
+            message = json.loads(data.decode('utf-8'))['message']
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+            message = data.decode('utf-8', errors='replace').strip()
+        return str(EngineApiError(status, message))
+
+    def _stream_build(self, url, context, loop, queue):
+        """
+        Send build context and forward progress messages to event loop.
+        """
+        put = queue.put_nowait
+        try:
+            context.seek(0, os.SEEK_END)
+            headers = {'Content-Type': self.TAR,
+                       'Content-Length': str(context.tell())}
+            context.seek(0)
+            connection, response = self._send('POST', url, context, headers)
+            reusable = False
+            try:
+                if response.status != 200:
+                    loop.call_soon_threadsafe(put, {'error': self.error_message(
+                            response.status, response.read())})
+                    return
+                for line in response:
+                    line = line.strip()
+                    if line:
+                        loop.call_soon_threadsafe(put, json.loads(
+                                line.decode('utf-8')))
+                reusable = not response.will_close
+            finally:
+                self._release(connection, reusable)
+        except (http.client.HTTPException, OSError, ValueError) as error:
+            loop.call_soon_threadsafe(put, {'error': str(error)})
+        finally:
+            context.close()
+            loop.call_soon_threadsafe(put, self.END)
+
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        query = {'t': tag, 'rm': 1}
+        if dockerfile:
+            query['dockerfile'] = dockerfile
+        url = '/build?' + urlencode(query)
+        context = (context or BuildContext.directory(path)).archive()
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        streaming = loop.run_in_executor(None, self._stream_build, url,
+                                         context, loop, queue)
+        build_log = BuildLog(on_event)
+        success = True
+        while True:
+            message = await queue.get()
+            if message is self.END:
+                break
+            if 'error' in message:
+                success = False
+                build_log.feed('ERROR: ' + message['error'],
+                               BuildLog.STDERR)
+                continue
+            text = message.get('stream') or message.get('status')
+            if text:
+                for line in text.splitlines():
+                    build_log.feed(line)
+        await streaming
+        return build_log.last_line, success
+
+    async def create(self, name, image):
+        return await self._simple('POST', '/containers/create?' +
+                                  urlencode({'name': name}), {'Image': image})
+
+    async def start(self, name, image, command):
+        if not await self._simple('POST', '/containers/create?' +
+                                  urlencode({'name': name}),
+                                  {'Image': image,
+                                   'Entrypoint': list(command[:1]),
+                                   'Cmd': list(command[1:])}):
+            return False
+        return await self._simple('POST', '/containers/{}/start'.format(
+                quote(name, safe='')))
+
+    def _execute(self, container, command):
+        status, data = self._json_request(
+                'POST', '/containers/{}/exec'.format(quote(container,
+                                                           safe='')),
+                {'Cmd': ['sh', '-c', command], 'AttachStdout': True,
+                 'AttachStderr': True, 'Tty': True})
+        if status != 201:
+            print(self.RED_COLOR.format(self.error_message(status, data)))
+            return False
+        exec_id = quote(json.loads(data.decode('utf-8'))['Id'], safe='')
+        # Output of terminal is not multiplexed, it ends with command
+        status, data = self._json_request(
+                'POST', '/exec/{}/start'.format(exec_id),
+                {'Detach': False, 'Tty': True})
+        if status != 200:
+            print(self.RED_COLOR.format(self.error_message(status, data)))
+            return False
+        if data:
+            print(data.decode('utf-8', errors='replace'), end='')
+        status, data = self._json_request('GET',
+                                          '/exec/{}/json'.format(exec_id))
+        if status != 200:
+            print(self.RED_COLOR.format(self.error_message(status, data)))
+            return False
+        return json.loads(data.decode('utf-8')).get('ExitCode') == 0
+
+    async def execute(self, container, command):
+        try:
+            return await self._call(self._execute, container, command)
+        except (http.client.HTTPException, OSError, ValueError,
+                KeyError) as error:
+            print(self.RED_COLOR.format(str(error)))
+            return False
+
+    def _put_archive(self, container, destination, context):
+        archive = context.archive()
+        try:
+            archive.seek(0, os.SEEK_END)
+            headers = {'Content-Type': self.TAR,
+                       'Content-Length': str(archive.tell())}
+            archive.seek(0)
+            status, data = self._request(
+                    'PUT', '/containers/{}/archive?{}'.format(
+                            quote(container, safe=''),
+                            urlencode({'path': destination})),
+                    archive, headers)
+        finally:
+            archive.close()
+        if status != 200:
+            print(self.RED_COLOR.format(self.error_message(status, data)))
+            return False
+        return True
+
+    async def put_archive(self, container, destination, context):
+        try:
+            return await self._call(self._put_archive, container,
+                                    destination, context)
+        except (http.client.HTTPException, OSError) as error:
+            print(self.RED_COLOR.format(str(error)))
+            return False
+
+    def _copy_from(self, container, source, destination):
+        # Content of directory is copied without directory itself
+        strip = 1 if source.endswith(self.DIRECTORY_CONTENT) else 0
+        if strip:
+            source = source[:-len(self.DIRECTORY_CONTENT)]
+        url = '/containers/{}/archive?{}'.format(
+                quote(container, safe=''), urlencode({'path': source}))
+        connection, response = self._send('GET', url)
+        reusable = False
+        try:
+            if response.status != 200:
+                print(self.RED_COLOR.format(self.error_message(
+                        response.status, response.read())))
+                reusable = not response.will_close
+                return False
+            self.extract(response, destination, strip)
+            # Read rest of stream, so connection can be reused
+            while response.read(self.CHUNK_SIZE):
+                pass
+            reusable = not response.will_close
+            return True
+        finally:
+            self._release(connection, reusable)
+
+    @staticmethod
+    def extract(stream, destination, strip=0):
+        """
+        Extract regular files and directories of tar stream into destination.
+        Members pointing outside of destination are skipped.
+        :param stream: File object of tar archive.
+        :param destination: Directory on host.
+        :param strip: Number of leading path components that are removed.
+        """
+        destination = Path(destination)
+        with tarfile.open(fileobj=stream, mode='r|') as archive:
+            for member in archive:
+                name = os.path.normpath(member.name)
+                if os.path.isabs(name) or name.split(os.sep)[0] == '..':
+                    continue
+                parts = name.split(os.sep)[strip:]
+                if not parts:
+                    continue
+                target = destination.joinpath(*parts)
+                if member.isdir():
+                    target.mkdir(parents=True, exist_ok=True)
+                elif member.isfile():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    with archive.extractfile(member) as source, \
+                            open(str(target), 'wb') as output:
+                        shutil.copyfileobj(source, output)
+
+    async def copy_from(self, container, source, destination):
+        try:
+            return await self._call(self._copy_from, container, source,
+                                    destination)
+        except (http.client.HTTPException, OSError, tarfile.TarError) as error:
+            print(self.RED_COLOR.format(str(error)))
+            return False
+
+    async def disconnect(self, network, container):
+        return await self._simple('POST', '/networks/{}/disconnect'.format(
+                quote(network, safe='')), {'Container': container})
+
+    async def remove(self, container):
+        return await self._simple('DELETE', '/containers/{}?{}'.format(
+                quote(container, safe=''), urlencode({'force': 1})))
+
+    async def remove_image(self, tag):
+        return await self._simple('DELETE', '/images/{}?{}'.format(
+                quote(tag, safe=''), urlencode({'force': 1})))
+
+    async def prune(self, prune_type):
+        return await self._simple('POST', '/{}s/prune'.format(prune_type))
+
+    async def image_exists(self, tag):
+        try:
+            status, _ = await self._call(
+                    self._json_request, 'GET',
+                    '/images/{}/json'.format(quote(tag, safe='')))
+        except (http.client.HTTPException, OSError):
+            return False
+        return status == 200
+
+    def kill_processes(self):
+        # Closing connection aborts build or copying on daemon side
+        with self._lock:
+            connections = list(self._busy) + self._idle
+            self._idle = []
+        for connection in connections:
+            if connection.sock:
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            connection.close()
+
+
+def create_backend(backend='auto', socket_path=None):
+    """
+    Create docker backend. Engine API is used automatically when socket of
+    daemon is accessible, docker client otherwise.
+    :param backend: 'api', 'cli' or 'auto'.
+    :param socket_path: Path of socket of docker daemon.
+    :return: Class:`DockerBackend`.
+    """
+    if socket_path is None:
+        socket_path = EngineApiBackend.DOCKER_SOCKET
+        docker_host = os.environ.get('DOCKER_HOST', '')
+        if docker_host.startswith('unix://'):
+            socket_path = docker_host[len('unix://'):]
+        elif docker_host and backend == 'auto':
+            # Remote daemon is reachable by docker client only
+            return CliBackend()
+    if backend == 'cli':
+        return CliBackend()
+    if backend == 'api' or os.access(socket_path, os.R_OK | os.W_OK):
+        return EngineApiBackend(socket_path)
+    return CliBackend()
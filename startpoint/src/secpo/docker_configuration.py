@@ -7,41 +7,43 @@
 from abc import ABCMeta, abstractmethod
 from enum import Enum
 from functools import wraps
+import hashlib
 import itertools
 import os
 from re import search
+from secpo.analyser_registry import REGISTRY
 from secpo.command_builder import CommandBuilder
 from secpo.docker_images import ApparmorDockerImageFactory, \
     CustomDockerImageFactory, AbstractDockerImageFactory
+from secpo.path_operation import PathOperation
+from secpo.profiler import Profiler, timed
 
 
 class DirectoryToImageAndTools(Enum):
+    # Analysers of languages are declared in analyser_registry.py, analysis
+    # contains only build steps that require source files
     CL = {'CL': 'ubuntu', 'os_tools': ['cppcheck'],
           'specific_tools': [],
-          'other': ['WORKDIR /home/C/app',
-                    'RUN cppcheck --xml --enable=all '
-                    '--suppress=missingIncludeSystem . 2> result.xml',
-                    'RUN cat result.xml']}
+          'other': ['WORKDIR /home/C/app']}
     CPP = {'CPP': 'ubuntu', 'os_tools': ['cppcheck'],
            'specific_tools': [],
-           'other': ['WORKDIR /home/C++/app',
-                     'RUN cppcheck --xml --enable=all '
-                     '--suppress=missingIncludeSystem . 2> result.xml']}
+           'other': ['WORKDIR /home/C++/app']}
     CS = {'CS': 'vagrant', 'os_tools': ['Roslynator'],
           'specific_tools': [],
           'other': [],}
     GO = {'GO': 'golang', 'os_tools': ['golang.org/x/lint/golint',
                                     'honnef.co/go/tools/cmd/staticcheck'],
           'specific_tools': [],
-          'other': ['WORKDIR /go/src/app', 'COPY . .',
-                    'RUN go get -d -v ./...', 'RUN go install -v ./...']}
+          'other': ['WORKDIR /go/src/app'],
+          'analysis': ['RUN go get -d -v ./...', 'RUN go install -v ./...']}
     HASKELL = {'HASKELL': 'haskell', 'os_tools': ['pandoc pandoc-citeproc'],
                'specific_tools': [],
                'other': ['RUN cabal update', 'RUN cabal install hlint',
                          'ENTRYPOINT ["pandoc"]', 'WORKDIR /home/haskell/app']}
     JAVA = {'JAVA': 'java', 'os_tools': ["checkstyle", "gradle"],
             'specific_tools': [],
-            'other': ["RUN gradle init", "COPY build.gradle .", "RUN gradlew build"]}
+            'other': ["WORKDIR /home/java/app", "RUN gradle init"],
+            'analysis': ["COPY build.gradle .", "RUN gradlew build"]}
     JAVASCRIPT = {'JAVASCRIPT': 'node',
                   'os_tools': ['git gzip'],
                   'specific_tools': ["-g jshint --save-dev", "eslint --save-dev",
@@ -49,9 +51,7 @@ class DirectoryToImageAndTools(Enum):
                                      "eslint-plugin-node --save-dev",
                                      "eslint-plugin-promise --save-dev",
                                      "eslint-plugin-standard --save-dev"],
-                  'other': ["WORKDIR /home/javascript/app",
-                            "RUN jshint . || true",
-                            "RUN npx eslint . > result.txt || true"]}
+                  'other': ["WORKDIR /home/javascript/app"]}
     # http://jslint.com/
     KOTLIN = {'KOTLIN': 'codesignal/java:v5.6.1', 'os_tools': [],
               'specific_tools': [],
@@ -66,9 +66,9 @@ class DirectoryToImageAndTools(Enum):
                          && rm /tmp/a.zip \
                          && rm -rf /var/lib/apt/lists/*',
                         'ENV PATH $PATH:/opt/kotlinc/bin',
-                        'RUN gradle init --dsl kotlin'
-                        'COPY build.gradle .',
-                        'RUN gradlew build']}
+                        'WORKDIR /home/kotlin/app',
+                        'RUN gradle init --dsl kotlin'],
+              'analysis': ['COPY build.gradle .', 'RUN gradlew build']}
     LUA = {'LUA': 'ubuntu', 'os_tools': ['lua', 'luarocks'],
            'specific_tools': [],
            'other': ['RUN luarocks install luacheck', 'WORKDIR /home/lua/app']}
@@ -83,6 +83,7 @@ class DirectoryToImageAndTools(Enum):
            'other': ['RUN curl -sS https://getcomposer.org/installer | php -- '
                      '--install-dir=/usr/local/bin --filename=composer',
                      'WORKDIR /home/php/app',
+                     'COPY composer.json ./',
                      'RUN php /usr/local/bin/composer install',
                      'RUN ./vendor/phan/phan/phan --init']}
     PROLOG = {'PROLOG': 'swipl', 'os_tools': [],
@@ -96,9 +97,7 @@ class DirectoryToImageAndTools(Enum):
                         'RUN pip install bandit jedi',
                         'RUN python2 -m ensurepip --default-pip',
                         'RUN pip2 install --no-cache-dir -r requirements.txt',
-                        'RUN pip2 install bandit jedi',
-                        'RUN python2 -m bandit -f html -o result2.html -r . || true',
-                        'RUN bandit -f html -o result.html -r . || true']}
+                        'RUN pip2 install bandit jedi']}
     RL = {'RL': 'ubuntu', 'os_tools': [],
           'specific_tools': [],
           'other': ['WORKDIR /home/r/app']}
@@ -109,19 +108,17 @@ class DirectoryToImageAndTools(Enum):
                       'WORKDIR /usr/src/app', 'COPY Gemfile ./',
                       'RUN bundle install',
                       # 'RUN brakeman --color -o result.html -o result.json',
-                      'RUN reek --help',
-                      'RUN reek -t -f html > result.html']}
+                      'RUN reek --help']}
     RUST = {'RUST': 'rust', 'os_tools': [],
             'specific_tools': [],
-            'other': ['WORKDIR /usr/src/rust/app', 'COPY . .',
-                      'RUN cargo install --path .',
+            'other': ['WORKDIR /usr/src/rust/app',
                       "RUN curl --proto '=https' --tlsv1.2 "
                       "-sSf https://sh.rustup.rs | sh",
                       "RUN rustup update",
                       "RUN rustup component add clippy",
-                      "RUN cargo clippy",
                       "RUN cargo install cargo-fix",
-                      ]}
+                      ],
+            'analysis': ['RUN cargo install --path .', 'RUN cargo clippy']}
     SCALA = {'SCALA': 'ubuntu', 'os_tools': ['-y scala'],
              'specific_tools': [],
              'other': ['WORKDIR /home/scala/app']}
@@ -150,7 +147,11 @@ class AbstractDockerSecurity(metaclass=ABCMeta):
     OS_TOOLS = 'os_tools'
     SPECIFIC_TOOLS = 'specific_tools'
     OTHER_CMD = 'other'
+    # Commands that depend on source files, executed after sources are copied
+    ANALYSIS_CMD = 'analysis'
     WORKDIR = 'WORKDIR '
+    # Base image of language declared only by analyser plugin
+    IMAGE = 'image'
 
     @abstractmethod
     def __init__(self):
@@ -159,17 +160,25 @@ class AbstractDockerSecurity(metaclass=ABCMeta):
         self.os_tools = None
         self.specific_tools = None
         self.other_commands = None
+        self.analysis_commands = None
         self.docker_workdir = None
 
     def convert_directory_to_image(self, prog_language):
-        dict_values = DirectoryToImageAndTools[prog_language].value
-        self.image = dict_values[prog_language]
+        if prog_language in DirectoryToImageAndTools.__members__:
+            dict_values = DirectoryToImageAndTools[prog_language].value
+            self.image = dict_values[prog_language]
+        else:
+            dict_values = REGISTRY.recipe(prog_language)
+            if not dict_values:
+                raise KeyError(prog_language)
+            self.image = dict_values[self.IMAGE]
         if isinstance(dict_values[self.OS_TOOLS], list):
             self.os_tools = dict_values[self.OS_TOOLS]
         if isinstance(dict_values[self.SPECIFIC_TOOLS], list):
             self.specific_tools = dict_values[self.SPECIFIC_TOOLS]
         if isinstance(dict_values[self.OTHER_CMD], list):
             self.other_commands = dict_values[self.OTHER_CMD]
+        self.analysis_commands = dict_values.get(self.ANALYSIS_CMD, [])
 
         # Parse working directory for concrete image_factory
         pattern = "(?<=" + self.WORKDIR + ").*$"
@@ -189,7 +198,8 @@ class AbstractDockerSecurity(metaclass=ABCMeta):
 
     @abstractmethod
     def create_toolset(self, package_manager, program_package_installer=None,
-                       os_tools=None, specific_tools=None, other_commands=None):
+                       os_tools=None, specific_tools=None, other_commands=None,
+                       analysis_commands=None):
         """
         Creates unique toolset for one docker configuration purposes.
 
@@ -207,6 +217,8 @@ class AbstractDockerSecurity(metaclass=ABCMeta):
         :type specific_tools: list
         :param other_commands: Other commands that are part of
                                configuration of virtual environment.
+        :param analysis_commands: Commands that require source files,
+                                  they are executed after sources are copied.
         :return: tools: Concrete realization of class:`AbstractToolset`
         """
         pass
@@ -242,15 +254,19 @@ class SimpleSecurity(AbstractDockerSecurity):
         return image_factory
 
     def create_toolset(self, package_manager, program_package_installer=None,
-                       os_tools=None, specific_tools=None, other_commands=None):
+                       os_tools=None, specific_tools=None, other_commands=None,
+                       analysis_commands=None):
         if not os_tools:
             os_tools = self.os_tools
         if not specific_tools:
             specific_tools = self.specific_tools
         if not other_commands:
             other_commands = self.other_commands
+        if not analysis_commands:
+            analysis_commands = self.analysis_commands
         return GeneralToolset(package_manager, program_package_installer,
-                              os_tools, specific_tools, other_commands)
+                              os_tools, specific_tools, other_commands,
+                              analysis_commands)
 
 
 class CustomizedSecurity(AbstractDockerSecurity):
@@ -270,9 +286,11 @@ class CustomizedSecurity(AbstractDockerSecurity):
         return image_factory
 
     def create_toolset(self, package_manager, program_package_installer=None,
-                       os_tools=None, specific_tools=None, other_commands=None):
+                       os_tools=None, specific_tools=None, other_commands=None,
+                       analysis_commands=None):
         return GeneralToolset(package_manager, program_package_installer,
-                              os_tools, specific_tools, other_commands)
+                              os_tools, specific_tools, other_commands,
+                              analysis_commands)
 
 
 class AbstractToolset(metaclass=ABCMeta):
@@ -289,10 +307,11 @@ class AbstractToolset(metaclass=ABCMeta):
     APK_ADD = 'add'
     APK_CLEAN_REGISTRY = '--no-cache'
     NPM = 'npm'
+    COPY_SOURCES = 'COPY . .'
 
     @abstractmethod
     def __init__(self, package_manager, program_package_installer, os_tools,
-                 specific_tools, other_commands):
+                 specific_tools, other_commands, analysis_commands=None):
         """ Initialize with list of tools """
         self._package_manager = package_manager
         self._program_package_installer = program_package_installer
@@ -303,6 +322,7 @@ class AbstractToolset(metaclass=ABCMeta):
         if isinstance(specific_tools, (list, itertools.chain)):
             self._specific_tools = specific_tools
         self._other_commands = other_commands
+        self._analysis_commands = analysis_commands or []
         self.first_tool = []
 
     def __add__(self, other):
@@ -360,19 +380,25 @@ class AbstractToolset(metaclass=ABCMeta):
         command = CommandBuilder()
         if self._other_commands:
             for other_cmd in self._other_commands:
+                # Sources are copied after all tools are installed
+                if other_cmd == self.COPY_SOURCES:
+                    continue
                 if AbstractDockerSecurity.WORKDIR in other_cmd:
-                    # Add workdir before copying
                     command += other_cmd
-                    command += CommandBuilder(self.COPY, '. .')
                 else:
                     command += CommandBuilder(other_cmd)
         return command
 
-    @abstractmethod
-    def install(self) -> CommandBuilder:
+    def _add_analysis_commands(self):
+        command = CommandBuilder(self.COPY_SOURCES)
+        for analysis_cmd in self._analysis_commands:
+            command += CommandBuilder(analysis_cmd)
+        return command
+
+    def install_toolchain(self) -> CommandBuilder:
         """
-        Specify concrete steps how to install particular tools. Which tools
-        should be when executed and pass additional arguments to them.
+        Steps that install tools. They do not depend on source files so
+        layers of docker image stay cached when sources change.
         """
         # Update packages
         command = self._update_packages()
@@ -396,16 +422,34 @@ class AbstractToolset(metaclass=ABCMeta):
         command += self._add_other_commands()
         return command
 
+    def install_sources(self) -> CommandBuilder:
+        """
+        Copy source files and run commands that depend on them. Analysis
+        commands are appended right after this step.
+        """
+        return self._add_analysis_commands()
+
+    @abstractmethod
+    def install(self) -> CommandBuilder:
+        """
+        Specify concrete steps how to install particular tools. Which tools
+        should be when executed and pass additional arguments to them.
+        """
+        command = self.install_toolchain()
+        command += self.install_sources()
+        return command
+
 
 class GeneralToolset(AbstractToolset):
     """
     Toolset used for single run of specific docker container.
     """
     def __init__(self, package_manager, program_package_installer, os_tools,
-                 specific_tools, other_commands):
+                 specific_tools, other_commands, analysis_commands=None):
         super(GeneralToolset, self).__init__(package_manager,
                                              program_package_installer, os_tools,
-                                             specific_tools, other_commands)
+                                             specific_tools, other_commands,
+                                             analysis_commands)
 
     def specify_tools(self, tools_type):
         pass
@@ -419,6 +463,8 @@ class ConfigCreator:
     HIGH = "high"
     POSIX = 'posix'
     WINDOWS = 'nt'
+    BASE_IMAGE = 'secpo-base-{language}:{recipe_hash}'
+    BASE_IMAGE_HASH_LENGTH = 12
 
     def __init__(self, path_conf, image=None,
                  security_level=None):
@@ -441,7 +487,11 @@ class ConfigCreator:
         self.image_factory = {}
         self.profiles = {}
         self.dict_enum_directories = {}
+        # Tags of analyser base images for every path component
+        self.base_images = {}
         self.toolset = None
+        # Timing of phases shared with other subsystems
+        self.profiler = Profiler(enabled=False)
 
     def unroll_path(self):
         @wraps(self)
@@ -453,29 +503,30 @@ class ConfigCreator:
             config.image_factory = {}
             for component in config.path_components.items():
                 path = component[1][0]
-                prog_language = component[0]
+                # Components are keyed by job, every directory group of
+                # programming language is configured separately.
+                key = component[0]
+                prog_language = PathOperation.language(key)
                 # Append path of configuration
                 dockerfile_location.append(path)
                 # Create desired operation system image factory based on
                 # programming language input.
-                config.image_factory[path.name] = config.docker_conf\
+                config.image_factory[key] = config.docker_conf\
                     .create_image_factory(prog_language)
                 # Add enum directory for tagging docker machines.
-                config.dict_enum_directories[path.name] = config.docker_conf\
+                config.dict_enum_directories[key] = config.docker_conf\
                     .enum_directory
                 # Create list of profiles that will be applied in built image.
-                config.profiles[path.name] = []
-                config.profiles[path.name].append(config.
-                                                  image_factory[path.name]
-                                                  .create_seccomp_profile())
-                config.profiles[path.name].append(config.
-                                                  image_factory[path.name]
-                                                  .create_mac_profile())
+                config.profiles[key] = []
+                config.profiles[key].append(config.image_factory[key]
+                                            .create_seccomp_profile())
+                config.profiles[key].append(config.image_factory[key]
+                                            .create_mac_profile())
                 # todo: create toolset for each configuration
                 # todo: this could be singleton class
                 config.toolset = config.docker_conf.create_toolset(
-                        config.image_factory[path.name].package_manager,
-                        config.image_factory[path.name].program_package_installer)
+                        config.image_factory[key].package_manager,
+                        config.image_factory[key].program_package_installer)
                 config.docker_conf.default_tools = None
                 # Add configuration commands to path
                 dockerfile_configuration.append(self(*args, **kwargs))
@@ -492,11 +543,45 @@ class ConfigCreator:
             return zip(dockerfile_location, dockerfile_configuration)
         return _setup_dockerfile
 
+    @classmethod
+    def base_image_tag(cls, key, recipe, specific_tools):
+        """
+        Create tag of analyser base image. Tag contains hash of recipe and
+        specific tools so changed recipe is never served from old image.
+        :param key: Key of path component.
+        :param recipe: Commands of base image.
+        :param specific_tools: Tools written to package file of language.
+        :return: Tag of base image.
+        """
+        digest = hashlib.sha256(str(recipe).encode('utf-8'))
+        digest.update(repr(specific_tools).encode('utf-8'))
+        return cls.BASE_IMAGE.format(
+                language=PathOperation.language(key).lower(),
+                recipe_hash=digest.hexdigest()[:cls.BASE_IMAGE_HASH_LENGTH])
+
+    def docker_workdir(self, key):
+        """
+        Return working directory inside docker image of path component.
+        :param key: Key of path component.
+        :return: Docker working directory.
+        """
+        if key in self.image_factory:
+            return self.image_factory[key].docker_workdir
+        return self.docker_conf.docker_workdir
+
     # Go trough every dockerfile in requested input
+    @timed(Profiler.RENDER)
     @unroll_path
     def create_configuration(self):
+        key = list(self.image_factory.keys())[-1]
+        # Analyser base image contains only toolchain of language
+        recipe = CommandBuilder()
+        recipe += self.image_factory[key].image
+        recipe += self.toolset.install_toolchain()
+        self.base_images[key] = self.base_image_tag(
+                key, recipe, self.toolset.specific_tools)
+        # Dockerfile of tested directory copies sources on top of base image
         commands = CommandBuilder()
-        image_name = list(self.image_factory.keys())[-1]
-        commands += self.image_factory[image_name].image
-        commands += self.toolset.install()
-        return commands, self.toolset
+        commands += AbstractDockerImageFactory.FROM + self.base_images[key]
+        commands += self.toolset.install_sources()
+        return commands, self.toolset, recipe
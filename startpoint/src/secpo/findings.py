@@ -0,0 +1,250 @@
+""" This module is created by Martin Vasko.
+    Normalized findings of all analysers. Every finding is compact record
+    with tool, rule, severity, file, line, message and fingerprint. Findings
+    are exported as JSON Lines while targets finish and SARIF log is
+    streamed from them at the end, so findings of many targets are never
+    loaded into memory at once.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+class Finding:
+    """
+    Single normalized finding of analyser.
+    """
+    __slots__ = ('tool', 'rule', 'severity', 'file', 'line', 'message',
+                 'fingerprint')
+    # Severities are levels of SARIF
+    ERROR = 'error'
+    WARNING = 'warning'
+    NOTE = 'note'
+    SEVERITIES = [ERROR, WARNING, NOTE]
+    FINGERPRINT_LENGTH = 20
+    FORMAT = '{file}:{line}: {severity} [{tool}/{rule}] {message}'
+
+    def __init__(self, tool, rule, severity, file, line, message,
+                 fingerprint=None):
+        """ Initialize """
+        self.tool = tool
+        self.rule = rule
+        self.severity = severity if severity in self.SEVERITIES \
+            else self.WARNING
+        # Paths are relative to analysed directory
+        self.file = self.normalize_file(file)
+        self.line = int(line) if line else 0
+        self.message = ' '.join(message.split())
+        self.fingerprint = fingerprint or self.create_fingerprint(
+                tool, rule, self.file, self.message)
+
+    @staticmethod
+    def normalize_file(file):
+        """
+        :return: Posix path of file without leading './'.
+        """
+        file = (file or '').replace('\\', '/')
+        while file.startswith('./'):
+            file = file[2:]
+        return file
+
+    @classmethod
+    def create_fingerprint(cls, tool, rule, file, message):
+        """
+        Fingerprint identifies finding regardless of its line, so it is
+        stable when code above it changes.
+        """
+        identity = '\0'.join([tool, rule, file, message])
+        return hashlib.sha256(identity.encode('utf-8')) \
+            .hexdigest()[:cls.FINGERPRINT_LENGTH]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(*[record.get(name) for name in cls.__slots__])
+
+    def __eq__(self, other):
+        return isinstance(other, Finding) and \
+            self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash((self.fingerprint, self.line))
+
+    def __repr__(self):
+        return 'Finding({})'.format(', '.join(
+                repr(getattr(self, name)) for name in self.__slots__))
+
+    def __str__(self):
+        return self.FORMAT.format(**self.to_dict())
+
+
+def write_jsonl(findings, stream, target=None):
+    """
+    Write findings as JSON Lines.
+    :param findings: Iterable of Class:`Finding`.
+    :param stream: Text file opened for writing.
+    :param target: Tested directory added to every record.
+    :return: Number of written findings.
+    """
+    count = 0
+    for finding in findings:
+        record = finding.to_dict()
+        if target is not None:
+            record['target'] = target
+        stream.write(json.dumps(record, sort_keys=True) + '\n')
+        count += 1
+    return count
+
+
+def read_jsonl(stream):
+    """
+    Read findings from JSON Lines one by one.
+    :param stream: Text file with JSON Lines.
+    :return: Generator of tuples of target and Class:`Finding`.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        yield record.get('target'), Finding.from_dict(record)
+
+
+class SarifWriter:
+    """
+    Writes SARIF log incrementally. New run is started whenever tool of
+    written finding changes, so findings do not have to be grouped in memory.
+    """
+    VERSION = '2.1.0'
+    SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+    FINGERPRINT = 'secpo/v1'
+    TOOL_URI = 'https://github.com/Matovidlo/Se-Po'
+
+    def __init__(self, stream):
+        """ Initialize """
+        self.stream = stream
+        self._tool = None
+        self._results = 0
+        self._runs = 0
+
+    def __enter__(self):
+        self.stream.write('{{"$schema": {}, "version": {}, "runs": ['.format(
+                json.dumps(self.SCHEMA), json.dumps(self.VERSION)))
+        return self
+
+    def __exit__(self, *args):
+        self._close_run()
+        self.stream.write(']}\n')
+
+    def _close_run(self):
+        if self._tool is not None:
+            self.stream.write(']}')
+        self._tool = None
+
+    def _open_run(self, tool):
+        self._close_run()
+        if self._runs:
+            self.stream.write(', ')
+        driver = {'name': tool, 'informationUri': self.TOOL_URI}
+        self.stream.write('{{"tool": {{"driver": {}}}, "results": ['.format(
+                json.dumps(driver)))
+        self._tool = tool
+        self._runs += 1
+        self._results = 0
+
+    @classmethod
+    def result(cls, finding, target=None):
+        """
+        :return: SARIF result object of finding.
+        """
+        uri = finding.file
+        if target:
+            uri = '/'.join([Finding.normalize_file(target).rstrip('/'), uri])
+        region = {'startLine': finding.line} if finding.line > 0 else {}
+        location = {'physicalLocation': {'artifactLocation': {'uri': uri}}}
+        if region:
+            location['physicalLocation']['region'] = region
+        return {'ruleId': finding.rule,
+                'level': finding.severity,
+                'message': {'text': finding.message},
+                'locations': [location],
+                'partialFingerprints': {cls.FINGERPRINT: finding.fingerprint}}
+
+    def write(self, finding, target=None):
+        """
+        Append finding to log.
+        :param finding: Class:`Finding`.
+        :param target: Tested directory of finding.
+        """
+        if finding.tool != self._tool:
+            self._open_run(finding.tool)
+        if self._results:
+            self.stream.write(', ')
+        self.stream.write(json.dumps(self.result(finding, target),
+                                     sort_keys=True))
+        self._results += 1
+
+
+class FindingsExport:
+    """
+    Export of findings of all targets. Findings are appended to JSON Lines
+    file as targets finish. SARIF log is created from them when export is
+    closed.
+    """
+    def __init__(self, jsonl_path=None, sarif_path=None):
+        """ Initialize """
+        self.jsonl_path = jsonl_path
+        self.sarif_path = sarif_path
+        self._temporary = None
+        if sarif_path and not jsonl_path:
+            descriptor, self._temporary = tempfile.mkstemp(suffix='.jsonl')
+            os.close(descriptor)
+            self.jsonl_path = self._temporary
+        self._stream = None
+        if self.jsonl_path:
+            self._stream = open(str(self.jsonl_path), 'w')
+        self._lock = threading.Lock()
+        self.count = 0
+
+    @property
+    def enabled(self):
+        return self._stream is not None
+
+    def add(self, findings, target=None):
+        """
+        Append findings of target. It is safe to call from more threads.
+        :param findings: Iterable of Class:`Finding`.
+        :param target: Tested directory.
+        :return: Number of added findings.
+        """
+        if not self.enabled:
+            return 0
+        with self._lock:
+            count = write_jsonl(findings, self._stream,
+                                None if target is None else str(target))
+            self._stream.flush()
+            self.count += count
+        return count
+
+    def close(self):
+        """
+        Finish JSON Lines file and write SARIF log.
+        """
+        if not self.enabled:
+            return
+        self._stream.close()
+        self._stream = None
+        if self.sarif_path:
+            with open(str(self.jsonl_path), 'r') as jsonl, \
+                    open(str(self.sarif_path), 'w') as sarif:
+                with SarifWriter(sarif) as writer:
+                    for target, finding in read_jsonl(jsonl):
+                        writer.write(finding, target)
+        if self._temporary:
+            os.remove(self._temporary)
+            self._temporary = None
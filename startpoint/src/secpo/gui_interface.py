@@ -24,7 +24,6 @@ from PySide2.QtCore import Qt, QSortFilterProxyModel, QIdentityProxyModel, \
   QThread, QObject, QUrl
 from PySide2.QtGui import QIcon, QKeySequence, QTextDocument
 from secpo.path_operation import ProgramTypes
-from secpo.run_facade import divide_chunks
 
 
 class ProxyModel(QIdentityProxyModel):
@@ -140,7 +139,10 @@ class Worker(QObject):
             process = multiprocessing.Process(target=self.create_process,
                                               args=(file, ))
             tasks.append(process)
-        runnable_chunks = list(divide_chunks(tasks, self.parent.PROCESS_NUMBER))
+        # At most PROCESS_NUMBER processes run at once
+        size = self.parent.PROCESS_NUMBER
+        runnable_chunks = [tasks[i:i + size]
+                           for i in range(0, len(tasks), size)]
         # Run all chunks one by one
         self.queues[0].put(self.steps)
         for chunk in runnable_chunks:
@@ -0,0 +1,223 @@
+""" This module is created by Martin Vasko.
+    History of runs is stored in embedded SQLite database. Every run records
+    its targets with languages, image tags, timings and states together with
+    normalized findings, so questions about past runs are answered by
+    indexed queries instead of rescanning result files.
+"""
+
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+from secpo.result_cache import ResultCache
+
+
+class HistoryStore:
+    """
+    SQLite store of runs, targets and findings. Database is opened in WAL
+    mode, so queries do not block running analysis, and findings are
+    inserted in batches. It is safe to write from more threads.
+    """
+    DATABASE = 'history.sqlite3'
+    BATCH_SIZE = 1000
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS runs ('
+        ' id INTEGER PRIMARY KEY,'
+        ' run_id TEXT UNIQUE NOT NULL,'
+        ' started REAL NOT NULL,'
+        ' finished REAL,'
+        ' status INTEGER,'
+        ' arguments TEXT)',
+        'CREATE TABLE IF NOT EXISTS targets ('
+        ' run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,'
+        ' pipeline TEXT NOT NULL,'
+        ' target TEXT NOT NULL,'
+        ' language TEXT,'
+        ' image TEXT,'
+        ' state TEXT,'
+        ' started REAL,'
+        ' finished REAL)',
+        'CREATE TABLE IF NOT EXISTS findings ('
+        ' run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,'
+        ' target TEXT NOT NULL,'
+        ' tool TEXT NOT NULL,'
+        ' rule TEXT NOT NULL,'
+        ' severity TEXT NOT NULL,'
+        ' file TEXT NOT NULL,'
+        ' line INTEGER NOT NULL,'
+        ' message TEXT NOT NULL,'
+        ' fingerprint TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS runs_started ON runs(started)',
+        'CREATE INDEX IF NOT EXISTS targets_target ON targets(target, run)',
+        'CREATE INDEX IF NOT EXISTS targets_run ON targets(run)',
+        'CREATE INDEX IF NOT EXISTS findings_target ON findings(target, run)',
+        'CREATE INDEX IF NOT EXISTS findings_rule ON findings(rule, run)',
+        'CREATE INDEX IF NOT EXISTS findings_file ON findings(file, run)',
+        'CREATE INDEX IF NOT EXISTS findings_run ON findings(run)']
+    INSERT_FINDING = 'INSERT INTO findings (run, target, tool, rule, ' \
+                     'severity, file, line, message, fingerprint) ' \
+                     'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    INSERT_TARGET = 'INSERT INTO targets (run, pipeline, target, ' \
+                    'language, image, state, started, finished) ' \
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+    HISTORY = 'SELECT runs.run_id, runs.started, runs.finished, ' \
+              'runs.status, ' \
+              '(SELECT COUNT(*) FROM targets WHERE targets.run = runs.id), ' \
+              '(SELECT COUNT(*) FROM findings WHERE findings.run = runs.id) ' \
+              'FROM runs {where} ORDER BY runs.started DESC, runs.id DESC ' \
+              'LIMIT ?'
+    HISTORY_COLUMNS = ['run_id', 'started', 'finished', 'status', 'targets',
+                       'findings']
+    QUERY = 'SELECT runs.run_id, findings.target, findings.tool, ' \
+            'findings.rule, findings.severity, findings.file, ' \
+            'findings.line, findings.message, findings.fingerprint ' \
+            'FROM findings JOIN runs ON runs.id = findings.run {where} ' \
+            'ORDER BY findings.run DESC, findings.file, findings.line LIMIT ?'
+    QUERY_COLUMNS = ['run_id', 'target', 'tool', 'rule', 'severity', 'file',
+                     'line', 'message', 'fingerprint']
+
+    def __init__(self, path=None):
+        """ Initialize """
+        self.path = Path(path) if path else \
+            ResultCache.default_directory() / self.DATABASE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path),
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('PRAGMA foreign_keys=ON')
+        with self._connection:
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+        self._lock = threading.Lock()
+        # Row identifier of current run
+        self.run = None
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start_run(self, run_id, arguments=None):
+        """
+        Record start of run. Previous run with the same identifier is
+        replaced.
+        :param run_id: Identifier of run.
+        :param arguments: Dictionary of command line arguments.
+        :return: Row identifier of run.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM runs WHERE run_id = ?',
+                                     (run_id,))
+            cursor = self._connection.execute(
+                    'INSERT INTO runs (run_id, started, arguments) '
+                    'VALUES (?, ?, ?)',
+                    (run_id, time.time(),
+                     json.dumps(arguments or {}, sort_keys=True,
+                                default=str)))
+        self.run = cursor.lastrowid
+        return self.run
+
+    def finish_run(self, status):
+        """
+        Record end of current run.
+        :param status: Exit status of run.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                    'UPDATE runs SET finished = ?, status = ? WHERE id = ?',
+                    (time.time(), status, self.run))
+
+    def record_targets(self, targets):
+        """
+        Record targets of current run.
+        :param targets: Iterable of tuples of pipeline, target, language,
+                        image tag, state, start and finish time.
+        """
+        rows = [(self.run,) + tuple(target) for target in targets]
+        with self._lock, self._connection:
+            self._connection.executemany(self.INSERT_TARGET, rows)
+
+    def _insert_findings(self, rows):
+        if rows:
+            with self._lock, self._connection:
+                self._connection.executemany(self.INSERT_FINDING, rows)
+
+    @staticmethod
+    def target(path):
+        """
+        :param path: Path of tested directory.
+        :return: Absolute path of tested directory used as target.
+        """
+        return str(Path(path).resolve())
+
+    def stage(self, findings, target):
+        """
+        Streaming stage which records findings of target in batches.
+        :param findings: Iterable of Class:`Finding`.
+        :param target: Tested directory.
+        :return: Generator of the same findings.
+        """
+        target = self.target(target)
+        rows = []
+        for finding in findings:
+            rows.append((self.run, target, finding.tool, finding.rule,
+                         finding.severity, finding.file, finding.line,
+                         finding.message, finding.fingerprint))
+            if len(rows) >= self.BATCH_SIZE:
+                self._insert_findings(rows)
+                rows = []
+            yield finding
+        self._insert_findings(rows)
+
+    @staticmethod
+    def _where(conditions):
+        conditions = [(column, value) for column, value in conditions
+                      if value is not None]
+        if not conditions:
+            return '', []
+        return 'WHERE ' + ' AND '.join(column + ' = ?' for column, _
+                                       in conditions), \
+            [value for _, value in conditions]
+
+    def history(self, target=None, limit=20):
+        """
+        Return the latest runs.
+        :param target: Only runs which analysed target.
+        :param limit: Maximal number of runs.
+        :return: List of dictionaries with columns of HISTORY_COLUMNS.
+        """
+        where, parameters = '', []
+        if target is not None:
+            where = 'WHERE runs.id IN (SELECT run FROM targets ' \
+                    'WHERE target = ?)'
+            parameters = [target]
+        with self._lock:
+            rows = self._connection.execute(
+                    self.HISTORY.format(where=where),
+                    parameters + [limit]).fetchall()
+        return [dict(zip(self.HISTORY_COLUMNS, row)) for row in rows]
+
+    def query(self, target=None, rule=None, file=None, run_id=None,
+              limit=100):
+        """
+        Return findings of past runs matching all given criteria.
+        :return: List of dictionaries with columns of QUERY_COLUMNS.
+        """
+        where, parameters = self._where([('findings.target', target),
+                                         ('findings.rule', rule),
+                                         ('findings.file', file),
+                                         ('runs.run_id', run_id)])
+        with self._lock:
+            rows = self._connection.execute(
+                    self.QUERY.format(where=where),
+                    parameters + [limit]).fetchall()
+        return [dict(zip(self.QUERY_COLUMNS, row)) for row in rows]
+
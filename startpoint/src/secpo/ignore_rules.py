@@ -0,0 +1,69 @@
+""" This module is created by Martin Vasko.
+    Patterns of .secpoignore leave files of tested directory out of
+    analysis. The same rules are applied to analysed files, build context
+    and key of result cache.
+"""
+
+from fnmatch import fnmatch
+
+
+class IgnoreRules:
+    """
+    Subset of gitignore patterns. Pattern with slash is matched against
+    whole relative path, other patterns against every path component.
+    Trailing slash matches only directories, leading exclamation mark
+    includes previously ignored files and the last matching pattern wins.
+    """
+    IGNORE_FILE = '.secpoignore'
+    COMMENT = '#'
+    NEGATION = '!'
+    SEPARATOR = '/'
+
+    def __init__(self, patterns=None):
+        """ Initialize """
+        self.rules = []
+        for pattern in patterns or []:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith(self.COMMENT):
+                continue
+            include = pattern.startswith(self.NEGATION)
+            if include:
+                pattern = pattern[1:]
+            directory = pattern.endswith(self.SEPARATOR)
+            pattern = pattern.rstrip(self.SEPARATOR)
+            anchored = self.SEPARATOR in pattern
+            self.rules.append((pattern.lstrip(self.SEPARATOR), include,
+                               directory, anchored))
+
+    @classmethod
+    def load(cls, file):
+        """
+        Read patterns from ignore file.
+        :param file: Path of ignore file.
+        :return: Class:`IgnoreRules`, empty when file does not exist.
+        """
+        try:
+            with open(str(file), 'r') as ignore_file:
+                return cls(ignore_file.read().splitlines())
+        except OSError:
+            return cls()
+
+    def _matches(self, parts, pattern, directory, anchored):
+        # File itself is not matched by directory pattern
+        candidates = parts[:-1] if directory else parts
+        if anchored:
+            return any(fnmatch(self.SEPARATOR.join(parts[:index + 1]), pattern)
+                       for index in range(len(candidates)))
+        return any(fnmatch(part, pattern) for part in candidates)
+
+    def ignored(self, name):
+        """
+        :param name: Relative posix path of file.
+        :return: True when file is ignored.
+        """
+        parts = name.split(self.SEPARATOR)
+        ignored = False
+        for pattern, include, directory, anchored in self.rules:
+            if self._matches(parts, pattern, directory, anchored):
+                ignored = not include
+        return ignored
@@ -0,0 +1,160 @@
+""" This module is created by Martin Vasko.
+    Registry of analyser base images. Every entry of DirectoryToImageAndTools
+    and recipe of analyser plugin is turned into base image tagged by hash of
+    its recipe. Base image is built only when its tag is not present in local
+    docker daemon, so Dockerfiles of tested directories are thin layers on
+    top of it.
+"""
+
+import asyncio
+import functools
+import os
+from pathlib import Path
+import tempfile
+
+from secpo.analyser_registry import REGISTRY
+from secpo.build_context import BuildContext
+from secpo.docker_configuration import ConfigCreator, DirectoryToImageAndTools, \
+    SimpleSecurity
+from secpo.command_builder import CommandBuilder
+from secpo.path_operation import PathOperation
+
+
+class BaseImageRegistry:
+    """
+    Knows recipes of all analyser base images, checks their presence in local
+    docker daemon and builds missing ones.
+    """
+    def __init__(self, virtual_starter, docker_conf=None):
+        """ Initialize """
+        self.virtual_starter = virtual_starter
+        self.docker_conf = docker_conf or SimpleSecurity()
+        # Running or finished builds of base images by tag
+        self._images = {}
+
+    def recipe(self, language):
+        """
+        Render recipe of analyser base image for programming language.
+        :param language: Name of DirectoryToImageAndTools member.
+        :return: Tag, recipe and toolset of base image.
+        """
+        image_factory = self.docker_conf.create_image_factory(language)
+        toolset = self.docker_conf.create_toolset(
+                image_factory.package_manager,
+                image_factory.program_package_installer)
+        recipe = CommandBuilder()
+        recipe += image_factory.image
+        recipe += toolset.install_toolchain()
+        tag = ConfigCreator.base_image_tag(language, recipe,
+                                           toolset.specific_tools)
+        return tag, recipe, toolset
+
+    def recipes(self, languages=None):
+        """
+        Render recipes of base images. Languages that cannot be deployed as
+        docker image are skipped.
+        :param languages: Names of languages, all when not given.
+        :return: Dictionary of language and its tag, recipe and toolset.
+        """
+        if not languages:
+            languages = list(DirectoryToImageAndTools.__members__)
+            # Languages of analyser plugins with own base image
+            languages += [language for language in REGISTRY.languages()
+                          if language not in languages
+                          and REGISTRY.recipe(language)]
+        recipes = {}
+        for language in languages:
+            try:
+                recipes[language] = self.recipe(language.upper())
+            except Exception as error:
+                print("Skipping {} base image: {}".format(language.lower(),
+                                                          error))
+        return recipes
+
+    async def exists(self, tag):
+        """
+        Check whether image with tag is present in local docker daemon.
+        :param tag: Tag of image.
+        :return: True when image exists.
+        """
+        return await self.virtual_starter.backend.image_exists(tag)
+
+    async def _build_recipe(self, tag, recipe, toolset):
+        # Build context contains only recipe and generated package file
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory)
+            PathOperation.write_specific_package_file(recipe, path, toolset)
+            (path / PathOperation.BASE_DOCKERFILE).write_text(str(recipe))
+            _, success = await self.virtual_starter.docker_build(
+                    path, tag, PathOperation.BASE_DOCKERFILE)
+        return success
+
+    async def _ensure(self, tag, path, recipe, toolset, dockerfile):
+        if await self.exists(tag):
+            print("Base image {} is already built.".format(tag))
+            return True
+        if recipe is not None:
+            return await self._build_recipe(tag, recipe, toolset)
+        return (await self.virtual_starter.docker_build(
+                path, tag, dockerfile,
+                context=BuildContext.recipe(path, dockerfile)))[1]
+
+    async def ensure(self, tag, path=None, recipe=None, toolset=None,
+                     dockerfile=PathOperation.BASE_DOCKERFILE):
+        """
+        Make base image available. Image is built only once even when more
+        jobs require it at the same time.
+        :param tag: Tag of base image.
+        :param path: Directory with written recipe of base image.
+        :param recipe: Recipe of base image when it is not written.
+        :param toolset: Toolset of recipe.
+        :param dockerfile: Name of written recipe inside path.
+        :return: Whether base image is available.
+        """
+        if tag not in self._images:
+            build = asyncio.ensure_future(
+                    self._ensure(tag, path, recipe, toolset, dockerfile))
+            build.add_done_callback(functools.partial(self._forget_failed,
+                                                      tag))
+            self._images[tag] = build
+        return await self._images[tag]
+
+    def _forget_failed(self, tag, build):
+        # Failed build is not remembered, next request builds image again
+        failed = build.cancelled() or build.exception() is not None \
+            or not build.result()
+        if failed and self._images.get(tag) is build:
+            del self._images[tag]
+
+    def tags(self):
+        """
+        :return: Tags of base images that were required since start.
+        """
+        return list(self._images)
+
+    async def warm(self, languages=None, jobs=None):
+        """
+        Prebuild base images of languages in parallel.
+        :param languages: Names of languages, all when not given.
+        :param jobs: Number of concurrently built images.
+        :return: Dictionary of tag and whether it is available.
+        """
+        semaphore = asyncio.Semaphore(jobs or os.cpu_count() or 1)
+
+        async def warm_image(tag, recipe, toolset):
+            async with semaphore:
+                return await self.ensure(tag, recipe=recipe, toolset=toolset)
+
+        recipes = list(self.recipes(languages).values())
+        finished = await asyncio.gather(*[warm_image(*recipe)
+                                          for recipe in recipes])
+        return {recipe[0]: success for recipe, success in zip(recipes,
+                                                              finished)}
+
+    async def list_images(self, languages=None):
+        """
+        Print tags of base images and whether they are present locally.
+        """
+        for language, recipe in self.recipes(languages).items():
+            state = 'built' if await self.exists(recipe[0]) else 'missing'
+            print("{:<12} {:<40} {}".format(language.lower(), recipe[0], state))
@@ -0,0 +1,202 @@
+""" This module is created by Martin Vasko.
+    Incremental analysis remembers content hashes of analysed files and
+    findings of every file after successful run. Next run analyses only
+    changed files and files that include them. Findings of unchanged files
+    are merged back from previous run so result stays complete, unchanged
+    sources are not analysed at all and their findings are replayed.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+from xml.etree.ElementTree import tostring
+
+from secpo.result_cache import ResultCache
+from secpo.result_parsers import CppcheckParser
+
+
+class IncrementalAnalysis:
+    """
+    Incremental analysis of C/C++ sources analysed by cppcheck.
+    """
+    LANGUAGES = ['CL', 'CPP']
+    INCREMENTAL_DIR = 'incremental'
+    RESULT_FILE = 'result.xml'
+    HASHES = 'hashes'
+    FINDINGS = 'findings'
+    CPPCHECK = 'cppcheck'
+    # Findings without location, e.g. missing includes
+    GLOBAL_FINDINGS = ''
+    INCLUDE = re.compile(rb'^\s*#\s*include\s*"([^"]+)"', re.MULTILINE)
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, directory=None):
+        """ Initialize """
+        if directory:
+            self.directory = Path(directory)
+        else:
+            self.directory = ResultCache.default_directory() / \
+                             self.INCREMENTAL_DIR
+        # Files analysed in current run for every build context and key of
+        # path component, languages of one directory keep separate state
+        self._analysed = {}
+        self._hashes = {}
+
+    def _state_file(self, path, key=None):
+        name = str(path) if key is None else '{}\0{}'.format(path, key)
+        name = hashlib.sha256(name.encode('utf-8')).hexdigest()
+        return self.directory / (name + '.json')
+
+    def _load_state(self, path, key=None):
+        state_file = self._state_file(path, key)
+        if not state_file.exists():
+            return {self.HASHES: {}, self.FINDINGS: {}}
+        with state_file.open('r') as read_file:
+            return json.load(read_file)
+
+    def _save_state(self, path, key, state):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        state_file = self._state_file(path, key)
+        temporary = state_file.with_suffix('.tmp')
+        with temporary.open('w') as write_file:
+            json.dump(state, write_file)
+        os.replace(str(temporary), str(state_file))
+
+    def _hash_file(self, file):
+        digest = hashlib.sha256()
+        with open(str(file), 'rb') as read_file:
+            for chunk in iter(lambda: read_file.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _dependents(self, path, files, changed):
+        """
+        Find files that include changed files directly or transitively.
+        Includes are resolved relative to including file and to build
+        context.
+        :param path: Build context.
+        :param files: Relative names of all analysed files.
+        :param changed: Relative names of changed files.
+        :return: Set of relative names of dependent files.
+        """
+        included_by = {}
+        for name in files:
+            with open(str(path / name), 'rb') as read_file:
+                content = read_file.read()
+            for include in self.INCLUDE.findall(content):
+                include = include.decode('utf-8', 'replace')
+                for candidate in [os.path.dirname(name), '']:
+                    resolved = os.path.normpath(os.path.join(candidate,
+                                                             include))
+                    resolved = Path(resolved).as_posix()
+                    if resolved in files:
+                        included_by.setdefault(resolved, set()).add(name)
+                        break
+        dependents = set()
+        stack = list(changed)
+        while stack:
+            for name in included_by.get(stack.pop(), []):
+                if name not in dependents and name not in changed:
+                    dependents.add(name)
+                    stack.append(name)
+        return dependents
+
+    def changed_files(self, path, files, key=None):
+        """
+        Return files that have to be analysed in current run. When no
+        previous run was recorded, None is returned and whole build context
+        has to be analysed. Empty list means that nothing changed, analysis
+        is skipped and findings of previous run are replayed.
+        :param path: Build context.
+        :param files: Files of build context.
+        :param key: Key of path component.
+        :return: Sorted list of relative names or None.
+        """
+        state = self._load_state(path, key)
+        hashes = {file.relative_to(path).as_posix(): self._hash_file(file)
+                  for file in files}
+        self._hashes[(path, key)] = hashes
+        self._analysed[(path, key)] = None
+        if not state[self.HASHES]:
+            return None
+        changed = set(name for name, digest in hashes.items()
+                      if state[self.HASHES].get(name) != digest)
+        if changed:
+            changed |= self._dependents(path, hashes, changed)
+        self._analysed[(path, key)] = changed
+        return sorted(changed)
+
+    def _owner(self, error):
+        location = error.find('location')
+        if location is None:
+            return self.GLOBAL_FINDINGS
+        name = location.get('file', '')
+        if name.startswith('./'):
+            name = name[2:]
+        return name
+
+    def merge(self, path, result_directory, key=None):
+        """
+        Merge findings of current run with stored findings of files that were
+        not analysed. Result file is rewritten with complete findings and
+        state is saved for next run. When no file was analysed, result file
+        is written from stored findings only.
+        :param path: Build context.
+        :param result_directory: Directory that contains result file.
+        :param key: Key of path component.
+        :return: True when result file was merged.
+        """
+        result_file = result_directory / self.RESULT_FILE
+        if (path, key) not in self._hashes:
+            return False
+        if self._analysed[(path, key)] == set():
+            return self._replay(path, key, result_directory)
+        if not result_file.exists():
+            return False
+        state = self._load_state(path, key)
+        hashes = self._hashes.pop((path, key))
+        analysed = self._analysed.pop((path, key))
+        findings = {}
+        cppcheck = None
+        # Result is read incrementally, only serialized errors are kept
+        with result_file.open('rb') as read_file:
+            for element in CppcheckParser().iter_elements(read_file):
+                if element.tag == CppcheckParser.CPPCHECK:
+                    cppcheck = tostring(element, encoding='unicode').strip()
+                    continue
+                findings.setdefault(self._owner(element), []) \
+                    .append(tostring(element, encoding='unicode').strip())
+        if analysed is not None:
+            for name, stored in state[self.FINDINGS].items():
+                # Keep findings of unchanged files that still exist
+                if name in analysed or name == self.GLOBAL_FINDINGS or \
+                   name not in hashes:
+                    continue
+                merged = findings.setdefault(name, [])
+                merged.extend(error for error in stored if error not in merged)
+        self._write_result(cppcheck, result_file, findings)
+        self._save_state(path, key, {self.HASHES: hashes,
+                                     self.FINDINGS: findings,
+                                     self.CPPCHECK: cppcheck})
+        return True
+
+    def _replay(self, path, key, result_directory):
+        """
+        Write result file of unchanged build context from findings of
+        previous run.
+        """
+        self._hashes.pop((path, key))
+        self._analysed.pop((path, key))
+        state = self._load_state(path, key)
+        result_directory.mkdir(parents=True, exist_ok=True)
+        self._write_result(state.get(self.CPPCHECK),
+                           result_directory / self.RESULT_FILE,
+                           state[self.FINDINGS])
+        return True
+
+    def _write_result(self, cppcheck, result_file, findings):
+        CppcheckParser.write_results(result_file, cppcheck,
+                                     [error for name in sorted(findings)
+                                      for error in findings[name]])
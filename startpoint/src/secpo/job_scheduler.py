@@ -0,0 +1,127 @@
+""" This module is created by Martin Vasko.
+    Scheduler of asynchronous jobs with bounded concurrency. Every job holds
+    one slot of scheduler while it is running, so a new build starts as soon
+    as any previous one finishes. Job consists of stages, result retrieval is
+    stage that runs right behind the build of the same job.
+"""
+
+import asyncio
+import os
+
+
+class JobScheduler:
+    """
+    Runs submitted jobs with at most number of jobs running at once.
+    """
+    # Expected memory used by one container build
+    MEMORY_PER_JOB = 2 * 1024 ** 3
+    CPUS_PER_JOB = 1
+    # Vagrant box has 2 GB and 2 CPUs, hypervisor takes its own share
+    VM_MEMORY_PER_JOB = 3 * 1024 ** 3
+    VM_CPUS_PER_JOB = 2
+    RED_COLOR = '\033[91m{}\033[00m'
+    MEMINFO = '/proc/meminfo'
+    MEMINFO_AVAILABLE = 'MemAvailable:'
+
+    def __init__(self, jobs=None):
+        """ Initialize """
+        self.jobs = jobs or self.default_jobs()
+        self._semaphore = None
+        self._tasks = []
+
+    @classmethod
+    def available_memory(cls):
+        """
+        Return memory available for new processes in bytes.
+        :return: Available memory or None when it cannot be determined.
+        """
+        try:
+            with open(cls.MEMINFO) as meminfo:
+                for line in meminfo:
+                    if line.startswith(cls.MEMINFO_AVAILABLE):
+                        # Value is in kB
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        try:
+            return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    @classmethod
+    def default_jobs(cls, memory_per_job=MEMORY_PER_JOB,
+                     cpus_per_job=CPUS_PER_JOB):
+        """
+        Number of concurrent jobs based on CPU count and available memory.
+        :param memory_per_job: Bytes of memory used by one job.
+        :param cpus_per_job: Number of CPUs used by one job.
+        :return: Number of jobs, at least one.
+        """
+        jobs = (os.cpu_count() or 1) // cpus_per_job
+        memory = cls.available_memory()
+        if memory:
+            jobs = min(jobs, memory // memory_per_job)
+        return max(int(jobs), 1)
+
+    async def _run(self, stages):
+        async with self._semaphore:
+            result = None
+            for stage in stages:
+                result = await stage[0](*stage[1:])
+                # Following stages are skipped when stage fails
+                if result is False:
+                    break
+            return result
+
+    def submit(self, *stages):
+        """
+        Schedule job. Stages are tuples of coroutine function and its
+        arguments and they are awaited one after another.
+        :param stages: Stages of job.
+        :return: Task of job.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.jobs)
+        task = asyncio.ensure_future(self._run(stages))
+        self._tasks.append(task)
+        return task
+
+    async def join(self):
+        """
+        Wait for all submitted jobs. Failed job does not stop other jobs,
+        its exception is logged and returned as its result. Pending jobs are
+        cancelled when waiting is interrupted.
+        :return: List of results of jobs in order of submission.
+        """
+        tasks = self._tasks
+        self._tasks = []
+        return await self.wait(tasks)
+
+    async def wait(self, tasks):
+        """
+        Wait only for some of submitted jobs, e.g. jobs of one target when
+        scheduler is shared by more targets.
+        :param tasks: Tasks returned by :meth:`submit`.
+        :return: List of results of jobs in order of tasks.
+        """
+        self._tasks = [task for task in self._tasks if task not in tasks]
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except BaseException:
+            self.cancel(tasks)
+            raise
+        for result in results:
+            if isinstance(result, Exception):
+                print(self.RED_COLOR.format("Job failed: {}\n".format(
+                        result)), end='')
+        return results
+
+    @staticmethod
+    def cancel(tasks):
+        """
+        Cancel jobs that are not finished yet.
+        :param tasks: Tasks of jobs.
+        """
+        for task in tasks:
+            if not task.done():
+                task.cancel()
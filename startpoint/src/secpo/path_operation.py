@@ -3,14 +3,24 @@
 """
 
 import argparse
-from defusedxml.ElementTree import parse
 from enum import Enum
 import os
 from pathlib import Path, PureWindowsPath
 import shutil
 import subprocess
 
-from secpo.analysis_commands import RunAnalysisCommands
+from secpo.analyser_registry import REGISTRY
+from secpo.analysis_commands import VAGRANT_CMD, analysis_commands, \
+    collect_results_command
+from secpo.command_builder import CommandBuilder
+from secpo.container_pool import ContainerPool
+from secpo.ignore_rules import IgnoreRules
+from secpo.incremental_analysis import IncrementalAnalysis
+from secpo.job_scheduler import JobScheduler
+from secpo.profiler import Profiler, timed
+from secpo.result_cache import ResultCache
+from secpo.result_filter import FilterEngine
+from secpo.sharding import ShardPlanner
 from secpo.template_build_files import kotlin_gradle, requirements_txt, \
     vagrant_centos_config, vagrant_windows_config, Gemfile, composer_json, \
     eslint, setup_ps1
@@ -46,8 +56,12 @@ class ProgramTypes(Enum):
 
 
 class PathArguments(argparse.ArgumentParser):
-    def __init__(self):
-        """ Initialize path arguments """
+    def __init__(self, args=None):
+        """
+        Initialize path arguments.
+        :param args: Arguments to parse, command line arguments when not
+                     given.
+        """
         super(PathArguments, self).__init__(prog="SE&PO testing framework",
                                             description="Security "
                                                         "and portability "
@@ -71,6 +85,85 @@ class PathArguments(argparse.ArgumentParser):
         self.add_argument('--list-filters', action='store_true',
                           help='Lists all result filters that are present '
                                'in filters directory.')
+        self.add_argument('--merge-groups', action='store_true',
+                          help='Merge all directories of one programming '
+                               'language into single common build context '
+                               'instead of running one job per directory.')
+        self.add_argument('--no-cache', action='store_true',
+                          help='Do not serve results from cache and always '
+                               'run analysis.')
+        self.add_argument('--cache-size', type=int,
+                          default=ResultCache.MAX_SIZE,
+                          help='Maximal size of result cache in MB.')
+        self.add_argument('--incremental', action='store_true',
+                          help='Analyse only C/C++ files changed since '
+                               'last run and files that include them.')
+        self.add_argument('--warm-containers', action='store_true',
+                          help='Analyse directories inside long-lived '
+                               'containers of analyser base images instead '
+                               'of building image for every directory.')
+        self.add_argument('--pool-size', type=int,
+                          default=ContainerPool.MAX_SIZE,
+                          help='Maximal number of warm containers.')
+        self.add_argument('--pool-idle-timeout', type=int,
+                          default=ContainerPool.IDLE_TIMEOUT,
+                          help='Seconds after idle warm container is stopped.')
+        self.add_argument('--shards', type=int, default=1,
+                          help='Split analysed files of every directory into '
+                               'balanced shards analysed in parallel '
+                               'containers.')
+        self.add_argument('--shard-weight', choices=ShardPlanner.WEIGHTS,
+                          default=ShardPlanner.SIZE,
+                          help='Weight of file used to balance shards.')
+        self.add_argument('--jobs', type=int,
+                          default=JobScheduler.default_jobs(),
+                          help='Number of containers that are built '
+                               'and analysed at once. Defaults to number '
+                               'of CPUs limited by available memory.')
+        self.add_argument('--vm-jobs', type=int,
+                          default=JobScheduler.default_jobs(
+                                  JobScheduler.VM_MEMORY_PER_JOB,
+                                  JobScheduler.VM_CPUS_PER_JOB),
+                          help='Number of vagrant boxes that are created '
+                               'and tested at once.')
+        self.add_argument('--docker-backend', choices=['auto', 'api', 'cli'],
+                          default='auto',
+                          help='Talk to docker daemon over its Engine API '
+                               'socket or by docker client. Engine API is '
+                               'used when socket is accessible by default.')
+        self.add_argument('--coordinator', metavar='[HOST:]PORT',
+                          help='Distribute docker analysis of targets to '
+                               'workers that pull jobs from this address. '
+                               'Coordinator listens on loopback unless '
+                               'HOST is given, other hosts require token '
+                               'in SECPO_COORDINATOR_TOKEN shared with '
+                               'workers.')
+        self.add_argument('--daemon', action='store_true',
+                          help='Submit run to running secpod instead of '
+                               'analysing in this process.')
+        self.add_argument('--socket',
+                          help='Unix socket of secpod. Defaults to '
+                               'secpod.sock in XDG_RUNTIME_DIR or in cache '
+                               'directory.')
+        self.add_argument('--jsonl',
+                          help='Export normalized findings of all targets '
+                               'into JSON Lines file.')
+        self.add_argument('--sarif',
+                          help='Export normalized findings of all targets '
+                               'into SARIF log.')
+        self.add_argument('--baseline', metavar='RUN_ID',
+                          help='Compare findings with stored run, only new '
+                               'findings are reported and fail the run.')
+        self.add_argument('--run-id',
+                          help='Identifier under which findings of this run '
+                               'are stored. Defaults to current time.')
+        self.add_argument('--no-history', action='store_true',
+                          help='Do not record run and its findings in '
+                               'history database.')
+        self.add_argument('--profile', nargs='?', const=Profiler.TRACE_FILE,
+                          metavar='TRACE_FILE',
+                          help='Print duration of phases of every target and '
+                               'write Chrome trace of run into file.')
         self.add_argument('--add-configuration',
                           help='Apply custom security configuration in YAML.')
         # todo: program this functionality
@@ -84,8 +177,63 @@ class PathArguments(argparse.ArgumentParser):
                           help='Destroys everyting that was downloaded stored '
                                'and installed as side process of deployment '
                                'of docker images and vagrant boxes.')
-        self.args = self.parse_args()
-        if self.args.input is None and self.args.list_filters is False:
+        subparsers = self.add_subparsers(dest='command',
+                                         parser_class=argparse.ArgumentParser)
+        images = subparsers.add_parser('images',
+                                       help='Manage analyser base images.')
+        images.add_argument('images_command', choices=['warm', 'list'],
+                            help='Prebuild missing base images or list '
+                                 'base images and their state.')
+        images.add_argument('languages', nargs='*',
+                            help='Programming languages of base images, '
+                                 'all when none is given.')
+        images.add_argument('--parallel', type=int, default=os.cpu_count(),
+                            help='Number of base images built at once.')
+        for name, help_text in [('history', 'Show the latest runs.'),
+                                ('query', 'Show findings of past runs.')]:
+            history = subparsers.add_parser(name, help=help_text)
+            history.add_argument('--database',
+                                 help='Path of history database.')
+            history.add_argument('--target',
+                                 help='Only runs or findings of tested '
+                                      'directory.')
+            history.add_argument('--limit', type=int,
+                                 default=20 if name == 'history' else 100,
+                                 help='Maximal number of printed rows.')
+            history.add_argument('--json', action='store_true',
+                                 help='Print rows as JSON Lines.')
+        worker = subparsers.add_parser('worker',
+                                       help='Analyse jobs of coordinator by '
+                                            'local docker daemon.')
+        worker.add_argument('coordinator_url',
+                            help='URL of coordinator, e.g. '
+                                 'http://build-1:8765.')
+        worker.add_argument('--name', help='Name of worker, host name and '
+                                           'process identifier by default.')
+        worker.add_argument('--capacity', type=int,
+                            default=JobScheduler.default_jobs(),
+                            help='Number of jobs analysed at once.')
+        batch = subparsers.add_parser('batch',
+                                      help='Analyse all targets of manifest '
+                                           'in one process.')
+        batch.add_argument('manifest',
+                           help='JSON Lines file with path, languages and '
+                                'options of every target, - reads standard '
+                                'input.')
+        batch.add_argument('--output', default='batch.jsonl',
+                           help='JSON Lines file where result of every '
+                                'target is written when it finishes, - '
+                                'writes standard output.')
+        subparsers.add_parser('daemon',
+                              help='Serve runs submitted over --socket, '
+                                   'the same as secpod.')
+        query = subparsers.choices['query']
+        query.add_argument('--rule', help='Only findings of rule.')
+        query.add_argument('--file', help='Only findings in file.')
+        query.add_argument('--run', help='Only findings of run.')
+        self.args = self.parse_args(args)
+        if self.args.input is None and self.args.list_filters is False \
+           and self.args.command is None:
             self.error("--input parameter required. No input file "
                        "was chosen.")
 
@@ -97,13 +245,27 @@ class PathOperation:
     WINDOWS_TOOLS = 'windows_tools'
     # Virtualization files
     DOCKERFILE = 'Dockerfile'
+    BASE_DOCKERFILE = 'Dockerfile.base'
     VAGRANTFILE = 'Vagrantfile'
     POWERSHELLFILE = 'setup.ps1'
     VAGRANT_RESULT_DIR = 'vagrant_result'
     WELCOME_MESSAGE = "Welcome to portability testing using vagrant."
     VM_NAME = 'secpo'
+    # Whole build context is analysed
+    BUILD_CONTEXT = ' .'
+    # Separates programming language and number of directory group
+    GROUP_SEPARATOR = '_'
     # Files
     HIDDEN_FILES = '.vagrant'
+    # Directories that are never walked when source files are indexed
+    IGNORED_DIRECTORIES = [HIDDEN_FILES, VAGRANT_RESULT_DIR, '.git', '.hg',
+                           '.svn', '__pycache__']
+    # Manifests of projects that analysers need besides source files
+    PROJECT_FILES = ['go.mod', 'go.sum', 'Cargo.toml', 'Cargo.lock',
+                     'package.json', 'package-lock.json', 'build.gradle',
+                     'build.gradle.kts', 'settings.gradle', 'gradlew',
+                     'pom.xml', 'Gemfile.lock', 'composer.lock',
+                     'setup.py', 'pyproject.toml']
     SPECIAL_FILES = {'python': ['requirements.txt', '', requirements_txt],
                      'gradle': ['build.properties', '', kotlin_gradle],
                      'php': ['composer.json', '', composer_json],
@@ -122,6 +284,10 @@ class PathOperation:
         # Directories where deployment of containers is executed
         self._path_components = dict()
         self._images = list()
+        # Index of source files from --input directories keyed by extension
+        self._source_index = dict()
+        # Rules of .secpoignore of every build context
+        self._ignore_rules = dict()
         # Get current working directory based on this script location
         self.cwd = Path(os.getcwd())
         # Parsed command line arguments
@@ -132,11 +298,45 @@ class PathOperation:
         # Assign all attributes
         self.list_filters = args.list_filters
         self._is_logging_enabled = not args.disable_logging
-        self._filters = args.result_filter
+        self.result_filter = args.result_filter
+        # Compiled rules of result filters
+        self._filters = []
         self._custom_configuration = args.add_configuration
         self._destroy_images = args.destroy_images
         self._destroy_boxes = args.destroy_boxes
         self._destroy_everything = args.destroy_everything
+        self._merge_groups = args.merge_groups
+        self.no_cache = args.no_cache
+        self.cache_size = args.cache_size
+        self.jobs = args.jobs
+        self.vm_jobs = args.vm_jobs
+        self.docker_backend = args.docker_backend
+        self.coordinator = args.coordinator
+        self.jsonl = args.jsonl
+        self.sarif = args.sarif
+        self.baseline = args.baseline
+        self.run_id = args.run_id
+        self.history = not args.no_history
+        # Timing of phases of run
+        self.profile = args.profile
+        self.profiler = Profiler(enabled=bool(args.profile))
+        # Command line arguments recorded in history of runs
+        self.arguments = vars(args)
+        self.container_pool = None
+        if args.warm_containers:
+            self.container_pool = ContainerPool(args.pool_size,
+                                                args.pool_idle_timeout)
+        self.incremental = None
+        if args.incremental:
+            self.incremental = IncrementalAnalysis()
+        # Directories are split into shards only when more are requested
+        self.sharding = None
+        if args.shards > 1:
+            self.sharding = ShardPlanner(args.shards, args.shard_weight)
+        # Names of Dockerfiles of shards by path
+        self._shards = {}
+        # Only these programming languages are analysed, all when not set
+        self.selected_languages = None
         # Parse input list of file/files/directories
         if args.input:
             for element in args.input:
@@ -185,61 +385,153 @@ class PathOperation:
 
     def _categorize_files_input(self):
         """
-        Categorize --input files based on file suffix. Add directories to
-        path using PathLib.
+        Categorize --input files based on file suffix. Files are added to
+        the same index as files found in --input directories.
         :return:
         """
         for file in self.input_files:
-            for program_type in ProgramTypes:
-                for extension in program_type.value[self.EXTENSIONS]:
-                    if file.suffix == extension:
-                        if self.WINDOWS_TOOLS in program_type.value:
-                            self._path_components[program_type.name] = \
-                            [self.cwd / file.parent,
-                             program_type.value[self.TOOLS],
-                             program_type.value[self.WINDOWS_TOOLS]]
-                        else:
-                            self._path_components[program_type.name] = \
-                                [self.cwd / file.parent,
-                                 program_type.value[self.TOOLS]]
+            self._source_index.setdefault(file.suffix, []) \
+                .append(self.cwd / file)
+
+    def _index_directory(self, directory):
+        """
+        Walk directory only once and index all files by their suffix and
+        project manifests by their name. Ignored directories are skipped
+        while walking so their content is never listed.
+        :param directory: Directory given as --input argument.
+        """
+        directories = [str(directory)]
+        while directories:
+            try:
+                entries = os.scandir(directories.pop())
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in self.IGNORED_DIRECTORIES:
+                            directories.append(entry.path)
+                    elif entry.is_file():
+                        # Project manifests are indexed by their name
+                        if entry.name in self.PROJECT_FILES:
+                            self._source_index.setdefault(entry.name, []) \
+                                .append(self.cwd / entry.path)
+                        extension = os.path.splitext(entry.name)[1]
+                        if not extension:
+                            continue
+                        self._source_index.setdefault(extension, []) \
+                            .append(self.cwd / entry.path)
+
+    def indexed_files(self, extensions, path=None):
+        """
+        Return indexed files which match extensions. When path is given only
+        files placed under this path are returned.
+        :param extensions: List of file suffixes.
+        :param path: Optional directory that files have to be part of.
+        :return: List of files.
+        """
+        files = []
+        for extension in extensions:
+            for file in self._source_index.get(extension, []):
+                if path is None or path in file.parents:
+                    files.append(file)
+        return files
+
+    def _group_directories(self, files):
+        """
+        Group parent directories of files. Nested directories are part of
+        their top most parent directory because build context contains whole
+        directory tree. When groups should be merged, minimal common build
+        context is returned as the only group.
+        :param files: Files of single programming language.
+        :return: Sorted list of directories.
+        """
+        directories = sorted(set(file.parent for file in files),
+                             key=lambda directory: len(directory.parts))
+        groups = []
+        for directory in directories:
+            if not any(group in directory.parents for group in groups):
+                groups.append(directory)
+        if self._merge_groups and len(groups) > 1:
+            return [Path(os.path.commonpath([str(group) for group in groups]))]
+        return sorted(groups)
+
+    @classmethod
+    def languages(cls):
+        """
+        Return names of programming languages, members of ProgramTypes are
+        followed by languages declared only by analyser plugins.
+        :return: List of names of programming languages.
+        """
+        languages = list(ProgramTypes.__members__)
+        return languages + [language for language in REGISTRY.languages()
+                            if language not in languages
+                            and REGISTRY.extensions(language)]
+
+    @classmethod
+    def language_values(cls, language):
+        """
+        Return extensions and tools of programming language.
+        :param language: Name of programming language.
+        :return: Dictionary in form of ProgramTypes values.
+        """
+        if language in ProgramTypes.__members__:
+            return ProgramTypes[language].value
+        recipe = REGISTRY.recipe(language) or {}
+        return {cls.EXTENSIONS: REGISTRY.extensions(language),
+                cls.TOOLS: recipe.get(cls.TOOLS, [])}
+
+    @classmethod
+    def language(cls, key):
+        """
+        Return name of programming language from key of path components.
+        :param key: Path component key, e.g. PYTHON or PYTHON_1.
+        :return: Name of ProgramTypes member.
+        """
+        return key.split(cls.GROUP_SEPARATOR)[0]
 
     def resolve_containers(self):
         """
         Resolve containers based on directories and files inside.
         :return:
         """
-        # Input is only one file
-        self._categorize_files_input()
-        # Input is directory
-        for directory in self.input_directories:
-            # Iterate over enumeration of program types
-            for program_type in ProgramTypes:
-                # Iterate over dictionary that consists of path to folder
-                # where Dockerfiles are present and values contains extensions
-                # of program files that the program is looking for
-                for extensions in program_type.value[self.EXTENSIONS]:
-                    files_and_dirs = directory.glob('**/*' + extensions)
-                    files = [x for x in files_and_dirs if x.is_file()]
-                    if files:
-                        # Remove hidden files from files
-                        for file in files:
-                            if self.HIDDEN_FILES in file.parts:
-                                files.remove(file)
-                        # When no other files left continue next file extension
-                        if not files:
-                            continue
-                        # Add from current working directory path to
-                        # concrete folder where are located virtual
-                        # machines and docker containers prescription.
-                        if self.WINDOWS_TOOLS in program_type.value:
-                            self._path_components[program_type.name] = \
-                                [self.cwd / file.parent,
-                                 program_type.value[self.TOOLS],
-                                 program_type.value[self.WINDOWS_TOOLS]]
-                        else:
-                            self._path_components[program_type.name] = \
-                                [self.cwd / file.parent,
-                                 program_type.value[self.TOOLS]]
+        with self.profiler.span(Profiler.DISCOVERY):
+            # Input is only one file
+            self._categorize_files_input()
+            # Input is directory, walk every directory only once
+            for directory in self.input_directories:
+                self._index_directory(directory)
+        # Languages found in the same directory share its path, every
+        # language is analysed in its own container
+        directories = {}
+        # Iterate over programming languages and look up files
+        # based on extensions in created index
+        for language in self.languages():
+            if self.selected_languages and \
+                    language not in self.selected_languages:
+                continue
+            values = self.language_values(language)
+            files = self.indexed_files(values[self.EXTENSIONS])
+            if not files:
+                continue
+            # Every group of directories is deployed as separate job
+            for number, directory in enumerate(self._group_directories(files)):
+                directory = directories.setdefault(directory, directory)
+                key = language
+                if number:
+                    key += self.GROUP_SEPARATOR + str(number)
+                # Add from current working directory path to
+                # concrete folder where are located virtual
+                # machines and docker containers prescription.
+                if self.WINDOWS_TOOLS in values:
+                    self._path_components[key] = \
+                        [directory,
+                         values[self.TOOLS],
+                         values[self.WINDOWS_TOOLS]]
+                else:
+                    self._path_components[key] = \
+                        [directory,
+                         values[self.TOOLS]]
         if not self._path_components:
             print("No path was selected!")
             exit(1)
@@ -248,11 +540,13 @@ class PathOperation:
         """
         Show current added filters.
         """
+        self.load_filters()
         if not self._filters:
             print("No filters available!")
             return False
         for num, filtered in enumerate(self._filters):
-            print("Applied result filter {}: {}".format(num, filtered))
+            print("Applied result filter {}: {}".format(num,
+                                                        filtered.describe()))
         return True
 
     def add_filter(self):
@@ -263,19 +557,11 @@ class PathOperation:
 
     def load_filters(self):
         """
-        Load all result filters that user supplied as argument --add_filter.
+        Load all result filters from filters file and filters directory.
+        Filters are compiled into rules right away.
         :return: Success
         """
-        if self.FILTERS_FILE.exists():
-            et = parse(self.FILTERS_FILE)
-            self._filters = et
-        if self.FILTER_DIR.exists():
-            files_and_dirs = self.FILTER_DIR.glob("**/*")
-            files = [x for x in files_and_dirs if x.is_file()]
-            for file in files:
-                with open(file, 'r') as read_file:
-                    data = read_file.read()
-                    self._filters.append(data)
+        self._filters = FilterEngine.load(self.FILTERS_FILE, self.FILTER_DIR)
         return True
 
     def add_configuration(self):
@@ -286,14 +572,15 @@ class PathOperation:
         """
         pass
 
+    @timed(Profiler.CONFIGURATION_FILES)
     def create_configuration_files(self):
         """
         Create docker and Vagrant configuration files.
         """
-        for directory in self._path_components.values():
-            dockerfile = directory[0] / self.DOCKERFILE
+        for key, directory in self._path_components.items():
+            dockerfile = directory[0] / self.dockerfile(key)
             dockerfile.touch()
-            vagrantfile = directory[0] / self.VAGRANTFILE
+            vagrantfile = directory[0] / self.vagrantfile(key)
             vagrantfile.touch()
             try:
                 vagrant_result_dir = directory[0] / self.VAGRANT_RESULT_DIR
@@ -301,48 +588,260 @@ class PathOperation:
             except FileExistsError:
                 pass
 
-    def list_analysed_files(self, path):
+    def ignore_rules(self, path):
+        """
+        :param path: Build context of path component.
+        :return: Class:`IgnoreRules` of .secpoignore of build context.
+        """
+        if path not in self._ignore_rules:
+            self._ignore_rules[path] = IgnoreRules.load(
+                    path / IgnoreRules.IGNORE_FILE)
+        return self._ignore_rules[path]
+
+    def analysed_files(self, path, languages=None):
+        """
+        Return files of programming languages that are part of build
+        context path. Files ignored by .secpoignore of build context are
+        left out, so analysis commands, key of result cache and build
+        context see the same files.
+        :param path: Build context of path component.
+        :param languages: Names of programming languages, all resolved
+                          languages when not given.
+        :return: List of files.
+        """
+        if languages is None:
+            languages = [self.language(key) for key in self.path_components]
+        rules = self.ignore_rules(path)
         files = []
-        file_filters = self.path_components.keys()
-        for file_filter in file_filters:
-            for extension in ProgramTypes[file_filter].value[self.EXTENSIONS]:
-                files_and_dirs = path.glob("**/*" + extension)
-                for file in files_and_dirs:
-                    if file.is_file():
-                        files.append(file)
+        for language in languages:
+            files += [file for file in self.indexed_files(
+                              self.language_values(language)[self.EXTENSIONS],
+                              path)
+                      if not rules.ignored(file.relative_to(path).as_posix())]
+        # Languages can share extensions, list every file only once
+        return list(dict.fromkeys(files))
+
+    def path_keys(self, path):
+        """
+        :param path: Build context of path component.
+        :return: Keys of path components of path.
+        """
+        return [key for key, component in self.path_components.items()
+                if component[0] == path]
+
+    @staticmethod
+    def component_name(path_components, key, name):
+        """
+        Return name of file or directory of path component inside its
+        directory. Languages that share directory have names of their own
+        suffixed by key, so they do not overwrite each other.
+        :param path_components: Path components of run.
+        :param key: Key of path component.
+        :param name: Name used when directory is not shared.
+        :return: Name inside directory of path component.
+        """
+        component = path_components.get(key)
+        if component is None or len([
+                other for other in path_components.values()
+                if other[0] == component[0]]) < 2:
+            return name
+        return '{}.{}'.format(name, key.lower())
+
+    def dockerfile(self, key, name=None):
+        """
+        Return name of Dockerfile of path component.
+        :param key: Key of path component.
+        :param name: Default name of Dockerfile, Dockerfile when not given.
+        :return: Name of Dockerfile inside directory of path component.
+        """
+        return self.component_name(self.path_components, key,
+                                   name or self.DOCKERFILE)
+
+    def vagrantfile(self, key):
+        """
+        :param key: Key of path component.
+        :return: Name of Vagrantfile of path component.
+        """
+        return self.component_name(self.path_components, key,
+                                   self.VAGRANTFILE)
+
+    def powershell_file(self, key):
+        """
+        :param key: Key of path component.
+        :return: Name of setup script of box of path component, it keeps
+                 its suffix.
+        """
+        setup = Path(self.POWERSHELLFILE)
+        return self.component_name(self.path_components, key,
+                                   setup.stem) + setup.suffix
+
+    def vagrant_environment(self, key):
+        """
+        Return environment of vagrant commands of path component. Boxes of
+        languages that share directory have Vagrantfiles and machine state
+        of their own.
+        :param key: Key of path component.
+        :return: Dictionary of environment variables.
+        """
+        path = self.path_components[key][0]
+        env = os.environ.copy()
+        env['VAGRANT_CWD'] = str(path)
+        env['VAGRANT_VAGRANTFILE'] = self.vagrantfile(key)
+        if self.vagrantfile(key) != self.VAGRANTFILE:
+            env['VAGRANT_DOTFILE_PATH'] = str(path / self.HIDDEN_FILES /
+                                              key.lower())
+        return env
+
+    def base_dockerfile(self, key):
+        """
+        :param key: Key of path component.
+        :return: Name of Dockerfile of analyser base image of path component.
+        """
+        return self.dockerfile(key, self.BASE_DOCKERFILE)
+
+    def key_analysers(self, key):
+        """
+        Return analysers run in container of path component. Analyser of
+        more languages that share directory, e.g. cppcheck of C and C++,
+        runs only under the first of their keys and analyses files of all
+        of them, so the same files are never analysed twice.
+        :param key: Key of path component.
+        :return: List of tuples of Class:`Analyser` and names of languages
+                 whose files it analyses.
+        """
+        language = self.language(key)
+        languages = [self.language(other) for other
+                     in self.path_keys(self.path_components[key][0])]
+        analysers = []
+        for analyser in REGISTRY.analysers([language]):
+            shared = [other for other in languages
+                      if other in analyser.languages]
+            if shared[0] == language:
+                analysers.append((analyser, shared))
+        return analysers
+
+    def key_languages(self, key):
+        """
+        :param key: Key of path component.
+        :return: Names of languages whose files are analysed in container
+                 of path component.
+        """
+        languages = [self.language(key)]
+        for _, shared in self.key_analysers(key):
+            languages += shared
+        return list(dict.fromkeys(languages))
+
+    def list_analysed_files(self, key):
+        path = self.path_components[key][0]
+        language = self.language(key)
+        files = self.analysed_files(path, [language])
         # Get all file names as single string line
-        compilation_tools = [dir for dir in self.path_components.values()
-                             if path is dir[0]][0][1:]
-        file_names = ""
+        compilation_tools = self.path_components[key][1:]
         vagrant_cmd = ""
         for file in files:
-            file_names += ' ' + file.name
+            # Files of directory group are relative to its build context
+            file_name = file.relative_to(path).as_posix()
             vagrant_pwd = None
             if os.name == 'posix':
                 vagrant_pwd = Path('C:/Users/vagrant/portability_testing/')
-                vagrant_pwd = Path(vagrant_pwd / file.name)
+                vagrant_pwd = Path(vagrant_pwd / file_name)
             elif os.name == 'nt':
                 vagrant_pwd = Path('./portability_testing/')
-                vagrant_pwd = Path(vagrant_pwd / file.name)
-            vagrant_cmd += RunAnalysisCommands['VAGRANT_CMD'].value \
-                .format(tool=compilation_tools[0][0], options='',
-                        files=str(vagrant_pwd))
-        # Create command from listed files, only if it exists in
-        # analysis_commands.py file.
-        for file_filter in file_filters:
-            if file_filter in list(RunAnalysisCommands.__members__):
-                commands = RunAnalysisCommands[file_filter].value\
-                    .format(files=file_names)
-                return commands, vagrant_cmd, compilation_tools
-        return "", vagrant_cmd, compilation_tools
-
-    def write_specific_package_file(self, command, path, tools):
+                vagrant_pwd = Path(vagrant_pwd / file_name)
+            vagrant_cmd += VAGRANT_CMD.format(tool=compilation_tools[0][0],
+                                              options='',
+                                              files=str(vagrant_pwd))
+        # Every analyser of language analyses files of the language only,
+        # analysers are run together inside one container
+        analysed = []
+        for analyser, languages in self.key_analysers(key):
+            if analyser.incremental:
+                names = self._incremental_files(path, key, languages)
+                # Nothing changed, findings of previous run are replayed
+                if names is None:
+                    continue
+            else:
+                names = self._file_names(
+                        path, self.analysed_files(path, languages))
+            analysed.append((analyser, names))
+        return analysis_commands(analysed), vagrant_cmd, compilation_tools
+
+    @staticmethod
+    def _file_names(path, files):
+        # Files of directory group are relative to its build context
+        return ''.join(' ' + file.relative_to(path).as_posix()
+                       for file in files)
+
+    def shard_commands(self, key):
+        """
+        Split analysed files of path component into shards. Shardable
+        analysers analyse files of every shard, other analysers analyse all
+        files in the first shard.
+        :param key: Key of path component.
+        :return: List of analysis commands of shards, empty when path
+                 component is not sharded.
+        """
+        if not self.sharding:
+            return []
+        path = self.path_components[key][0]
+        analysers = self.key_analysers(key)
+        if not any(analyser.shardable for analyser, _ in analysers):
+            return []
+        shards = self.sharding.plan(
+                self.analysed_files(path, self.key_languages(key)))
+        if len(shards) < 2:
+            return []
+        analysed = [[] for _ in shards]
+        for analyser, languages in analysers:
+            files = self.analysed_files(path, languages)
+            if not analyser.shardable:
+                analysed[0].append((analyser, self._file_names(path, files)))
+                continue
+            for shard, shard_analysed in zip(shards, analysed):
+                names = self._file_names(path, [file for file in shard.files
+                                                if file in files])
+                # Shard can hold only files of other languages
+                if names:
+                    shard_analysed.append((analyser, names))
+        return [analysis_commands(shard_analysed)
+                for shard_analysed in analysed]
+
+    def shard_dockerfiles(self, key):
+        """
+        :param key: Key of path component.
+        :return: Names of Dockerfiles of shards of path component.
+        """
+        return self._shards.get(key, [])
+
+    def _incremental_files(self, path, key, languages):
+        """
+        Return files that are analysed by incremental analysis. Whole build
+        context is analysed when incremental analysis is disabled or there
+        is no previous run.
+        :param path: Build context.
+        :param key: Key of path component.
+        :param languages: Names of programming languages of analyser.
+        :return: File names as single string or None when nothing changed
+                 and analyser is skipped.
+        """
+        if not self.incremental:
+            return self.BUILD_CONTEXT
+        files = self.analysed_files(path, languages)
+        changed = self.incremental.changed_files(path, files, key)
+        if changed is None:
+            return self.BUILD_CONTEXT
+        if not changed:
+            return None
+        return ''.join(' ' + name for name in changed)
+
+    @classmethod
+    def write_specific_package_file(cls, command, path, tools):
         # fixme: try to do it in one if statement with always same
         # functionality
-        out = [key for key in self.SPECIAL_FILES.keys() if key in str(command)]
+        out = [key for key in cls.SPECIAL_FILES.keys() if key in str(command)]
         if out:
             out = out[0]
-            special_file = path / self.SPECIAL_FILES.get(out)[0]
+            special_file = path / cls.SPECIAL_FILES.get(out)[0]
             found_tools = []
             if tools:
                 for tool in tools.specific_tools:
@@ -351,14 +850,16 @@ class PathOperation:
                         found_tools.append("\t\t\"" + tool[0] + "\":\"" + tool[1]
                                         + "\",\n")
                     else:
-                        found_tools.append(self.SPECIAL_FILES.get(out)[1] + " \'" + tool + "\'")
+                        found_tools.append(cls.SPECIAL_FILES.get(out)[1] + " \'" + tool + "\'")
                     # todo:
                     # else:
                     #     packages.append("\t\t\"" + tool + "\":\"@dev\",\n")
-                special_file.write_text(self.SPECIAL_FILES.get(out)[2]
-                                        .format('\n\t'.join(found_tools)))
+                packages = '\n\t'.join(found_tools)
+                # Templates are filled either by position or by name
+                special_file.write_text(cls.SPECIAL_FILES.get(out)[2]
+                                        .format(packages, packages=packages))
             else:
-                special_file.write_text(self.SPECIAL_FILES.get(out)[2])
+                special_file.write_text(cls.SPECIAL_FILES.get(out)[2])
 
     def _set_vagrant_config(self, path, vm_identifier, compilation_tools,
                             vagrant_cmds):
@@ -379,53 +880,84 @@ class PathOperation:
             if len(compilation_tools) > 1:
                 powershell_out = setup_ps1.format(
                         tools=' '.join(compilation_tools[1]))
-            shell_path = path / self.POWERSHELLFILE
+            shell_path = path / self.powershell_file(vm_identifier)
             with shell_path.open('w') as f:
                 f.write(powershell_out)
             output = vagrant_windows_config.format(msg=self.WELCOME_MESSAGE,
                                                    sync_folder=path,
                                                    name=self.VM_NAME
                                                    + str(vm_identifier),
+                                                   setup=shell_path.name,
                                                    cmds=vagrant_cmds)
         return output
 
+    @timed(Profiler.WRITE)
     def write_configuration(self, configuration):
-        # Write docker configuration
-        for path, config in configuration:
+        # Write docker configuration, configuration follows order of path
+        # components
+        for key, (path, config) in zip(self.path_components, configuration):
             command = config[0]
             analysed_files, vagrant_cmd, compilation_tools = \
-                self.list_analysed_files(path)
+                self.list_analysed_files(key)
             command += analysed_files
+            # Result artifacts are collected for selective retrieval
+            collect_results = collect_results_command([self.language(key)])
+            if collect_results:
+                command += CommandBuilder(collect_results)
+            self._write_shards(key, config[0], collect_results)
             tools = config[1]
-            dockerfile = path / self.DOCKERFILE
+            recipe = config[2]
+            dockerfile = path / self.dockerfile(key)
             # Write all specific package files for particular
             # programming language
-            self.write_specific_package_file(command, path, tools)
+            self.write_specific_package_file(recipe, path, tools)
+            # Recipe of analyser base image
+            base_dockerfile = path / self.base_dockerfile(key)
+            base_dockerfile.write_text(str(recipe))
             with dockerfile.open('w') as write_file:
                 write_file.write(str(command))
             # Check whether is written everything inside file correctly
             with dockerfile.open('r') as read_file:
                 assert read_file.read() == str(command)
-            # Write vagrantfile
-            vagrantfile = path / self.VAGRANTFILE
+            # Write vagrantfile, every path component has box of its own
+            vagrantfile = path / self.vagrantfile(key)
             with vagrantfile.open('w') as write_file:
-                vm_identifier = [identifier for identifier in
-                                 self.path_components.keys()
-                                 if
-                                 path in self.path_components.get(identifier)][0]
-                output = self._set_vagrant_config(path.resolve(), vm_identifier,
+                output = self._set_vagrant_config(path.resolve(), key,
                                                   compilation_tools, vagrant_cmd)
                 write_file.write(output)
 
+    def _write_shards(self, key, configuration, collect_results):
+        """
+        Write Dockerfile of every shard of path component. Shards share
+        configuration of path component and differ only in analysis
+        commands.
+        """
+        path = self.path_components[key][0]
+        self._shards[key] = []
+        for number, commands in enumerate(self.shard_commands(key)):
+            command = configuration + commands
+            if collect_results:
+                command += CommandBuilder(collect_results)
+            name = self.dockerfile(key, ShardPlanner.dockerfile(number))
+            (path / name).write_text(str(command))
+            self._shards[key].append(name)
+
     def delete_configurations(self):
         """
         Delete configuration files after results retrieved.
         """
-        for component in self._path_components.values():
-            dockerfile = component[0] / self.DOCKERFILE
+        for key, component in self._path_components.items():
+            dockerfile = component[0] / self.dockerfile(key)
             if dockerfile.exists():
                 dockerfile.unlink()
-            vagrantfile = component[0] / self.VAGRANTFILE
+            for name in self._shards.pop(key, []):
+                shard_dockerfile = component[0] / name
+                if shard_dockerfile.exists():
+                    shard_dockerfile.unlink()
+            base_dockerfile = component[0] / self.base_dockerfile(key)
+            if base_dockerfile.exists():
+                base_dockerfile.unlink()
+            vagrantfile = component[0] / self.vagrantfile(key)
             if vagrantfile.exists():
                 vagrantfile.unlink()
             for value in self.SPECIAL_FILES.values():
@@ -433,12 +965,12 @@ class PathOperation:
                 if path.exists():
                     path.unlink()
             if os.name == 'posix':
-                powershell_path = component[0] / self.POWERSHELLFILE
+                powershell_path = component[0] / self.powershell_file(key)
                 if powershell_path.exists():
                     powershell_path.unlink()
 
     def delete_result_directory(self):
-        for component in self.path_components:
+        for component in self.path_components.values():
             vagrant_result_dir = component[0] / self.VAGRANT_RESULT_DIR
             shutil.rmtree(str(vagrant_result_dir))
 
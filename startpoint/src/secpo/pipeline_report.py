@@ -0,0 +1,132 @@
+""" This module is created by Martin Vasko.
+    Combined report of security (docker) and portability (vagrant) pipelines
+    that run at the same time. Progress is printed whenever job of any
+    pipeline finishes and summary of both pipelines is printed at the end.
+"""
+
+from collections import OrderedDict
+import time
+
+
+class PipelineReport:
+    """
+    Collects state of jobs of all pipelines.
+    """
+    DOCKER = 'docker'
+    VAGRANT = 'vagrant'
+    # Job states
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CACHED = 'cached'
+    CANCELLED = 'cancelled'
+    SUCCESSFUL_STATES = [DONE, CACHED]
+    PROGRESS = '[{pipeline} {finished}/{total}] {target} {state}'
+    SUMMARY_HEADER = '{:<10} {:>6} {:>6} {:>6} {:>6}'.format(
+            'pipeline', 'total', DONE, CACHED, FAILED)
+    SUMMARY_LINE = '{:<10} {:>6} {:>6} {:>6} {:>6}'
+
+    def __init__(self):
+        """ Initialize """
+        # State of targets by pipeline
+        self._jobs = OrderedDict()
+        # Start and finish time of jobs by pipeline and target
+        self._times = dict()
+        # Callback of finished job with pipeline, target, state and number
+        # of finished and all jobs of pipeline
+        self.on_progress = None
+
+    def _pipeline(self, pipeline):
+        return self._jobs.setdefault(pipeline, OrderedDict())
+
+    def _finish(self, pipeline, target, state):
+        jobs = self._pipeline(pipeline)
+        jobs[target] = state
+        started, _ = self._times.get((pipeline, target), (None, None))
+        now = time.time()
+        self._times[(pipeline, target)] = (started or now, now)
+        finished = len([job for job in jobs.values() if job != self.RUNNING])
+        print(self.PROGRESS.format(pipeline=pipeline, finished=finished,
+                                   total=len(jobs), target=target.lower(),
+                                   state=state))
+        if self.on_progress:
+            self.on_progress(pipeline, target.lower(), state, finished,
+                             len(jobs))
+
+    def cached(self, pipeline, target):
+        """
+        Record job whose results were served from cache.
+        :param pipeline: Name of pipeline.
+        :param target: Name of tested target.
+        """
+        self._finish(pipeline, target, self.CACHED)
+
+    def track(self, pipeline, target, task):
+        """
+        Record running job. Its state is updated when task finishes.
+        :param pipeline: Name of pipeline.
+        :param target: Name of tested target.
+        :param task: Task of job scheduler.
+        """
+        self._pipeline(pipeline)[target] = self.RUNNING
+        self._times[(pipeline, target)] = (time.time(), None)
+        task.add_done_callback(
+                lambda done: self._finish(pipeline, target,
+                                          self.task_state(done)))
+
+    @classmethod
+    def task_state(cls, task):
+        """
+        Map finished task to state of job.
+        :param task: Finished task.
+        :return: State of job.
+        """
+        if task.cancelled():
+            return cls.CANCELLED
+        if task.exception() is not None or task.result() is False:
+            return cls.FAILED
+        return cls.DONE
+
+    def states(self, pipeline):
+        """
+        Return states of jobs of pipeline.
+        :param pipeline: Name of pipeline.
+        :return: Dictionary of target and its state.
+        """
+        return dict(self._jobs.get(pipeline, {}))
+
+    def jobs(self):
+        """
+        Return all recorded jobs. Start of job is time of its submission.
+        :return: List of tuples of pipeline, target, state, start and finish
+                 time.
+        """
+        return [(pipeline, target, state) +
+                self._times.get((pipeline, target), (None, None))
+                for pipeline, jobs in self._jobs.items()
+                for target, state in jobs.items()]
+
+    def succeeded(self):
+        """
+        :return: True when every job of every pipeline succeeded.
+        """
+        return all(state in self.SUCCESSFUL_STATES
+                   for jobs in self._jobs.values()
+                   for state in jobs.values())
+
+    def summary(self):
+        """
+        Print summary of all pipelines.
+        :return: Text of summary.
+        """
+        lines = [self.SUMMARY_HEADER]
+        for pipeline, jobs in self._jobs.items():
+            states = list(jobs.values())
+            failed = len([state for state in states
+                          if state not in self.SUCCESSFUL_STATES])
+            lines.append(self.SUMMARY_LINE.format(
+                    pipeline, len(states), states.count(self.DONE),
+                    states.count(self.CACHED), failed))
+        text = '\n'.join(lines)
+        print(text)
+        return text
@@ -0,0 +1,231 @@
+""" This module is created by Martin Vasko.
+    Lightweight timing of phases of run such as discovery, rendering of
+    Dockerfiles, image pull, tool installation, analysis, copying of
+    results and cleanup. Spans are collected per target, printed as
+    breakdown and written as Chrome trace events.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import re
+import threading
+import time
+
+from secpo.build_log import BuildLog
+
+
+def timed(name):
+    """
+    Decorator that measures method as phase of whole run. Instance of method
+    has to have profiler attribute.
+    :param name: Name of phase.
+    """
+    def decorator(function):
+        @wraps(function)
+        def run(self, *args, **kwargs):
+            with self.profiler.span(name):
+                return function(self, *args, **kwargs)
+        return run
+    return decorator
+
+
+class Span:
+    """
+    Finished phase of target.
+    """
+    __slots__ = ('name', 'target', 'start', 'end', 'thread')
+
+    def __init__(self, name, target, start, end, thread):
+        """ Initialize """
+        self.name = name
+        self.target = target
+        self.start = start
+        self.end = end
+        self.thread = thread
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class BuildPhases:
+    """
+    Callback of build events that splits build of image into phases by
+    instruction of started step.
+    """
+    INSTRUCTION = re.compile(r'(?:Step \d+/\d+ :|#\d+ \[[^\]]*\d+/\d+\])'
+                             r'\s*(?P<instruction>\w+)')
+
+    def __init__(self, profiler, target, run_phase, on_event=None):
+        """ Initialize """
+        self.profiler = profiler
+        self.target = target
+        # Phase of RUN instructions differs between base and tested image
+        self.phases = {'FROM': profiler.IMAGE_PULL, 'RUN': run_phase,
+                       'COPY': profiler.COPY_SOURCES,
+                       'ADD': profiler.COPY_SOURCES}
+        self.on_event = on_event
+        self._phase = None
+        self._start = None
+
+    def __call__(self, event):
+        if event.kind == BuildLog.STEP_STARTED:
+            match = self.INSTRUCTION.match(event.text)
+            instruction = match.group('instruction').upper() if match else ''
+            self._switch(self.phases.get(instruction, self.profiler.BUILD))
+        if self.on_event:
+            self.on_event(event)
+
+    def _switch(self, phase):
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.profiler.record(self._phase, self.target, self._start, now)
+        self._phase = phase
+        self._start = now
+
+    def finish(self):
+        """
+        Close phase of the last step.
+        """
+        self._switch(None)
+
+
+class Profiler:
+    """
+    Collects spans of phases. It is safe to record spans from more threads,
+    disabled profiler records nothing.
+    """
+    # Phases
+    DISCOVERY = 'discovery'
+    CONFIGURATION_FILES = 'configuration files'
+    RENDER = 'render dockerfiles'
+    WRITE = 'write dockerfiles'
+    BASE_IMAGE = 'base image'
+    IMAGE_PULL = 'image pull'
+    TOOL_INSTALL = 'tool install'
+    COPY_SOURCES = 'copy sources'
+    BUILD = 'build'
+    ANALYSIS = 'analysis'
+    CREATE_CONTAINER = 'create container'
+    DOCKER_CP = 'docker cp'
+    COLLECT_RESULTS = 'collect results'
+    VAGRANT_UP = 'vagrant up'
+    VAGRANT_PROVISION = 'vagrant provision'
+    CLEANUP = 'cleanup'
+    # Target of phases that are common for whole run
+    RUN = 'run'
+    REPORT_HEADER = '{:<40} {:<20} {:>6} {:>10}'.format(
+            'target', 'phase', 'count', 'seconds')
+    REPORT_LINE = '{:<40} {:<20} {:>6} {:>10.3f}'
+    TRACE_FILE = 'secpo-trace.json'
+    CATEGORY = 'secpo'
+
+    def __init__(self, enabled=True):
+        """ Initialize """
+        self.enabled = enabled
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, target, start, end):
+        """
+        Record finished phase.
+        :param name: Name of phase.
+        :param target: Target of phase, whole run when not set.
+        :param start: Start of phase from time.perf_counter.
+        :param end: End of phase from time.perf_counter.
+        """
+        if not self.enabled or name is None:
+            return
+        span = Span(name, str(target) if target else self.RUN, start, end,
+                    threading.get_ident())
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, target=None):
+        """
+        Measure phase of target, it can be used in coroutines as well.
+        :param name: Name of phase.
+        :param target: Target of phase, whole run when not set.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, target, start, time.perf_counter())
+
+    def build_phases(self, target, run_phase, on_event=None):
+        """
+        :param target: Target of built image.
+        :param run_phase: Phase of RUN instructions.
+        :param on_event: Other callback of build events.
+        :return: Class:`BuildPhases` callback of build events.
+        """
+        return BuildPhases(self, target, run_phase, on_event)
+
+    def breakdown(self):
+        """
+        :return: Ordered dictionary of target and dictionary of phase with
+                 number of spans and total seconds.
+        """
+        targets = OrderedDict()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        for span in spans:
+            phases = targets.setdefault(span.target, OrderedDict())
+            count, total = phases.get(span.name, (0, 0.0))
+            phases[span.name] = (count + 1, total + span.duration)
+        return targets
+
+    def report(self):
+        """
+        Print breakdown of phases of every target.
+        :return: Text of report.
+        """
+        lines = [self.REPORT_HEADER]
+        for target, phases in self.breakdown().items():
+            for phase, (count, total) in phases.items():
+                lines.append(self.REPORT_LINE.format(target, phase, count,
+                                                     total))
+        text = '\n'.join(lines)
+        print(text)
+        return text
+
+    def trace_events(self):
+        """
+        :return: Chrome trace events, every target is shown as own thread.
+        """
+        process = os.getpid()
+        threads = OrderedDict()
+        events = []
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        for span in spans:
+            thread = threads.setdefault(span.target, len(threads) + 1)
+            events.append({'name': span.name, 'cat': self.CATEGORY,
+                           'ph': 'X', 'pid': process, 'tid': thread,
+                           'ts': round((span.start - self._origin) * 1e6),
+                           'dur': round(span.duration * 1e6),
+                           'args': {'target': span.target,
+                                    'thread': span.thread}})
+        for target, thread in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': process,
+                           'tid': thread, 'args': {'name': target}})
+        return events
+
+    def write_trace(self, path=TRACE_FILE):
+        """
+        Write spans as Chrome trace event JSON.
+        :param path: Path of trace file.
+        """
+        with open(str(path), 'w') as trace_file:
+            json.dump({'traceEvents': self.trace_events(),
+                       'displayTimeUnit': 'ms'}, trace_file)
+        print("Trace of run written to {}.".format(path))
@@ -0,0 +1,139 @@
+""" This module is created by Martin Vasko.
+    Results of analysis are stored in local cache. Key of the cache is
+    created from content of analysed files and from rendered configuration
+    files (Dockerfile, Vagrantfile). When nothing changed since last run,
+    results are served from cache without building any image.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+
+class ResultCache:
+    """
+    Content addressed on-disk cache of result artifacts. Every entry is
+    directory named by key. Least recently used entries are evicted when
+    size of the cache exceeds its limit.
+    """
+    CACHE_HOME = 'XDG_CACHE_HOME'
+    CACHE_DIR = 'secpo'
+    RESULTS_DIR = 'results'
+    # Default size limit of cache in MB
+    MAX_SIZE = 512
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, directory=None, max_size=MAX_SIZE, enabled=True):
+        """ Initialize """
+        if directory:
+            self.directory = Path(directory)
+        else:
+            self.directory = self.default_directory() / self.RESULTS_DIR
+        self.max_size = max_size * 1024 * 1024
+        self.enabled = enabled
+
+    @classmethod
+    def default_directory(cls):
+        """
+        Return directory where secpo stores data that are persisted between
+        runs.
+        :return: Path to secpo cache directory.
+        """
+        cache_home = os.environ.get(cls.CACHE_HOME)
+        if cache_home:
+            return Path(cache_home) / cls.CACHE_DIR
+        return Path.home() / '.cache' / cls.CACHE_DIR
+
+    def key(self, path, files, *configurations):
+        """
+        Create key of the cache entry.
+        :param path: Build context that files are relative to.
+        :param files: Analysed files.
+        :param configurations: Rendered configuration files as strings.
+        :return: Hexadecimal digest.
+        """
+        digest = hashlib.sha256()
+        for file in sorted(files):
+            digest.update(file.relative_to(path).as_posix().encode('utf-8'))
+            digest.update(b'\0')
+            with open(str(file), 'rb') as read_file:
+                for chunk in iter(lambda: read_file.read(self.CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+        for configuration in configurations:
+            digest.update(configuration.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def lookup(self, key):
+        """
+        Return directory with cached artifacts of key or None when key is not
+        present in cache.
+        :param key: Key created by :meth:`key`.
+        :return: Path to cache entry.
+        """
+        if not self.enabled:
+            return None
+        entry = self.directory / key
+        if not entry.is_dir():
+            return None
+        # Mark entry as recently used
+        os.utime(str(entry))
+        return entry
+
+    def restore(self, key, destination):
+        """
+        Copy cached artifacts to destination directory.
+        :param key: Key created by :meth:`key`.
+        :param destination: Directory where artifacts are copied.
+        :return: List of restored files, None when cache misses.
+        """
+        entry = self.lookup(key)
+        if not entry:
+            return None
+        destination.mkdir(parents=True, exist_ok=True)
+        restored = []
+        for artifact in sorted(entry.iterdir()):
+            restored.append(Path(shutil.copy2(str(artifact),
+                                              str(destination))))
+        return restored
+
+    def store(self, key, artifacts):
+        """
+        Store artifacts in cache under key and evict old entries.
+        :param key: Key created by :meth:`key`.
+        :param artifacts: Files that are stored.
+        """
+        if not self.enabled or not artifacts:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.directory / key
+        # Fill temporary directory first so partially copied entry is
+        # never served
+        temporary = Path(tempfile.mkdtemp(dir=str(self.directory)))
+        for artifact in artifacts:
+            shutil.copy2(str(artifact), str(temporary))
+        if entry.exists():
+            shutil.rmtree(str(entry))
+        os.replace(str(temporary), str(entry))
+        self.evict()
+
+    def _entry_size(self, entry):
+        return sum(file.stat().st_size for file in entry.iterdir())
+
+    def evict(self):
+        """
+        Remove least recently used entries until cache fits its size limit.
+        """
+        if not self.directory.is_dir():
+            return
+        entries = [(entry.stat().st_mtime, self._entry_size(entry), entry)
+                   for entry in self.directory.iterdir() if entry.is_dir()]
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, entry in sorted(entries, key=lambda entry: entry[0]):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(str(entry), ignore_errors=True)
+            total_size -= size
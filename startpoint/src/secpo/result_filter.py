@@ -0,0 +1,211 @@
+""" This module is created by Martin Vasko.
+    Filters suppress false positives among normalized findings. Filters are
+    compiled once into rule set indexed by tool and rule ID, so every
+    finding is compared only with rules that can match it. Rule set is
+    applied as streaming stage over findings and counts hits of every rule
+    together with time spent by evaluation.
+"""
+
+from collections import Counter
+from fnmatch import translate
+import re
+import shlex
+import threading
+import time
+
+from defusedxml.ElementTree import parse
+
+
+class FilterRule:
+    """
+    Compiled filter. Every given criterion has to match for finding to be
+    suppressed, criterion that is not given matches everything.
+    """
+    ATTRIBUTES = ['name', 'tool', 'rule', 'path', 'message', 'fingerprint']
+
+    def __init__(self, name=None, tool=None, rule=None, path=None,
+                 message=None, fingerprint=None):
+        """ Initialize """
+        self.tool = tool or None
+        self.rule = rule or None
+        self.path = path or None
+        self.message = message or None
+        self.fingerprint = fingerprint or None
+        if not any([self.tool, self.rule, self.path, self.message,
+                    self.fingerprint]):
+            raise ValueError("Filter {} has no criterion.".format(name))
+        self.name = name or self.describe()
+        # Glob of path is matched against whole normalized path
+        self._path = re.compile(translate(self.path)) if self.path else None
+        self._message = re.compile(self.message) if self.message else None
+
+    def describe(self):
+        """
+        :return: Text of all criteria of rule.
+        """
+        return ' '.join('{}={}'.format(name, getattr(self, name))
+                        for name in self.ATTRIBUTES[1:]
+                        if getattr(self, name))
+
+    def matches(self, finding):
+        """
+        :param finding: Class:`Finding`.
+        :return: True when finding is suppressed by rule.
+        """
+        if self.tool and self.tool != finding.tool:
+            return False
+        if self.rule and self.rule != finding.rule:
+            return False
+        if self.fingerprint and self.fingerprint != finding.fingerprint:
+            return False
+        if self._path and not self._path.match(finding.file):
+            return False
+        if self._message and not self._message.search(finding.message):
+            return False
+        return True
+
+    def __repr__(self):
+        return 'FilterRule({!r})'.format(self.name)
+
+
+class FilterEngine:
+    """
+    Rule set of filters applied to stream of findings. It is safe to apply
+    engine from more threads at once.
+    """
+    FILTER = 'filter'
+    XML_SUFFIX = '.xml'
+    COMMENT = '#'
+    SUMMARY_HEADER = 'filter hits'
+    SUMMARY_LINE = '{} {}'
+    TIME_LINE = 'evaluated {} findings in {:.3f} s, suppressed {}'
+
+    def __init__(self, rules=None):
+        """ Initialize """
+        self.rules = list(rules or [])
+        # Rules keyed by fingerprint and by tool and rule ID, None is wildcard
+        self._fingerprints = {}
+        self._index = {}
+        for rule in self.rules:
+            if rule.fingerprint:
+                self._fingerprints.setdefault(rule.fingerprint, []) \
+                    .append(rule)
+            else:
+                self._index.setdefault((rule.tool, rule.rule), []) \
+                    .append(rule)
+        self.hits = Counter()
+        self.evaluated = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse_xml(cls, file):
+        """
+        Read rules from XML file with filter elements, criteria are
+        attributes of element.
+        :param file: Path of XML file.
+        :return: List of Class:`FilterRule`.
+        """
+        root = parse(str(file)).getroot()
+        return [FilterRule(**{name: element.get(name) for name
+                              in FilterRule.ATTRIBUTES})
+                for element in root.iter(cls.FILTER)]
+
+    @classmethod
+    def parse_lines(cls, file):
+        """
+        Read rules from text file where every line is one filter written as
+        space separated criteria such as rule=unusedFunction path=tests/*.
+        :param file: Path of text file.
+        :return: List of Class:`FilterRule`.
+        """
+        rules = []
+        with open(str(file), 'r') as read_file:
+            for line in read_file:
+                line = line.strip()
+                if not line or line.startswith(cls.COMMENT):
+                    continue
+                criteria = dict(criterion.split('=', 1) for criterion
+                                in shlex.split(line) if '=' in criterion)
+                unknown = set(criteria) - set(FilterRule.ATTRIBUTES)
+                if unknown:
+                    raise ValueError("Unknown criteria {} in {}.".format(
+                            ', '.join(sorted(unknown)), file))
+                rules.append(FilterRule(**criteria))
+        return rules
+
+    @classmethod
+    def load(cls, filters_file, filter_dir):
+        """
+        Load rules from filters file and from all files of filter directory.
+        :param filters_file: Path of XML file with filters.
+        :param filter_dir: Directory with XML or text files of filters.
+        :return: List of Class:`FilterRule`.
+        """
+        rules = []
+        if filters_file.is_file():
+            rules += cls.parse_xml(filters_file)
+        if filter_dir.is_dir():
+            for file in sorted(filter_dir.glob('**/*')):
+                if not file.is_file():
+                    continue
+                if file.suffix == cls.XML_SUFFIX:
+                    rules += cls.parse_xml(file)
+                else:
+                    rules += cls.parse_lines(file)
+        return rules
+
+    def suppressed_by(self, finding):
+        """
+        :param finding: Class:`Finding`.
+        :return: First Class:`FilterRule` that suppresses finding or None.
+        """
+        for rule in self._fingerprints.get(finding.fingerprint, []):
+            if rule.matches(finding):
+                return rule
+        for key in [(finding.tool, finding.rule), (finding.tool, None),
+                    (None, finding.rule), (None, None)]:
+            for rule in self._index.get(key, []):
+                if rule.matches(finding):
+                    return rule
+        return None
+
+    def apply(self, findings):
+        """
+        Streaming stage that leaves out suppressed findings.
+        :param findings: Iterable of Class:`Finding`.
+        :return: Generator of findings that are not suppressed.
+        """
+        hits = Counter()
+        evaluated = 0
+        elapsed = 0.0
+        try:
+            for finding in findings:
+                start = time.perf_counter()
+                rule = self.suppressed_by(finding)
+                elapsed += time.perf_counter() - start
+                evaluated += 1
+                if rule is None:
+                    yield finding
+                else:
+                    hits[rule.name] += 1
+        finally:
+            # Statistics of stage are merged once
+            with self._lock:
+                self.hits.update(hits)
+                self.evaluated += evaluated
+                self.elapsed += elapsed
+
+    def summary(self):
+        """
+        Print hits of every rule and time of evaluation.
+        :return: Text of summary.
+        """
+        lines = [self.SUMMARY_HEADER]
+        for name in dict.fromkeys(rule.name for rule in self.rules):
+            lines.append(self.SUMMARY_LINE.format(name, self.hits[name]))
+        lines.append(self.TIME_LINE.format(self.evaluated, self.elapsed,
+                                           sum(self.hits.values())))
+        text = '\n'.join(lines)
+        print(text)
+        return text
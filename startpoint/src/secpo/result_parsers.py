@@ -0,0 +1,423 @@
+""" This module is created by Martin Vasko.
+    Parsers of result artifacts of analysers. Every parser reads artifact as
+    stream line by line or chunk by chunk and yields normalized findings, so
+    whole reports are never loaded into memory. Artifacts of shards are
+    merged by parser of their format.
+"""
+
+from abc import ABCMeta, abstractmethod
+from html.parser import HTMLParser
+import re
+import shutil
+from xml.etree.ElementTree import TreeBuilder, XMLPullParser, tostring
+
+from defusedxml.ElementTree import DefusedXMLParser
+
+from secpo.findings import Finding
+
+
+class ResultParser(metaclass=ABCMeta):
+    """
+    Base of parsers of result artifacts.
+    """
+    TOOL = None
+    CHUNK_SIZE = 64 * 1024
+    ENCODING = 'utf-8'
+
+    @abstractmethod
+    def parse(self, stream):
+        """
+        Parse findings from stream.
+        :param stream: Text file object of artifact.
+        :return: Generator of Class:`Finding`.
+        """
+        pass
+
+    def parse_file(self, file):
+        """
+        Parse findings from artifact file.
+        :param file: Path of artifact.
+        :return: Generator of Class:`Finding`.
+        """
+        with open(str(file), 'r', encoding=self.ENCODING,
+                  errors='replace') as stream:
+            for finding in self.parse(stream):
+                yield finding
+
+    @classmethod
+    def merge_files(cls, files, destination):
+        """
+        Merge artifacts of shards into one artifact. Text reports are
+        concatenated in order of shards.
+        :param files: Paths of artifacts of shards.
+        :param destination: Path of merged artifact.
+        """
+        with open(str(destination), 'wb') as write_file:
+            for file in files:
+                with open(str(file), 'rb') as read_file:
+                    shutil.copyfileobj(read_file, write_file)
+
+
+class CppcheckParser(ResultParser):
+    """
+    Incremental parser of cppcheck XML version 2. Document is fed in chunks,
+    every finished error element is turned into finding and removed from
+    tree right away, so memory stays flat regardless of size of result.
+    """
+    TOOL = 'cppcheck'
+    SEVERITIES = {'error': Finding.ERROR, 'warning': Finding.WARNING}
+    EVENTS = ('start', 'end')
+    CPPCHECK = 'cppcheck'
+    ERRORS = 'errors'
+    ERROR = 'error'
+    LOCATION = 'location'
+    RESULTS_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                     '<results version="2">\n'
+    RESULTS_FOOTER = '    </errors>\n</results>\n'
+
+    def __init__(self):
+        """ Initialize """
+        self._parser = XMLPullParser(
+                events=self.EVENTS,
+                _parser=DefusedXMLParser(target=TreeBuilder()))
+        self._errors = None
+
+    def _read_elements(self):
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                if element.tag == self.ERRORS:
+                    self._errors = element
+                continue
+            if element.tag == self.CPPCHECK:
+                yield element
+            elif element.tag == self.ERROR:
+                yield element
+                # Processed error is dropped from tree
+                element.clear()
+                if self._errors is not None:
+                    self._errors.remove(element)
+
+    def feed_elements(self, data):
+        """
+        Feed chunk of document.
+        :param data: Bytes or string of document.
+        :return: Generator of finished cppcheck and error elements. Error
+                 element is cleared when next element is requested.
+        """
+        self._parser.feed(data)
+        return self._read_elements()
+
+    def close_elements(self):
+        """
+        Finish document.
+        :return: Generator of remaining finished elements.
+        """
+        self._parser.close()
+        return self._read_elements()
+
+    def finding(self, error):
+        """
+        :param error: Finished error element.
+        :return: Class:`Finding` of error.
+        """
+        location = error.find(self.LOCATION)
+        if location is None:
+            location = {}
+        return Finding(self.TOOL, error.get('id', ''),
+                       self.SEVERITIES.get(error.get('severity'),
+                                           Finding.NOTE),
+                       location.get('file', ''), location.get('line', 0),
+                       error.get('verbose') or error.get('msg', ''))
+
+    def _findings(self, elements):
+        for element in elements:
+            if element.tag == self.ERROR:
+                yield self.finding(element)
+
+    def feed(self, data):
+        """
+        Feed chunk of document as it arrives.
+        :param data: Bytes or string of document.
+        :return: Generator of findings finished by chunk.
+        """
+        return self._findings(self.feed_elements(data))
+
+    def close(self):
+        """
+        :return: Generator of remaining findings.
+        """
+        return self._findings(self.close_elements())
+
+    def iter_elements(self, stream):
+        """
+        Parse stream chunk by chunk.
+        :param stream: File object of document.
+        :return: Generator of finished cppcheck and error elements.
+        """
+        while True:
+            chunk = stream.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            for element in self.feed_elements(chunk):
+                yield element
+        for element in self.close_elements():
+            yield element
+
+    def parse(self, stream):
+        return self._findings(self.iter_elements(stream))
+
+    def parse_file(self, file):
+        with open(str(file), 'rb') as stream:
+            for finding in self.parse(stream):
+                yield finding
+
+    @classmethod
+    def write_results(cls, result_file, cppcheck, errors):
+        """
+        Write cppcheck XML document.
+        :param result_file: Path of written document.
+        :param cppcheck: Serialized cppcheck element or None.
+        :param errors: Serialized error elements.
+        """
+        with open(str(result_file), 'w') as write_file:
+            write_file.write(cls.RESULTS_HEADER)
+            if cppcheck is not None:
+                write_file.write('    ' + cppcheck + '\n')
+            write_file.write('    <errors>\n')
+            for error in errors:
+                write_file.write('        ' + error + '\n')
+            write_file.write(cls.RESULTS_FOOTER)
+
+    @classmethod
+    def merge_files(cls, files, destination):
+        """
+        Merge documents of shards. Error reported by more shards, e.g. in
+        header included by more translation units, is written only once.
+        """
+        cppcheck = None
+        errors = {}
+        for file in files:
+            with open(str(file), 'rb') as stream:
+                for element in cls().iter_elements(stream):
+                    serialized = tostring(element, encoding='unicode').strip()
+                    if element.tag == cls.CPPCHECK:
+                        if cppcheck is None:
+                            cppcheck = serialized
+                        continue
+                    errors.setdefault(serialized)
+        cls.write_results(destination, cppcheck, errors)
+
+
+class LineParser(ResultParser):
+    """
+    Parser of text reports where finding is described by single line.
+    """
+    LINE = None
+    SEVERITIES = {}
+    DEFAULT_SEVERITY = Finding.WARNING
+
+    def finding(self, match, file=None):
+        groups = match.groupdict()
+        return Finding(self.TOOL, groups.get('rule') or '',
+                       self.SEVERITIES.get(groups.get('severity'),
+                                           self.DEFAULT_SEVERITY),
+                       groups.get('file') or file, groups.get('line'),
+                       groups.get('message') or '')
+
+    def parse(self, stream):
+        for line in stream:
+            match = self.LINE.match(line.rstrip('\n'))
+            if match:
+                yield self.finding(match)
+
+
+class PhanParser(LineParser):
+    """
+    Parser of phan text output: file:line IssueType message.
+    """
+    TOOL = 'phan'
+    LINE = re.compile(r'^(?P<file>[^\s:][^:]*):(?P<line>\d+) '
+                      r'(?P<rule>Phan\w+) (?P<message>.*)$')
+
+
+class EslintParser(LineParser):
+    """
+    Parser of default stylish eslint output. File name is on its own line
+    followed by indented messages.
+    """
+    TOOL = 'eslint'
+    LINE = re.compile(r'^\s+(?P<line>\d+):\d+\s+(?P<severity>error|warning)'
+                      r'\s+(?P<message>.*?)(?:\s{2,}(?P<rule>[@\w/-]+))?$')
+    SUMMARY = re.compile(r'^\S*\s*\d+ problems?')
+    SEVERITIES = {'error': Finding.ERROR, 'warning': Finding.WARNING}
+
+    def parse(self, stream):
+        file = None
+        for line in stream:
+            line = line.rstrip('\n')
+            match = self.LINE.match(line)
+            if match:
+                yield self.finding(match, file)
+            elif line.strip() and not line[0].isspace() \
+                    and not self.SUMMARY.match(line):
+                file = line.strip()
+
+
+class ShellcheckParser(LineParser):
+    """
+    Parser of default shellcheck output. Location line precedes message of
+    every finding.
+    """
+    TOOL = 'shellcheck'
+    LOCATION = re.compile(r'^In (?P<file>.+) line (?P<line>\d+):$')
+    LINE = re.compile(r'^\s*\^-*\s*(?P<rule>SC\d+)(?: \((?P<severity>\w+)\))?'
+                      r': (?P<message>.*)$')
+    SEVERITIES = {'error': Finding.ERROR, 'warning': Finding.WARNING,
+                  'info': Finding.NOTE, 'style': Finding.NOTE}
+
+    def parse(self, stream):
+        file, line_number = None, 0
+        for line in stream:
+            line = line.rstrip('\n')
+            location = self.LOCATION.match(line)
+            if location:
+                file, line_number = location.group('file'), \
+                    location.group('line')
+                continue
+            match = self.LINE.match(line)
+            if match:
+                groups = match.groupdict()
+                yield Finding(self.TOOL, groups['rule'],
+                              self.SEVERITIES.get(groups['severity'],
+                                                  self.DEFAULT_SEVERITY),
+                              file, line_number, groups['message'])
+
+
+class TextCollector(HTMLParser):
+    """
+    Collects text of HTML document as lines. Block elements end lines.
+    """
+    BREAKS = ['br', 'div', 'p', 'li', 'tr', 'table', 'ul', 'h1', 'h2', 'h3',
+              'pre']
+
+    def __init__(self):
+        """ Initialize """
+        super(TextCollector, self).__init__(convert_charrefs=True)
+        self.lines = []
+        self._line = []
+        self._skip = 0
+
+    def _end_line(self):
+        text = ' '.join(''.join(self._line).split())
+        if text:
+            self.lines.append(text)
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ['script', 'style']:
+            self._skip += 1
+        if tag in self.BREAKS:
+            self._end_line()
+
+    def handle_endtag(self, tag):
+        if tag in ['script', 'style']:
+            self._skip = max(self._skip - 1, 0)
+        if tag in self.BREAKS:
+            self._end_line()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._line.append(data)
+
+    def close(self):
+        super(TextCollector, self).close()
+        self._end_line()
+
+    def pop_lines(self):
+        lines = self.lines
+        self.lines = []
+        return lines
+
+
+class HtmlParser(ResultParser):
+    """
+    Parser of HTML reports. Document is fed chunk by chunk and its text is
+    processed line by line.
+    """
+    def lines(self, stream):
+        collector = TextCollector()
+        while True:
+            chunk = stream.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            collector.feed(chunk)
+            for line in collector.pop_lines():
+                yield line
+        collector.close()
+        for line in collector.pop_lines():
+            yield line
+
+
+class BanditParser(HtmlParser):
+    """
+    Parser of bandit HTML report. Issue starts with name and message of test
+    and its attributes follow on separate lines.
+    """
+    TOOL = 'bandit'
+    ISSUE = re.compile(r'^(?P<name>\w+): (?P<message>.*)$')
+    ATTRIBUTE = re.compile(r'^(?P<name>Test ID|Severity|Confidence|CWE|File'
+                           r'|Line number|More info):\s*(?P<value>.*)$')
+    SEVERITIES = {'HIGH': Finding.ERROR, 'MEDIUM': Finding.WARNING,
+                  'LOW': Finding.NOTE}
+
+    def _finding(self, issue):
+        return Finding(self.TOOL, issue.get('Test ID', ''),
+                       self.SEVERITIES.get(issue.get('Severity', '').upper(),
+                                           Finding.WARNING),
+                       issue.get('File', ''), issue.get('Line number'),
+                       issue['message'])
+
+    def parse(self, stream):
+        issue = None
+        for line in self.lines(stream):
+            attribute = self.ATTRIBUTE.match(line)
+            if attribute:
+                if issue is not None:
+                    issue[attribute.group('name')] = attribute.group('value')
+                continue
+            match = self.ISSUE.match(line)
+            if match:
+                if issue and 'Test ID' in issue:
+                    yield self._finding(issue)
+                issue = {'message': match.group('message')}
+        if issue and 'Test ID' in issue:
+            yield self._finding(issue)
+
+
+class ReekParser(HtmlParser):
+    """
+    Parser of reek report. Text and HTML report contain smell per line in
+    form of [lines]:SmellType: context message or file:line: SmellType: ...
+    """
+    TOOL = 'reek'
+    FILE = re.compile(r'^(?P<file>\S+\.rb) -- \d+ warnings?')
+    LINE = re.compile(r'^(?:(?P<file>\S+\.rb):(?P<line>\d+):'
+                      r'|\[(?P<lines>[\d, ]+)\]:)\s*(?P<rule>\w+): '
+                      r'(?P<message>.*?)(?: \[https?://\S+\])?$')
+
+    def parse(self, stream):
+        file = None
+        for line in self.lines(stream):
+            header = self.FILE.match(line)
+            if header:
+                file = header.group('file')
+                continue
+            match = self.LINE.match(line)
+            if match:
+                groups = match.groupdict()
+                line_number = groups['line'] or \
+                    groups['lines'].split(',')[0].strip()
+                yield Finding(self.TOOL, groups['rule'], Finding.NOTE,
+                              groups['file'] or file, line_number,
+                              groups['message'])
+
@@ -5,29 +5,57 @@
     possible false positives, true negatives etc.
 """
 
+import asyncio
+from asyncio import create_subprocess_exec
+from collections import deque
 import functools
 import os
 from pathlib import Path
-import subprocess
+from xml.etree.ElementTree import ParseError
 
+from secpo.analyser_registry import REGISTRY
+from secpo.analysis_commands import RESULTS_DIR, result_artifacts
+from secpo.docker_backend import CliBackend
 from secpo.path_operation import PathOperation
+from secpo.profiler import Profiler
+from secpo.result_parsers import ResultParser
+from secpo.sharding import merge_findings
 
 
 class ResultRetriever:
-    DOCKER_CP = ['docker', 'cp', '{cont_id}:{src}', '{dst}']
     BRIDGE = 'bridge'
-    DOCKER_DISCONNECT = ['docker', 'network', 'disconnect', '{network}',
-                         '{cont_id}']
     # Vagrant commands
     VAGRANT_PROVISION = ['vagrant', 'provision']
     VAGRANT_SSH = ['vagrant', 'ssh']
     VAGRANT_SCP = ['vagrant', 'scp', '{vm_name}:{src}', '{dst}']
     RESULT_FILE = 'result'
-    SUFFIXES = ['.html', '.json', '.txt']
+    # Directory of results of shard inside result directory
+    SHARD_DIR = 'shard{number}'
+    # Copy content of directory instead of directory itself
+    DIRECTORY_CONTENT = '/.'
+    RED_COLOR = '\033[91m{}\033[00m'
+    # Seconds after copying or provisioning command is killed
+    TIMEOUT = 600
+    TIMEOUT_MESSAGE = "{cmd} did not finish in {timeout} seconds, killed.\n"
+    SUFFIXES = ['.html', '.json', '.txt', '.xml']
 
-    def __init__(self, result_highlighter=None):
+    def __init__(self, result_highlighter=None, result_cache=None):
         """ Initialize """
         self._config_creator = None
+        self.cache = result_cache
+        # Docker Engine API or docker client sharing command runner
+        self.backend = CliBackend(self._exec_cmd)
+        self.incremental = None
+        # Export of normalized findings of all targets
+        self.findings_export = None
+        # Fingerprint index of findings compared with baseline run
+        self.baseline = None
+        # Input directories of run, baseline identifies targets inside them
+        self.roots = []
+        # History of runs which records all findings
+        self.history = None
+        # Timing of phases shared with other subsystems
+        self.profiler = Profiler(enabled=False)
         self.security_results = None
         self.portability_results = None
         if result_highlighter and isinstance(result_highlighter,
@@ -44,98 +72,319 @@ class ResultRetriever:
     def config_creator(self, config):
         self._config_creator = config
 
-    def _exec_cmd(self, cmd, input_cmds=None, **kwargs):
-        process = subprocess.Popen(' '.join(cmd), stdin=subprocess.PIPE,
-                                   stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE, shell=True, **kwargs)
-        stdout = b""
-        stderr = b""
-        while True:
-            if input_cmds:
-                for input_cmd in input_cmds:
-                    stdout, stderr = process.communicate(input=input_cmd)
-                    process.wait()
-                    print(stdout.decode('utf-8'), end='')
-                    print(stderr.decode('utf-8'), end='')
-                    process = subprocess.Popen(' '.join(cmd), stdin=subprocess.PIPE,
-                                               stdout=subprocess.PIPE,
-                                               stderr=subprocess.PIPE, shell=True,
-                                               **kwargs)
-                input_cmds = []
-            if (isinstance(process.returncode, int) and process.returncode >= 0) or \
-                    stdout.decode('utf-8') or stderr.decode('utf-8'):
-                try:
-                    process.wait(timeout=5)
-                    # stdout, stderr = process.communicate()
-                    # print(stdout, end='')
-                    # print(stderr, end='')
-                    break
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    break
-            stdout, stderr = process.communicate()
-            if stdout:
-                print(stdout.decode('utf-8'))
-            if stderr:
-                print(stderr.decode('utf-8'))
-
-    def _docker_disconnect(self, programming_language):
-        cmd = self.DOCKER_DISCONNECT[:3]
-        cmd.append(self.DOCKER_DISCONNECT[3].format(network=self.BRIDGE))
-        cmd.append(self.DOCKER_DISCONNECT[4].format(cont_id=programming_language))
-        self._exec_cmd(cmd)
-
-    def retrieve_docker(self, path, programming_language):
+    async def _exec_cmd(self, cmd, input_cmds=None, timeout=TIMEOUT,
+                        **kwargs):
+        """
+        Execute command without blocking event loop. Command is killed when
+        it does not finish in time or when retrieval is cancelled.
+        :param cmd: Command as list of arguments.
+        :param input_cmds: Commands written to standard input of command.
+        :param timeout: Seconds after command is killed.
+        :return: Whether command was successful.
+        """
+        stdin = None
+        if input_cmds:
+            stdin = b'\n'.join(input_cmds) + b'\n'
+        try:
+            process = await create_subprocess_exec(
+                    *cmd, stdin=asyncio.subprocess.PIPE if stdin
+                    else asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE, **kwargs)
+        except FileNotFoundError as error:
+            print(self.RED_COLOR.format(str(error)))
+            return False
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                    process.communicate(input=stdin), timeout)
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            print(self.RED_COLOR.format(self.TIMEOUT_MESSAGE.format(
+                    cmd=' '.join(cmd), timeout=timeout)))
+            return False
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+        if stdout:
+            print(stdout.decode('utf-8'), end='')
+        if stderr:
+            print(self.RED_COLOR.format(stderr.decode('utf-8')), end='')
+        return process.returncode == 0
+
+    @staticmethod
+    async def _kill(process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    @classmethod
+    def artifacts_directory(cls, key):
+        """
+        Return directory inside container where result artifacts of path
+        component are collected.
+        :param key: Key of path component.
+        :return: Directory or None when language does not declare artifacts
+                 and whole working directory has to be copied.
+        """
+        if result_artifacts([PathOperation.language(key)]):
+            return RESULTS_DIR
+        return None
+
+    def result_directory(self, path, key):
+        """
+        Return directory on host where results of docker container are
+        copied. Languages that share directory have result directories of
+        their own.
+        """
+        result_path = Path(self._config_creator.docker_workdir(key))
+        return path / PathOperation.component_name(
+                self._config_creator.path_components, key, result_path.name)
+
+    def shard_directory(self, path, key, number):
+        """
+        Return directory on host where results of shard are copied.
+        """
+        return self.result_directory(path, key) / \
+            self.SHARD_DIR.format(number=number)
+
+    @classmethod
+    def result_files(cls, directory, key):
+        """
+        Return result artifacts of path component copied into directory.
+        :param directory: Directory with copied results.
+        :param key: Key of path component.
+        :return: Sorted list of declared artifacts that exist, result files
+                 when language does not declare artifacts.
+        """
+        artifacts = REGISTRY.artifacts([PathOperation.language(key)])
+        if not artifacts:
+            return sorted(directory.glob(cls.RESULT_FILE + '*'))
+        return sorted(directory / artifact for artifact in artifacts
+                      if (directory / artifact).is_file())
+
+    def _show_results(self, result_files):
+        for result_file in result_files:
+            if result_file.suffix in self.SUFFIXES:
+                with open(str(result_file), 'r') as read_result:
+                    print(read_result.read())
+
+    @staticmethod
+    def _print_findings(findings):
+        for finding in findings:
+            print(finding)
+            yield finding
+
+    def report_findings(self, path, key, findings=None):
+        """
+        Parse result artifacts of path component into normalized findings,
+        show them and add them to export.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param findings: Findings that were already parsed, e.g. merged
+                         findings of shards.
+        :return: False when language has no parser of its results.
+        """
+        language = PathOperation.language(key)
+        if not REGISTRY.has_parser(language):
+            return False
+        if findings is None:
+            findings = REGISTRY.parse_results(
+                    language, self.result_directory(path, key))
+        findings = self.highlighter.highlight(findings)
+        if self.history:
+            findings = self.history.stage(findings, path)
+        if self.baseline:
+            findings = self.baseline.stage(findings, path, key, self.roots)
+        findings = self._print_findings(findings)
+        try:
+            if self.findings_export and self.findings_export.enabled:
+                self.findings_export.add(findings, path)
+            else:
+                # Findings are only shown
+                deque(findings, maxlen=0)
+        except ParseError as error:
+            print(self.RED_COLOR.format("Results of {} cannot be parsed: {}"
+                                        .format(path, error)))
+        return True
+
+    def serve_cached(self, path, key, cache_key):
+        """
+        Serve results from cache when analysis of same sources with same
+        configuration was already done.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param cache_key: Key of result cache entry.
+        :return: True when results were served from cache.
+        """
+        if not self.cache or not cache_key:
+            return False
+        restored = self.cache.restore(cache_key,
+                                      self.result_directory(path, key))
+        if restored is None:
+            return False
+        print("Results of {} served from cache.".format(path))
+        if not self.report_findings(path, key):
+            self._show_results(restored)
+        return True
+
+    async def retrieve_docker(self, path, programming_language, key=None,
+                              cache_key=None):
         """
         Retrieve results from docker container. Copy files from execution of
         external tools.
-        :return:
+        :return: Whether results were copied.
         """
-        self._docker_disconnect(programming_language)
-        cmd = self.DOCKER_CP[:2]
-        cmd.append(self.DOCKER_CP[2].format(src=self._config_creator.docker_conf.
-                                            docker_workdir,
-                                            cont_id=programming_language))
-        string_path = str(path).replace(' ', '\\ ')
-        cmd.append(self.DOCKER_CP[3].format(dst=string_path))
-        self._exec_cmd(cmd)
-
-        result_path = Path(self._config_creator.docker_conf.docker_workdir)
-        odd = path / result_path.name / self.RESULT_FILE
-        for suffix in self.SUFFIXES:
-            odd = odd.with_suffix(suffix)
-            if odd.exists():
-                with open(str(odd), 'r') as read_result:
-                    print(read_result.read())
-        # todo: copy only result file
+        if not await self.copy_results(path, programming_language, key):
+            return False
+        # Merging and caching of results touches only files on host
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, functools.partial(
+                self.collect_results, path, key, cache_key))
+        return True
+
+    async def copy_results(self, path, container, key, destination=None):
+        """
+        Copy result artifacts from docker container to host.
+        :param path: Path of tested directory.
+        :param container: Name of container.
+        :param key: Key of path component.
+        :param destination: Directory on host, result directory of path
+                            component when not set.
+        :return: Whether results were copied.
+        """
+        await self.backend.disconnect(self.BRIDGE, container)
+        results = self.artifacts_directory(key)
+        if results:
+            # Only collected result artifacts are copied
+            destination = destination or self.result_directory(path, key)
+            destination.mkdir(parents=True, exist_ok=True)
+            source = results + self.DIRECTORY_CONTENT
+        elif destination:
+            destination.mkdir(parents=True, exist_ok=True)
+            source = self._config_creator.docker_workdir(key) + \
+                self.DIRECTORY_CONTENT
+        else:
+            destination = path
+            source = self._config_creator.docker_workdir(key)
+        with self.profiler.span(Profiler.DOCKER_CP, path):
+            return await self.backend.copy_from(container, source,
+                                                destination)
+
+    def merge_artifacts(self, directories, destination, key):
+        """
+        Merge result artifacts of shards into result directory of path
+        component, every artifact by parser of its analyser.
+        :param directories: Result directories of shards.
+        :param destination: Result directory of path component.
+        :param key: Key of path component.
+        :return: Sorted list of merged artifacts.
+        """
+        parsers = {}
+        for analyser in REGISTRY.analysers([PathOperation.language(key)]):
+            for artifact in analyser.artifacts:
+                parsers.setdefault(artifact, analyser.parser or ResultParser)
+        names = sorted({result_file.name for directory in directories
+                        for result_file in self.result_files(directory, key)
+                        if result_file.is_file()})
+        destination.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            parsers.get(name, ResultParser).merge_files(
+                    [directory / name for directory in directories
+                     if (directory / name).is_file()], destination / name)
+        return [destination / name for name in names]
 
-    def retrieve_vagrant(self, path):
+    def collect_shards(self, path, key, directories, cache_key=None):
+        """
+        Merge results of shards of path component. Findings reported by
+        more shards are shown only once. Merged artifacts are stored in
+        result cache.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param directories: Result directories of shards.
+        :param cache_key: Key of result cache entry.
+        """
+        with self.profiler.span(Profiler.COLLECT_RESULTS, path):
+            try:
+                result_files = self.merge_artifacts(
+                        directories, self.result_directory(path, key), key)
+            except ParseError as error:
+                print(self.RED_COLOR.format(
+                        "Results of {} cannot be merged: {}".format(path,
+                                                                    error)))
+                result_files = []
+            language = PathOperation.language(key)
+            findings = merge_findings(
+                    REGISTRY.parse_results(language, directory)
+                    for directory in directories)
+            if not self.report_findings(path, key, findings):
+                self._show_results(result_files)
+            if self.cache and cache_key and result_files:
+                self.cache.store(cache_key, result_files)
+
+    def collect_results(self, path, key=None, cache_key=None):
+        """
+        Process result files that were copied from docker container. Show
+        them as normalized findings and store them in result cache.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param cache_key: Key of result cache entry.
+        """
+        with self.profiler.span(Profiler.COLLECT_RESULTS, path):
+            self._collect_results(path, key, cache_key)
+
+    def _collect_results(self, path, key, cache_key):
+        result_directory = self.result_directory(path, key)
+        # Complete results of incremental analysis with unchanged files
+        if self.incremental:
+            self.incremental.merge(path, result_directory, key)
+        result_files = self.result_files(result_directory, key)
+        if not self.report_findings(path, key):
+            self._show_results(result_files)
+        if self.cache and cache_key:
+            self.cache.store(cache_key, [result_file for result_file
+                                         in result_files
+                                         if result_file.is_file()])
+
+    async def retrieve_vagrant(self, path, env=None):
         """
         Retrieve result files of portability testing from vagrant environment.
         Copy all necessary files as output.
-        :return:
+        :param env: Environment of vagrant, Vagrantfile of path when not
+                    given.
+        :return: Whether box was provisioned.
         """
-        env = os.environ.copy()
-        env['VAGRANT_CWD'] = str(path)
+        if env is None:
+            env = os.environ.copy()
+            env['VAGRANT_CWD'] = str(path)
         cmd = self.VAGRANT_PROVISION
-        self._exec_cmd(cmd, env=env)
+        with self.profiler.span(Profiler.VAGRANT_PROVISION, path):
+            provisioned = await self._exec_cmd(cmd, env=env)
+        if not provisioned:
+            return False
         cmd = self.VAGRANT_SSH
         if os.name == 'posix':
-            self._exec_cmd(cmd, [b'dir', b'echo %cd%', b'exit'], env=env)
+            await self._exec_cmd(cmd, [b'dir', b'echo %cd%', b'exit'], env=env)
         elif os.name == 'nt':
-            self._exec_cmd(cmd, [b'ls -al', b'pwd', b'exit'], env=env)
+            await self._exec_cmd(cmd, [b'ls -al', b'pwd', b'exit'], env=env)
         cmd = self.VAGRANT_SCP[:2]
         # cmd.append(self.VAGRANT_SCP[2].format(vm_name=PathOperation.VM_NAME,
         #                                       src=)])
+        return True
 
-    def retrieve(self):
-        """ Method should retrieve from both docker and vagrant the results.
+    async def retrieve(self, path, programming_language, key=None,
+                       cache_key=None):
+        """ Retrieve results of path from both docker and vagrant at once.
 
-        :return:
+        :return: Whether both retrievals were successful.
         """
-        # fixme: does not work yet
-        self.retrieve_docker()
-        self.retrieve_vagrant()
+        finished = await asyncio.gather(
+                self.retrieve_docker(path, programming_language, key,
+                                     cache_key),
+                self.retrieve_vagrant(path))
+        return all(finished)
 
     def perform_filter(self):
         """
@@ -146,11 +395,14 @@ class ResultRetriever:
 
 
 class ResultHighlighter:
-    def __init__(self, user_function=None, *args, **kwargs):
+    def __init__(self, user_function=None, *args, filter_engine=None,
+                 **kwargs):
         """ Initialize """
         self.user_function = self._config
         if user_function:
             self.user_function = user_function
+        # Class:`FilterEngine` applied to findings
+        self.filter_engine = filter_engine
         self.args = args
         self.kwargs = kwargs
 
@@ -165,20 +417,22 @@ class ResultHighlighter:
         """
         pass
 
-    def _highlight(self, *args, **kwargs):
+    def _highlight(self, findings=None):
         """
-        Common highlight function of retrieved result.
-        :param args:
-        :param kwargs:
-        :return:
+        Common highlight function of retrieved result. Suppressed findings
+        are left out of stream.
+        :param findings: Iterable of Class:`Finding`.
+        :return: Iterable of findings that are not suppressed.
         """
-        pass
+        if findings is None or self.filter_engine is None:
+            return findings
+        return self.filter_engine.apply(findings)
 
-    def highlight(self):
+    def highlight(self, findings=None):
         @functools.wraps(self.user_function)
         def run(*args, **kwargs):
             self.user_function(*args, **kwargs)
-            self._highlight(*args, **kwargs)
+            return self._highlight(findings)
         return run(*self.args, **self.kwargs)
 
 
@@ -5,105 +5,571 @@
     possible false positives, true negatives etc.
 """
 import asyncio
+import contextlib
+import copy
+import functools
+import itertools
+import json
+import os
+from pathlib import Path
+import sys
+import time
+
+from secpo.baseline import BaselineStore
+from secpo.batch import BatchRunner, BatchTarget
+from secpo.build_context import BuildContext
+from secpo.container_pool import ContainerPool
+from secpo.daemon import DaemonClient, SecpoDaemon
+from secpo.distributed import CoordinatorServer, HttpTransport, JobQueue, \
+    TOKEN_VARIABLE, Worker, create_job, unpack_artifacts
+from secpo.docker_backend import CliBackend, create_backend
 from secpo.docker_configuration import ConfigCreator
-from secpo.path_operation import PathOperation
-from secpo.result_retriever import ResultRetriever
+from secpo.findings import Finding, FindingsExport
+from secpo.history_store import HistoryStore
+from secpo.job_scheduler import JobScheduler
+from secpo.path_operation import PathArguments, PathOperation
+from secpo.pipeline_report import PipelineReport
+from secpo.profiler import Profiler
+from secpo.result_cache import ResultCache
+from secpo.result_filter import FilterEngine
+from secpo.result_retriever import ResultHighlighter, ResultRetriever
+from secpo.sharding import ShardPlanner
 from secpo.virtual_starter import VirtualStarter
 
 
+class SharedSubsystems:
+    """
+    Subsystems kept alive across runs of more targets, e.g. targets of
+    batch. Base images, warm containers, result cache, scheduler and stores
+    of run are created only once and every target reuses them.
+    """
+    # Images of targets of different runs must not clash
+    TAG_PREFIX = 't{number}-'
+
+    def __init__(self, args):
+        """ Initialize from parsed command line arguments """
+        self.profiler = Profiler(enabled=bool(args.profile))
+        self.run_subsystem = VirtualStarter({})
+        self.run_subsystem.backend = create_backend(args.docker_backend)
+        self.run_subsystem.profiler = self.profiler
+        if args.warm_containers:
+            self.run_subsystem.pool = ContainerPool(
+                    args.pool_size, args.pool_idle_timeout,
+                    self.run_subsystem.backend)
+        self.result_cache = ResultCache(max_size=args.cache_size,
+                                        enabled=not args.no_cache)
+        self.baseline = BaselineStore(run_id=args.run_id,
+                                      baseline=args.baseline)
+        self.history = None if args.no_history else HistoryStore()
+        self.scheduler = JobScheduler(args.jobs)
+        self.destroy_images = args.destroy_images
+        self._runs = itertools.count()
+
+    def tag_prefix(self):
+        """
+        :return: Prefix of image tags of next run.
+        """
+        return self.TAG_PREFIX.format(number=next(self._runs))
+
+    def for_run(self, run_id=None, baseline=None):
+        """
+        Share subsystems with another run, e.g. run submitted to daemon.
+        :param run_id: Identifier of run, current time when not given.
+        :param baseline: Identifier of baseline run.
+        :return: Copy of shared subsystems with own stores of run.
+        """
+        shared = copy.copy(self)
+        shared.baseline = BaselineStore(self.baseline.directory, run_id,
+                                        baseline)
+        if self.history:
+            shared.history = HistoryStore(self.history.path)
+        return shared
+
+    async def close(self):
+        """
+        Stop warm containers and remove base images when --destroy-images
+        is given, stores are closed by their owner.
+        """
+        if self.run_subsystem.pool:
+            await self.run_subsystem.pool.close()
+        if self.destroy_images:
+            backend = self.run_subsystem.backend
+            for tag in self.run_subsystem.registry.tags():
+                await backend.remove_image(tag)
+
+
 class RunFacade:
     """
     Facade for configuration, running and result retrieving.
     Makes easier operation division and extendability and configurability.
     Delegate client requests to appropriate subsystem objects.
     """
-    NUM_OF_CONCURRENT_PROCESSES = 2
     PORTABLE_LANGUAGES = ['JAVASCRIPT', 'SHELL', 'CS', 'RUBY', 'SQL']
+    RED_COLOR = '\033[91m{}\033[00m'
 
-    def __init__(self, operation_system=None):
+    def __init__(self, operation_system=None, command_line_args=None,
+                 path_subsystem=None, shared=None):
+        """
+        :param path_subsystem: Class:`PathOperation` with resolved
+                               containers, created from command line
+                               arguments when not given.
+        :param shared: Class:`SharedSubsystems` of more runs, run creates
+                       its own subsystems when not given.
+        """
         # Parse arguments from command line
-        self._path_subsystem = PathOperation()
-        self._path_subsystem.resolve_containers()
+        if path_subsystem is None:
+            path_subsystem = PathOperation(command_line_args)
+            path_subsystem.resolve_containers()
+        self._path_subsystem = path_subsystem
         # Touch docker configuration files
         self._path_subsystem.create_configuration_files()
         self._config_subsystem = ConfigCreator(self._path_subsystem,
                                                operation_system)
-        # Put all directories to virtualization starter
-        self._run_subsystem = VirtualStarter(self._path_subsystem.path_components)
-        self._result_subsystem = ResultRetriever()
+        self.shared = shared
+        # Phases of all subsystems are measured by one profiler
+        self.profiler = shared.profiler if shared \
+            else self._path_subsystem.profiler
+        self._config_subsystem.profiler = self.profiler
+        # Image tags of path components are prefixed by run
+        self._tag_prefix = shared.tag_prefix() if shared else ''
+        if shared:
+            self._run_subsystem = shared.run_subsystem
+            result_cache = None if self._path_subsystem.no_cache \
+                else shared.result_cache
+        else:
+            # Put all directories to virtualization starter
+            self._run_subsystem = VirtualStarter(
+                    self._path_subsystem.path_components)
+            self._run_subsystem.pool = self._path_subsystem.container_pool
+            self._run_subsystem.profiler = self.profiler
+            self._run_subsystem.backend = create_backend(
+                    self._path_subsystem.docker_backend)
+            if self._run_subsystem.pool:
+                self._run_subsystem.pool.backend = self._run_subsystem.backend
+            result_cache = ResultCache(
+                    max_size=self._path_subsystem.cache_size,
+                    enabled=not self._path_subsystem.no_cache)
+        backend = self._run_subsystem.backend
+        self._result_subsystem = ResultRetriever(self.result_highlighter(),
+                                                 result_cache=result_cache)
+        self._result_subsystem.profiler = self.profiler
+        # Docker client of result retriever runs commands with timeout
+        if not isinstance(backend, CliBackend):
+            self._result_subsystem.backend = backend
         configuration = self._config_subsystem.create_configuration()
         self._path_subsystem.write_configuration(configuration)
+        self._result_subsystem.incremental = self._path_subsystem.incremental
+        self._result_subsystem.roots = self._path_subsystem.input_directories
+        self._result_subsystem.findings_export = FindingsExport(
+                self._path_subsystem.jsonl, self._path_subsystem.sarif)
+        if shared:
+            self._result_subsystem.baseline = shared.baseline
+            self._result_subsystem.history = shared.history
+        else:
+            self._result_subsystem.baseline = self.baseline_store()
+            if self._path_subsystem.history:
+                self._result_subsystem.history = HistoryStore()
+        # Image tags of path components
+        self._tags = dict()
+        # Containers and images of tested directories created by this run
+        self._containers = []
+        # Server of jobs pulled by workers on other docker hosts
+        self.coordinator = None
+        if self._path_subsystem.coordinator and not shared:
+            host, _, port = self._path_subsystem.coordinator.rpartition(':')
+            try:
+                self.coordinator = CoordinatorServer(
+                        JobQueue(), host, int(port),
+                        os.environ.get(TOKEN_VARIABLE))
+            except ValueError as error:
+                print(self.RED_COLOR.format(str(error)))
+                exit(1)
         # Set docker working directory to result retriever for copying
         self._result_subsystem.config_creator = self._config_subsystem
 
-    async def docker_operation(self):
+    @property
+    def findings_export(self):
+        """
+        :return: Export of normalized findings of run.
+        """
+        return self._result_subsystem.findings_export
+
+    @findings_export.setter
+    def findings_export(self, findings_export):
+        self._result_subsystem.findings_export = findings_export
+
+    def baseline_store(self):
+        """
+        Create store of fingerprint indexes of this run.
+        :return: Class:`BaselineStore`.
+        """
+        store = BaselineStore(run_id=self._path_subsystem.run_id,
+                              baseline=self._path_subsystem.baseline)
+        if store.baseline and not store.exists(store.baseline):
+            print(self.RED_COLOR.format("Baseline run {} does not exist!"
+                                        .format(store.baseline)))
+            exit(1)
+        return store
+
+    def result_highlighter(self):
+        """
+        Create highlighter of results. Filters are compiled only when
+        --result-filter is given.
+        :return: Class:`ResultHighlighter`.
+        """
+        if not self._path_subsystem.result_filter:
+            return ResultHighlighter()
+        self._path_subsystem.load_filters()
+        return ResultHighlighter(filter_engine=FilterEngine(
+                self._path_subsystem.filters))
+
+    async def docker_operation(self, report=None):
         """
         Asynchronous running of multiple docker processes. This function
         ends with error or succesfully when deployment of container is done
-        and when results are retrieved.
+        and when results are retrieved. New container is built whenever
+        slot of scheduler frees and its results are retrieved right after
+        the build. Jobs of shared run take slots of shared scheduler.
 
+        :param report: Class:`PipelineReport` that records state of jobs.
         :return:
         """
-        run_tasks = []
-        retrieve_tasks = []
+        report = report or PipelineReport()
+        jobs = self._path_subsystem.jobs
+        if self.coordinator:
+            # Jobs are scheduled by coordinator according to workers
+            jobs = max(len(self._path_subsystem.path_components), 1)
+        scheduler = self.shared.scheduler if self.shared \
+            else JobScheduler(jobs)
+        tasks = []
+        # Shard jobs and future of merged result by key of path component
+        shards = {}
+
+        def submit(key, *stages):
+            task = scheduler.submit(*stages)
+            tasks.append(task)
+            report.track(report.DOCKER, key, task)
+
         for count, key in enumerate(self._path_subsystem.path_components.keys()):
             component = self._path_subsystem.path_components.get(key)
-            run_tasks.append(asyncio.create_task(
-                self._run_subsystem.create_container(component[0],
-                                                     key.lower()
-                                                     + str(count))))
-            retrieve_tasks.append((self._result_subsystem.retrieve_docker,
-                                   component[0],
-                                   key.lower() + str(count)))
-        runnable_chunks = list(
-            divide_chunks(run_tasks, self.NUM_OF_CONCURRENT_PROCESSES))
-        finished = []
+            cache_key = self.cache_key(key)
+            # Skip build of container when results are already cached
+            if self._result_subsystem.serve_cached(component[0], key,
+                                                   cache_key):
+                report.cached(report.DOCKER, key)
+                continue
+            if self.coordinator:
+                self._tags[key] = self._config_subsystem.base_images.get(key)
+                submit(key, (self.distributed_operation, component[0], key,
+                             cache_key))
+                continue
+            tag = self._tag_prefix + key.lower() + str(count)
+            # Shards of large directory are analysed by parallel containers
+            dockerfiles = self._path_subsystem.shard_dockerfiles(key)
+            if dockerfiles:
+                if self._run_subsystem.pool:
+                    tag = self._config_subsystem.base_images.get(key)
+                self._tags[key] = tag
+                # Every shard takes its own slot of scheduler
+                shard_tasks = [scheduler.submit(
+                        (self.shard_operation, component[0], key, tag,
+                         number, dockerfile))
+                    for number, dockerfile in enumerate(dockerfiles)]
+                tasks.extend(shard_tasks)
+                merged = asyncio.get_event_loop().create_future()
+                report.track(report.DOCKER, key, merged)
+                shards[key] = (shard_tasks, merged, cache_key)
+                continue
+            # Analyse in warm container, results are copied right away
+            if self._run_subsystem.pool:
+                self._tags[key] = self._config_subsystem.base_images.get(key)
+                submit(key, (self.pool_operation, component[0], key,
+                             cache_key))
+                continue
+            self._tags[key] = tag
+            self._containers.append(tag)
+            dockerfile = self._path_subsystem.dockerfile(key)
+            submit(key,
+                   (self._run_subsystem.create_container, component[0], tag,
+                    self._config_subsystem.base_images.get(key),
+                    BuildContext.from_path(self._path_subsystem,
+                                           component[0], dockerfile),
+                    dockerfile, self._path_subsystem.base_dockerfile(key)),
+                   (self._result_subsystem.retrieve_docker, component[0],
+                    tag, key, cache_key))
         try:
-            for chunk in runnable_chunks:
-                finished.append(await asyncio.gather(*chunk))
+            if self.shared:
+                await scheduler.wait(tasks)
+            else:
+                await scheduler.join()
+            for key, (shard_tasks, merged, cache_key) in shards.items():
+                try:
+                    merged.set_result(await self.merge_shards(
+                            self._path_subsystem.path_components[key][0],
+                            key, shard_tasks, cache_key))
+                except Exception as error:
+                    merged.set_exception(error)
+            # Report records state of merged results in done callbacks
+            await asyncio.gather(*[merged for _, merged, _ in shards.values()],
+                                 return_exceptions=True)
         except KeyboardInterrupt:
             self._run_subsystem.kill_processes()
             raise
-        runnable_chunks = list(divide_chunks(retrieve_tasks,
-                                             self.NUM_OF_CONCURRENT_PROCESSES))
-        for chunk in runnable_chunks:
-            for function in chunk:
-                function[0](function[1], function[2])
+        finally:
+            for _, merged, _ in shards.values():
+                merged.cancel()
+            # Warm containers of shared run are stopped by their owner
+            if self._run_subsystem.pool and not self.shared:
+                await self._run_subsystem.pool.close()
 
-    async def vagrant_operation(self):
+    async def pool_operation(self, path, key, cache_key):
+        """
+        Analyse path in warm container and process its results.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param cache_key: Key of result cache entry.
+        """
+        dockerfile = self._path_subsystem.dockerfile(key)
+        success = await self._run_subsystem.analyse_in_pool(
+                path, self._config_subsystem.base_images[key],
+                self._config_subsystem.docker_workdir(key),
+                BuildContext.from_path(self._path_subsystem, path,
+                                       dockerfile),
+                self._result_subsystem.result_directory(path, key),
+                self._result_subsystem.artifacts_directory(key),
+                dockerfile, self._path_subsystem.base_dockerfile(key))
+        if success:
+            self._result_subsystem.collect_results(path, key, cache_key)
+        return success
+
+    async def distributed_operation(self, path, key, cache_key):
+        """
+        Send path to coordinator queue and process result artifacts sent
+        back by worker that analysed it like results of local container.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param cache_key: Key of result cache entry.
+        :return: Whether worker analysed path.
+        """
+        results = self._result_subsystem.artifacts_directory(key) or \
+            self._config_subsystem.docker_workdir(key)
+        loop = asyncio.get_event_loop()
+        job = await loop.run_in_executor(None, functools.partial(
+                create_job, self._path_subsystem, path, key,
+                self._config_subsystem.base_images.get(key), results))
+        finished = await asyncio.wrap_future(
+                self.coordinator.queue.submit(job))
+        if not finished['success']:
+            return False
+        await loop.run_in_executor(None, functools.partial(
+                unpack_artifacts, finished['artifacts'],
+                self._result_subsystem.result_directory(path, key)))
+        await loop.run_in_executor(None, functools.partial(
+                self._result_subsystem.collect_results, path, key,
+                cache_key))
+        return True
+
+    async def shard_operation(self, path, key, tag, number, dockerfile):
+        """
+        Analyse one shard of path in its own container and copy its results.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param tag: Tag of image of path component.
+        :param number: Number of shard.
+        :param dockerfile: Name of Dockerfile of shard.
+        :return: Whether shard was analysed.
+        """
+        base_tag = self._config_subsystem.base_images.get(key)
+        base_dockerfile = self._path_subsystem.base_dockerfile(key)
+        directory = self._result_subsystem.shard_directory(path, key, number)
+        if self._run_subsystem.pool:
+            return await self._run_subsystem.analyse_in_pool(
+                    path, base_tag, self._config_subsystem.docker_workdir(key),
+                    BuildContext.from_path(self._path_subsystem, path,
+                                           dockerfile),
+                    directory, self._result_subsystem.artifacts_directory(key),
+                    dockerfile, base_dockerfile)
+        shard_tag = ShardPlanner.tag(tag, number)
+        self._containers.append(shard_tag)
+        built = await self._run_subsystem.create_container(
+                path, shard_tag, base_tag,
+                BuildContext.from_path(self._path_subsystem, path,
+                                       dockerfile),
+                dockerfile, base_dockerfile)
+        # Output of successful build can be empty
+        if built is False:
+            return False
+        return await self._result_subsystem.copy_results(
+                path, shard_tag, key, directory)
+
+    async def merge_shards(self, path, key, shard_tasks, cache_key=None):
+        """
+        Process merged results of shards once all of them finished.
+        :param path: Path of tested directory.
+        :param key: Key of path component.
+        :param shard_tasks: Finished tasks of shards in order of shards.
+        :param cache_key: Key of result cache entry.
+        :return: Whether all shards were analysed.
+        """
+        if any(PipelineReport.task_state(task) != PipelineReport.DONE
+               for task in shard_tasks):
+            return False
+        directories = [self._result_subsystem.shard_directory(path, key,
+                                                              number)
+                       for number in range(len(shard_tasks))]
+        # Merging of results touches only files on host
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, functools.partial(
+                self._result_subsystem.collect_shards, path, key,
+                directories, cache_key))
+        return True
+
+    def cache_key(self, key):
+        """
+        Create key of result cache from analysed files and rendered
+        configuration files of path component.
+        :param key: Key of path component.
+        :return: Key of result cache or None when cache is disabled.
+        """
+        result_cache = self._result_subsystem.cache
+        if not result_cache or not result_cache.enabled:
+            return None
+        path = self._path_subsystem.path_components[key][0]
+        configurations = []
+        for name in [self._path_subsystem.dockerfile(key),
+                     self._path_subsystem.vagrantfile(key)]:
+            configuration = path / name
+            if configuration.exists():
+                configurations.append(configuration.read_text())
+        files = self._path_subsystem.analysed_files(
+                path, self._path_subsystem.key_languages(key))
+        return result_cache.key(path, files, *configurations)
+
+    async def vagrant_operation(self, report=None):
         """
         Asynchronous vagrant boxes creation and testing the code.
+        :param report: Class:`PipelineReport` that records state of jobs.
         :return:
         """
-        tasks = []
-        result_tasks = []
+        report = report or PipelineReport()
+        scheduler = JobScheduler(self._path_subsystem.vm_jobs)
         for key in self._path_subsystem.path_components.keys():
-            if key in self.PORTABLE_LANGUAGES:
+            language = self._path_subsystem.language(key)
+            if language in self.PORTABLE_LANGUAGES:
                 print("{language} programs are portable, nothing to test!"
-                      .format(language=key.lower()))
+                      .format(language=language.lower()))
                 continue
             component = self._path_subsystem.path_components.get(key)
-            tasks.append(asyncio.create_task(
-                self._run_subsystem.create_box(component[0])))
-            result_tasks.append((self._result_subsystem.retrieve_vagrant, component[0]))
-        runnable_chunks = list(
-            divide_chunks(tasks, self.NUM_OF_CONCURRENT_PROCESSES))
-        finished = []
+            env = self._path_subsystem.vagrant_environment(key)
+            report.track(report.VAGRANT, key, scheduler.submit(
+                    (self._run_subsystem.create_box, component[0], env),
+                    (self._result_subsystem.retrieve_vagrant, component[0],
+                     env)))
         try:
-            for chunk in runnable_chunks:
-                finished.append(await asyncio.gather(*chunk))
+            await scheduler.join()
         except KeyboardInterrupt:
             self._run_subsystem.kill_processes()
             raise
-        runnable_chunks = list(divide_chunks(result_tasks,
-                                             self.NUM_OF_CONCURRENT_PROCESSES))
-        for chunk in runnable_chunks:
-            for function in chunk:
-                function[0](function[1])
 
-    def operation(self):
-        # todo: create simultaneous running of vagrant and docker
-        pass
+    async def operation(self):
+        """
+        Run security (docker) and portability (vagrant) pipelines at the
+        same time. Every pipeline has its own scheduler, so heavy virtual
+        machines do not take slots of containers.
+        :return: Class:`PipelineReport` of both pipelines.
+        """
+        report = PipelineReport()
+        history = self._result_subsystem.history
+        if history:
+            history.start_run(self._result_subsystem.baseline.run_id,
+                              self._path_subsystem.arguments)
+        if self.coordinator:
+            self.coordinator.start()
+        try:
+            await asyncio.gather(self.docker_operation(report),
+                                 self.vagrant_operation(report))
+        finally:
+            if self.coordinator:
+                self.coordinator.close()
+            report.summary()
+            filter_engine = self._result_subsystem.highlighter.filter_engine
+            if filter_engine:
+                filter_engine.summary()
+            self._result_subsystem.findings_export.close()
+            self._result_subsystem.baseline.summary()
+            self._result_subsystem.baseline.prune()
+            if history:
+                history.record_targets(self.history_targets(report))
+        return report
+
+    async def target_operation(self, report=None):
+        """
+        Analyse path components of shared run, e.g. one target of batch.
+        Only security (docker) pipeline runs, stores of shared subsystems
+        are finished by their owner.
+        :param report: Class:`PipelineReport` that records state of jobs.
+        :return: Class:`PipelineReport` of docker pipeline.
+        """
+        report = report or PipelineReport()
+        try:
+            await self.docker_operation(report)
+        finally:
+            self._result_subsystem.findings_export.close()
+            history = self._result_subsystem.history
+            if history:
+                history.record_targets(self.history_targets(report))
+            with self.profiler.span(Profiler.CLEANUP):
+                self._path_subsystem.delete_configurations()
+                await self.remove_containers()
+        return report
+
+    async def remove_containers(self):
+        """
+        Remove containers and images of tested directories of this run.
+        Their tags are unique to run, so they are never used again. Shared
+        docker objects cannot be pruned while other runs are analysed.
+        """
+        backend = self._run_subsystem.backend
+        for tag in self._containers:
+            await backend.remove(tag)
+            await backend.remove_image(tag)
+        self._containers = []
+
+    def history_targets(self, report):
+        """
+        Describe jobs of report as targets of history.
+        :param report: Class:`PipelineReport` of run.
+        :return: List of tuples of pipeline, target, language, image tag,
+                 state, start and finish time.
+        """
+        targets = []
+        for pipeline, key, state, started, finished in report.jobs():
+            path = self._path_subsystem.path_components[key][0]
+            image = self._tags.get(key) if pipeline == report.DOCKER \
+                else None
+            targets.append((pipeline, HistoryStore.target(path),
+                            self._path_subsystem.language(key), image, state,
+                            started, finished))
+        return targets
+
+    def finish(self, status):
+        """
+        Record exit status of run in history and show profile of run.
+        :param status: Exit status of run.
+        """
+        if self.profiler.enabled:
+            self.profiler.report()
+            self.profiler.write_trace(self._path_subsystem.profile)
+        history = self._result_subsystem.history
+        if history:
+            history.finish_run(status)
+            history.close()
+
+    def new_findings(self):
+        """
+        :return: Number of findings that are not present in baseline.
+        """
+        return self._result_subsystem.baseline.new_findings
 
     def list_filters(self):
         # List filters when desired.
@@ -115,30 +581,246 @@ class RunFacade:
         self.delete_configurations()
 
     def delete_configurations(self):
-        self._path_subsystem.delete_configurations()
-        self._run_subsystem.prune()
-        self._run_subsystem.vagrant_destroy()
-        self._path_subsystem.destroy_images(self._run_subsystem.tags)
-        self._path_subsystem.destroy_boxes()
-        self._path_subsystem.destroy_everything(self._run_subsystem.tags)
+        with self.profiler.span(Profiler.CLEANUP):
+            self._path_subsystem.delete_configurations()
+            self._run_subsystem.prune()
+            self._run_subsystem.vagrant_destroy()
+            self._path_subsystem.destroy_images(self._run_subsystem.tags)
+            self._path_subsystem.destroy_boxes()
+            self._path_subsystem.destroy_everything(self._run_subsystem.tags)
+
+
+# Exit status of run interrupted by user
+INTERRUPTED = 130
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def images_main(args):
+    """
+    Manage analyser base images without any tested directory.
+    :param args: Parsed command line arguments.
+    """
+    run_subsystem = VirtualStarter({})
+    run_subsystem.backend = create_backend(args.docker_backend)
+    registry = run_subsystem.registry
+    languages = [language.upper() for language in args.languages]
+    if args.images_command == 'list':
+        asyncio.run(registry.list_images(languages))
+        return 0
+    finished = asyncio.run(registry.warm(languages, args.parallel))
+    for tag, success in finished.items():
+        print("{} {}".format(tag, 'ready' if success else 'failed'))
+    return 0 if all(finished.values()) else 1
+
+
+def history_main(args):
+    """
+    Print history of runs or findings of past runs.
+    :param args: Parsed command line arguments.
+    """
+    target = HistoryStore.target(args.target) if args.target else None
+    with HistoryStore(args.database) as store:
+        if args.command == 'history':
+            rows = store.history(target, args.limit)
+            columns = HistoryStore.HISTORY_COLUMNS
+        else:
+            rows = store.query(target, args.rule, args.file, args.run,
+                               args.limit)
+            columns = HistoryStore.QUERY_COLUMNS
+    if args.json:
+        for row in rows:
+            print(json.dumps(row, sort_keys=True))
+        return 0
+    print('\t'.join(columns))
+    for row in rows:
+        for column in ['started', 'finished']:
+            if row.get(column):
+                row[column] = time.strftime(TIME_FORMAT,
+                                            time.localtime(row[column]))
+        print('\t'.join('' if row[column] is None else str(row[column])
+                        for column in columns))
+    return 0
+
+
+def worker_main(args):
+    """
+    Analyse jobs of coordinator until it stops the worker.
+    :param args: Parsed command line arguments.
+    """
+    run_subsystem = VirtualStarter({})
+    run_subsystem.backend = create_backend(args.docker_backend)
+    transport = HttpTransport(args.coordinator_url,
+                              os.environ.get(TOKEN_VARIABLE))
+    worker = Worker(transport, args.name, args.capacity, run_subsystem)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        run_subsystem.kill_processes()
+        return INTERRUPTED
+    print("Worker {} finished {} jobs.".format(worker.name, worker.completed))
+    return 0
+
+
+def batch_main(args):
+    """
+    Analyse all targets of manifest in one process. Targets share
+    scheduler, base images, warm containers, result cache and stores of
+    run.
+    :param args: Parsed command line arguments.
+    """
+    shared = SharedSubsystems(args)
+    baseline = shared.baseline
+    if baseline.baseline and not baseline.exists(baseline.baseline):
+        print(RunFacade.RED_COLOR.format("Baseline run {} does not exist!"
+                                         .format(baseline.baseline)))
+        return 1
+    if shared.history:
+        shared.history.start_run(baseline.run_id, vars(args))
+    manifest = sys.stdin if args.manifest == '-' else open(args.manifest)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    # Records are written to standard output, so progress and logs go to
+    # standard error
+    logs = contextlib.redirect_stdout(sys.stderr) \
+        if output is sys.stdout else contextlib.nullcontext()
+    with logs:
+        runner = BatchRunner(args, shared, RunFacade, output)
+
+        async def run():
+            try:
+                return await runner.run(manifest)
+            finally:
+                await shared.close()
 
+        status = INTERRUPTED
+        try:
+            status = 0 if asyncio.run(run()) else 1
+        except KeyboardInterrupt:
+            shared.run_subsystem.kill_processes()
+        finally:
+            for stream, name in [(manifest, args.manifest),
+                                 (output, args.output)]:
+                if name != '-':
+                    stream.close()
+            runner.summary()
+            baseline.summary()
+            baseline.prune()
+            # New findings against baseline fail the batch as well
+            if status == 0 and baseline.new_findings:
+                status = 1
+            if shared.profiler.enabled:
+                shared.profiler.report()
+                shared.profiler.write_trace(args.profile)
+            if shared.history:
+                shared.history.finish_run(status)
+                shared.history.close()
+        return status
 
-def divide_chunks(list_var, num_of_chunks):
-    # looping till length l
-    for i in range(0, len(list_var), num_of_chunks):
-        yield list_var[i:i + num_of_chunks]
+
+def daemon_main(args):
+    """
+    Serve runs submitted by clients until shutdown request.
+    :param args: Parsed command line arguments, defaults of runs.
+    """
+    shared = SharedSubsystems(args)
+    daemon = SecpoDaemon(args, shared, RunFacade, args.socket)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        shared.run_subsystem.kill_processes()
+        return INTERRUPTED
+    except (OSError, RuntimeError) as error:
+        print(RunFacade.RED_COLOR.format(str(error)))
+        return 1
+    finally:
+        if shared.history:
+            shared.history.close()
+    print("secpod finished {} runs.".format(daemon.runs))
+    return 0
+
+
+def client_main(args):
+    """
+    Submit --input paths to secpod and show findings streamed back.
+    :param args: Parsed command line arguments.
+    """
+    options = {name: getattr(args, name) for name in BatchTarget.OPTIONS}
+    request = {'method': SecpoDaemon.ANALYSE, 'run_id': args.run_id,
+               'baseline': args.baseline,
+               'targets': [{'path': str(Path(path).resolve()),
+                            'options': options} for path in args.input]}
+    findings_export = FindingsExport(args.jsonl, args.sarif)
+
+    async def submit():
+        status = 1
+        finished = 0
+        async for event in DaemonClient(args.socket).request(request):
+            if event['event'] == SecpoDaemon.FINDING:
+                finding = event['finding']
+                print(Finding.from_dict(finding))
+                findings_export.add([Finding.from_dict(finding)],
+                                    Path(event['path']) / finding['target'])
+            elif event['event'] == SecpoDaemon.PROGRESS:
+                print(PipelineReport.PROGRESS.format(**event['progress']))
+            elif event['event'] == SecpoDaemon.TARGET:
+                record = event['record']
+                finished += 1
+                print(BatchRunner.PROGRESS.format(
+                        finished=finished, path=record['path'],
+                        state=record['state']))
+                if record.get('error'):
+                    print(RunFacade.RED_COLOR.format(record['error']))
+            elif event['event'] == SecpoDaemon.FINISHED:
+                status = event['status']
+            elif event['event'] == SecpoDaemon.ERROR:
+                print(RunFacade.RED_COLOR.format(event['message']))
+        return status
+
+    try:
+        return asyncio.run(submit())
+    except OSError as error:
+        print(RunFacade.RED_COLOR.format("secpod is not running: {}"
+                                         .format(error)))
+        return 1
+    finally:
+        findings_export.close()
+
+
+def secpod_main():
+    """
+    Entry point of secpod, the same as secpo daemon.
+    """
+    return console_main(sys.argv[1:] + ['daemon'])
 
 
-def console_main():
+def console_main(argv=None):
+    args = PathArguments(argv).args
+    if args.command == 'daemon':
+        return daemon_main(args)
+    if args.command == 'images':
+        return images_main(args)
+    if args.command == 'worker':
+        return worker_main(args)
+    if args.command == 'batch':
+        return batch_main(args)
+    if args.command in ['history', 'query']:
+        return history_main(args)
+    if args.daemon and args.input:
+        return client_main(args)
     # Put command line arguments to Facade
     # Run docker and vagrant
-    facade = RunFacade()
+    facade = RunFacade(command_line_args=args)
     facade.list_filters()
     try:
-        # asyncio.run(facade.docker_operation())
-        asyncio.run(facade.vagrant_operation())
+        report = asyncio.run(facade.operation())
     except KeyboardInterrupt:
+        facade.finish(INTERRUPTED)
         facade.kill_processes()
         raise
     facade.delete_configurations()
+    # Only new findings fail the run when baseline is chosen
+    status = 0
+    if not report.succeeded() or facade.new_findings():
+        status = 1
+    facade.finish(status)
+    return status
 
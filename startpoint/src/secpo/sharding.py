@@ -0,0 +1,117 @@
+""" This module is created by Martin Vasko.
+    Sharded analysis of large targets. Analysed files are split into
+    balanced shards weighted by size or line count, every shard is analysed
+    in its own container and normalized findings of shards are merged
+    without duplicates. Only analysers whose results of file do not depend
+    on other files are sharded.
+"""
+
+import heapq
+import os
+
+
+class Shard:
+    """
+    Files analysed together in one container.
+    """
+    def __init__(self, number):
+        """ Initialize """
+        self.number = number
+        self.files = []
+        self.weight = 0
+
+    def add(self, file, weight):
+        self.files.append(file)
+        self.weight += weight
+
+
+class ShardPlanner:
+    """
+    Splits files into shards by longest processing time first rule, the
+    heaviest file is always placed into the lightest shard.
+    """
+    SIZE = 'size'
+    LINES = 'lines'
+    WEIGHTS = [SIZE, LINES]
+    DOCKERFILE = 'Dockerfile.shard{number}'
+    TAG = '{tag}-shard{number}'
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, count, weight=SIZE):
+        """ Initialize """
+        if count < 1:
+            raise ValueError("Number of shards has to be positive!")
+        if weight not in self.WEIGHTS:
+            raise ValueError("Unknown weight of shards: {}".format(weight))
+        self.count = count
+        self.weight = weight
+
+    @classmethod
+    def dockerfile(cls, number):
+        """
+        :return: Name of Dockerfile of shard.
+        """
+        return cls.DOCKERFILE.format(number=number)
+
+    @classmethod
+    def tag(cls, tag, number):
+        """
+        :return: Tag of image of shard.
+        """
+        return cls.TAG.format(tag=tag, number=number)
+
+    def weight_of(self, file):
+        """
+        :param file: Analysed file.
+        :return: Size or number of lines of file, at least one.
+        """
+        try:
+            if self.weight == self.SIZE:
+                return max(os.path.getsize(str(file)), 1)
+            lines = 0
+            with open(str(file), 'rb') as read_file:
+                for chunk in iter(lambda: read_file.read(self.CHUNK_SIZE),
+                                  b''):
+                    lines += chunk.count(b'\n')
+            return max(lines, 1)
+        except OSError:
+            return 1
+
+    def plan(self, files):
+        """
+        Split files into balanced shards.
+        :param files: Analysed files.
+        :return: List of non empty Class:`Shard` ordered by number, files of
+                 shard keep order of input.
+        """
+        order = {file: index for index, file in enumerate(files)}
+        weighted = sorted(((self.weight_of(file), file) for file in order),
+                          key=lambda item: (-item[0], order[item[1]]))
+        shards = [Shard(number) for number in range(self.count)]
+        heap = [(0, shard.number) for shard in shards]
+        for weight, file in weighted:
+            load, number = heapq.heappop(heap)
+            shards[number].add(file, weight)
+            heapq.heappush(heap, (load + weight, number))
+        shards = [shard for shard in shards if shard.files]
+        for number, shard in enumerate(shards):
+            shard.number = number
+            shard.files.sort(key=order.get)
+        return shards
+
+
+def merge_findings(streams):
+    """
+    Merge findings of shards. Finding reported by more shards, e.g. in
+    header included by more translation units, is yielded only once.
+    :param streams: Iterables of Class:`Finding` of shards.
+    :return: Generator of unique findings.
+    """
+    seen = set()
+    for stream in streams:
+        for finding in stream:
+            identity = (finding.fingerprint, finding.line)
+            if identity in seen:
+                continue
+            seen.add(identity)
+            yield finding
@@ -1677,10 +1677,10 @@ Vagrant.configure("2") do |config|
      
         # Copy setup.ps1 to the Temp directory and then run boxstarter with our setup.ps1 script        
         $env:PSModulePath = "$([System.Environment]::GetEnvironmentVariable('PSModulePath', 'User'));$([System.Environment]::GetEnvironmentVariable('PSModulePath', 'Machine'))"
-        cp C:/Users/vagrant/portability_testing/setup.ps1 $env:TEMP
+        cp C:/Users/vagrant/portability_testing/{setup} $env:TEMP
         Import-Module Boxstarter.Chocolatey
         $credential = New-Object System.Management.Automation.PSCredential("vagrant", (ConvertTo-SecureString "vagrant" -AsPlainText -Force))
-        Install-BoxstarterPackage $env:TEMP\\setup.ps1 -Credential $credential
+        Install-BoxstarterPackage $env:TEMP\\{setup} -Credential $credential
 
 {cmds}
       POWERSHELL
@@ -10,16 +10,15 @@ import os
 import time
 import signal
 import subprocess
-import sys
+from secpo.docker_backend import CliBackend
+from secpo.image_registry import BaseImageRegistry
 from secpo.path_operation import PathOperation
+from secpo.profiler import Profiler
 
 
 class VirtualStarter:
     # Colors define
     RED_COLOR = '\033[91m{}\033[00m'
-    DOCKER_BUILD = ['docker', 'build', '-t']
-    DOCKER_CREATE = 'docker create --name {0} {1}'
-    DOCKER_PRUNE = 'docker {prune_type} prune -f'
     # Vagrant commands
     VAGRANT_BOXES = ['vagrant', 'up']
     VAGRANT_DESTROY = 'vagrant destroy -f'
@@ -27,12 +26,6 @@ class VirtualStarter:
     VBOXMANAGE_CONTROLVM = 'vboxmanage controlvm {name} poweroff'
     VBOXMANAGE_UNREGISTERVM = 'vboxmanage unregistervm --delete {name}'
     # Return constants
-    SUCCESSFUL = "Successfully tagged"
-    COPY_ERROR = "COPY failed:"
-    MANIFEST_ERROR = "manifest unknown"
-    DAEMON_ERROR = "Error response from daemon:"
-    ERROR = "E: "
-    RETURN_NON_ZERO = "returned a non-zero code:"
     VBOXMANAGE_ERROR = "VBoxManage --version"
     HOSTNAME_ERROR = "hostname set for the VM should only contain letters"
     NAME_ERROR = 'VirtualBox machine with the name'
@@ -44,6 +37,15 @@ class VirtualStarter:
         self._processes = []
         self.directories = path_list
         self.tags = []
+        # Analyser base images shared by all containers
+        self.registry = BaseImageRegistry(self)
+        # Pool of warm containers, images are built for every path when
+        # pool is not set
+        self.pool = None
+        # Docker Engine API or docker client
+        self.backend = CliBackend()
+        # Timing of phases shared with other subsystems
+        self.profiler = Profiler(enabled=False)
 
     async def log_output(self, process):
         # Rest of the output
@@ -56,65 +58,115 @@ class VirtualStarter:
             return False
         return True
 
-    async def create_container(self, path, tag):
+    async def docker_build(self, path, tag, dockerfile=None, on_event=None,
+                           context=None):
+        """
+        Build docker image from path with tag. Output of build is logged.
+        :param path: Build context.
+        :param tag: Tag of built image.
+        :param dockerfile: Name of Dockerfile when other than default.
+        :param on_event: Callback of Class:`BuildEvent` of build.
+        :param context: Class:`BuildContext` streamed instead of whole path.
+        :return: Last output line and whether build was successful.
+        """
+        # Steps of base image install tools, steps of tested image analyse
+        if dockerfile and dockerfile.startswith(PathOperation.BASE_DOCKERFILE):
+            phases = self.profiler.build_phases(tag, Profiler.TOOL_INSTALL,
+                                                on_event)
+        else:
+            phases = self.profiler.build_phases(path, Profiler.ANALYSIS,
+                                                on_event)
+        try:
+            return await self.backend.build(path, tag, dockerfile, phases,
+                                            context)
+        finally:
+            phases.finish()
+
+    async def create_base_image(self, path, base_tag,
+                                base_dockerfile=PathOperation.BASE_DOCKERFILE):
+        """
+        Make analyser base image available. It is built only when it is not
+        present in docker daemon, concurrent jobs of the same language wait
+        for the first build.
+        :param path: Directory that contains recipe of base image.
+        :param base_tag: Tag of base image.
+        :param base_dockerfile: Name of recipe of base image.
+        :return: Whether base image is available.
+        """
+        with self.profiler.span(Profiler.BASE_IMAGE, path):
+            return await self.registry.ensure(base_tag, path,
+                                              dockerfile=base_dockerfile)
+
+    async def create_container(self, path, tag, base_tag=None, context=None,
+                               dockerfile=None,
+                               base_dockerfile=PathOperation.BASE_DOCKERFILE):
         """
         Deploy containers in path directories based on the programming language
         add tag to image and create container after building image.
-        :return:
+        :param context: Class:`BuildContext` of image, whole path when not set.
+        :param dockerfile: Name of Dockerfile when other than default, e.g.
+                           Dockerfile of shard.
+        :param base_dockerfile: Name of recipe of base image.
+        :return: Output of build or False when build failed.
         """
-        # Create copy of class constant
-        command = copy.copy(self.DOCKER_BUILD)
-        command.append(tag)
         self.tags.append(tag)
-        command.append(str(path).replace(' ', '\\ '))
-
-        process = await create_subprocess_shell(' '.join(command),
-                                                stdout=asyncio.subprocess.PIPE,
-                                                stderr=asyncio.subprocess.PIPE)
-        self._processes.append(process)
-        stdout = b""
-        stderr = b""
         success = True
-        while True:
-            if self.SUCCESSFUL in stdout.decode('utf-8') or \
-               self.ERROR in stdout.decode('utf-8') or \
-               self.MANIFEST_ERROR  in stderr.decode('utf-8') or \
-               self.RETURN_NON_ZERO in stderr.decode('utf-8') or \
-               self.COPY_ERROR in stderr.decode('utf-8') or \
-               self.DAEMON_ERROR in stderr.decode('utf-8'):
-                await self.log_output(process)
-                break
-            stdout = await process.stdout.readline()
-            print(stdout.decode('utf-8'), end='')
-            # Continue when stdout is not empty
-            if stdout:
-                continue
-            # Otherwise error message could be in StreamReader
-            stderr = await process.stderr.readline()
-            print(self.RED_COLOR.format(stderr.decode('utf-8')), end='')
-            if self.RETURN_NON_ZERO not in stderr.decode('utf-8'):
-                success = False
-        # Clear all processes after execution
-        self._processes = []
+        if base_tag:
+            success = await self.create_base_image(path, base_tag,
+                                                   base_dockerfile)
         if success:
-            # Create container from image
-            process = await create_subprocess_shell(self.DOCKER_CREATE.format(tag,
-                                                                              tag))
-            await process.wait()
-        else:
-            # Exit program because of docker fail
-            sys.exit(1)
+            stdout, success = await self.docker_build(path, tag, dockerfile,
+                                                      context=context)
+        if not success:
+            # Docker failed, other jobs continue
+            return False
+        # Create container from image
+        with self.profiler.span(Profiler.CREATE_CONTAINER, path):
+            await self.backend.create(tag, tag)
         return stdout
 
-    async def create_box(self, path):
+    async def analyse_in_pool(self, path, base_tag, workdir, context,
+                              destination, results=None,
+                              dockerfile=PathOperation.DOCKERFILE,
+                              base_dockerfile=PathOperation.BASE_DOCKERFILE):
+        """
+        Analyse path inside warm container of analyser base image instead of
+        building image of tested directory.
+        :param path: Tested directory.
+        :param base_tag: Tag of analyser base image.
+        :param workdir: Working directory of base image.
+        :param context: Class:`BuildContext` of files streamed into
+                        container.
+        :param destination: Directory on host where results are copied.
+        :param results: Directory of collected result artifacts.
+        :param dockerfile: Name of Dockerfile with analysis commands.
+        :param base_dockerfile: Name of recipe of base image.
+        :return: Whether analysis was successful.
+        """
+        if not await self.create_base_image(path, base_tag, base_dockerfile):
+            return False
+        dockerfile = (path / dockerfile).read_text()
+        with self.profiler.span(Profiler.ANALYSIS, path):
+            return await self.pool.run(base_tag, context, workdir,
+                                       self.pool.analysis_commands(dockerfile),
+                                       destination, results)
+
+    async def create_box(self, path, env=None):
         """
         Create virtual boxes using Vagrant in path directories based on
         the programming language.
+        :param env: Environment of vagrant, Vagrantfile of path when not
+                    given.
         :return:
         """
+        with self.profiler.span(Profiler.VAGRANT_UP, path):
+            return await self._create_box(path, env)
+
+    async def _create_box(self, path, env=None):
         command = copy.copy(self.VAGRANT_BOXES)
-        env = os.environ.copy()
-        env['VAGRANT_CWD'] = str(path)
+        if env is None:
+            env = os.environ.copy()
+            env['VAGRANT_CWD'] = str(path)
         process = await create_subprocess_shell(' '.join(command),
                                                 stdout=asyncio.subprocess.PIPE,
                                                 stderr=asyncio.subprocess.PIPE,
@@ -141,10 +193,11 @@ class VirtualStarter:
             stderr = await process.stderr.readline()
             print(self.RED_COLOR.format(stderr.decode('utf-8')), end='')
             success = False
-        # Clear all processes
-        self._processes = []
+        if process in self._processes:
+            self._processes.remove(process)
         if not success:
-            sys.exit(1)
+            # Vagrant failed, other jobs continue
+            return False
         return stdout
 
     async def deploy(self):
@@ -175,15 +228,12 @@ class VirtualStarter:
                     continue
                 process.kill()
         self._processes = []
+        self.backend.kill_processes()
 
     def prune(self):
         """ Prune all unsed docker containers and images."""
-        process = subprocess.Popen(self.DOCKER_PRUNE.format(
-                prune_type='container').split(' '))
-        process.wait()
-        process = subprocess.Popen(self.DOCKER_PRUNE.format(
-                prune_type='image').split(' '))
-        process.wait()
+        asyncio.run(self.backend.prune(self.backend.CONTAINER))
+        asyncio.run(self.backend.prune(self.backend.IMAGE))
 
     def vagrant_destroy(self):
         """ Destroy all vagrant and virtualbox images."""
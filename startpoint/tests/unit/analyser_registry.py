@@ -0,0 +1,178 @@
+""" This test module is created by Martin Vasko.
+    Analysers are declared in registry together with plugins of entry
+    points. Target is analysed by all analysers of its languages.
+"""
+
+import pathlib
+import tempfile
+import unittest
+from secpo.analyser_registry import Analyser, AnalyserRegistry, REGISTRY
+from secpo.docker_configuration import ConfigCreator
+from secpo.path_operation import PathOperation
+from secpo.result_parsers import ShellcheckParser
+from secpo.result_retriever import ResultRetriever
+from tests.unit.source_discovery import command_line_args
+
+SHELLCHECK = """In deploy.sh line 3:
+echo $1
+     ^-- SC2086: Double quote to prevent globbing and word splitting.
+"""
+LINT = Analyser('lint', ['SHELL'], 'lint {files} > lint.txt || true',
+                ['lint.txt'], ShellcheckParser)
+NIM = Analyser('nimcheck', ['NIM'], 'nim check {files} || true',
+               extensions=['.nim'],
+               recipe={'image': 'ubuntu', 'os_tools': ['nim'],
+                       'specific_tools': [],
+                       'other': ['WORKDIR /home/nim/app'],
+                       'tools': ['nim']})
+
+
+class MockEntryPoint:
+    def __init__(self, name, plugin):
+        """ Initialize """
+        self.name = name
+        self.plugin = plugin
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        if isinstance(self.plugin, Exception):
+            raise self.plugin
+        return self.plugin
+
+
+class MockRegistry(AnalyserRegistry):
+    def __init__(self, entry_points):
+        """ Initialize """
+        super(MockRegistry, self).__init__()
+        self.mock_entry_points = entry_points
+
+    def entry_points(self):
+        return self.mock_entry_points
+
+
+class AnalyserRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def resolve(self, names):
+        for name in names:
+            file = self.root / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text('')
+        path_conf = PathOperation(command_line_args([str(self.root)]))
+        path_conf.resolve_containers()
+        return path_conf
+
+    def test_mixed_target_runs_all_analysers(self):
+        path_conf = self.resolve(['index.php', 'deploy.sh'])
+        path = path_conf.path_components['PHP'][0]
+        self.assertIs(path, path_conf.path_components['SHELL'][0])
+        commands, _, _ = path_conf.list_analysed_files('PHP')
+        lines = commands.splitlines()
+        # Analysers are started in parallel inside one RUN instruction
+        self.assertEqual(1, len(lines))
+        for command in ['phpstan analyse -l 8  index.php',
+                        'phan.txt  index.php', 'wait $pid']:
+            self.assertIn(command, lines[0])
+        self.assertNotIn('shellcheck', commands)
+        commands, _, _ = path_conf.list_analysed_files('SHELL')
+        self.assertEqual('RUN shellcheck  deploy.sh > shellcheck.txt '
+                         '|| true', commands)
+        self.assertEqual(['phan.txt', 'shellcheck.txt'],
+                         REGISTRY.artifacts(['PHP', 'SHELL']))
+        # Every language is analysed in image of its own toolchain
+        path_conf.create_configuration_files()
+        path_conf.write_configuration(
+                ConfigCreator(path_conf).create_configuration())
+        self.addCleanup(path_conf.delete_configurations)
+        for key, base, analyser in [('PHP', 'secpo-base-php', 'phpstan'),
+                                    ('SHELL', 'secpo-base-shell',
+                                     'shellcheck')]:
+            name = path_conf.dockerfile(key)
+            self.assertEqual('Dockerfile.' + key.lower(), name)
+            dockerfile = (path / name).read_text()
+            self.assertTrue(dockerfile.startswith('FROM ' + base))
+            self.assertIn(analyser, dockerfile)
+            self.assertTrue((path / path_conf.base_dockerfile(key))
+                            .is_file())
+        self.assertFalse((path / PathOperation.DOCKERFILE).exists())
+        # Boxes of languages do not share Vagrantfile and machine state
+        environments = [path_conf.vagrant_environment(key)
+                        for key in ['PHP', 'SHELL']]
+        self.assertEqual(['Vagrantfile.php', 'Vagrantfile.shell'],
+                         [env['VAGRANT_VAGRANTFILE']
+                          for env in environments])
+        self.assertEqual(2, len(set(env['VAGRANT_DOTFILE_PATH']
+                                    for env in environments)))
+        self.assertTrue(all(env['VAGRANT_CWD'] == str(path)
+                            for env in environments))
+        for key in ['PHP', 'SHELL']:
+            vagrantfile = (path / path_conf.vagrantfile(key)).read_text()
+            self.assertIn("'secpo{}'".format(key), vagrantfile)
+        self.assertFalse((path / PathOperation.VAGRANTFILE).exists())
+
+    def test_shared_analyser_runs_once(self):
+        path_conf = self.resolve(['a.c', 'b.h', 'c.py'])
+        self.assertEqual(['CL', 'CPP', 'PYTHON'],
+                         sorted(path_conf.path_components))
+        # Header of C and C++ is analysed by cppcheck of C only
+        commands, _, _ = path_conf.list_analysed_files('CL')
+        self.assertIn('cppcheck', commands)
+        self.assertEqual(['CL', 'CPP'], path_conf.key_languages('CL'))
+        commands, _, _ = path_conf.list_analysed_files('CPP')
+        self.assertEqual('', commands)
+        commands, _, _ = path_conf.list_analysed_files('PYTHON')
+        self.assertIn('bandit -f html -o bandit.html  c.py', commands)
+        # Languages of the same directory keep results of their own
+        config_creator = ConfigCreator(path_conf)
+        config_creator.create_configuration()
+        retriever = ResultRetriever()
+        retriever.config_creator = config_creator
+        path = path_conf.path_components['CL'][0]
+        directories = [retriever.result_directory(path, key)
+                       for key in ['CL', 'CPP', 'PYTHON']]
+        self.assertEqual(3, len(set(directories)))
+        self.assertTrue(all(directory.parent == path
+                            for directory in directories))
+
+    def test_plugins_loaded_lazily(self):
+        broken = MockEntryPoint('broken', ImportError('missing module'))
+        entry_points = [MockEntryPoint('lint', LINT),
+                        MockEntryPoint('nim', lambda: [NIM]), broken]
+        registry = MockRegistry(entry_points)
+        self.assertFalse(any(entry_point.loaded
+                             for entry_point in entry_points))
+        self.assertEqual(['shellcheck', 'lint'],
+                         [analyser.name for analyser
+                          in registry.analysers(['SHELL'])])
+        self.assertTrue(broken.loaded)
+        self.assertEqual(['.nim'], registry.extensions('NIM'))
+        (self.root / 'lint.txt').write_text(SHELLCHECK)
+        findings = list(registry.parse_results('SHELL', self.root))
+        self.assertEqual(['SC2086'], [finding.rule for finding in findings])
+
+    def test_sequential_analysers(self):
+        registry = AnalyserRegistry([], entry_points=False)
+        registry.register(Analyser('first', ['SHELL'], 'first {files}'))
+        registry.register(Analyser('second', ['SHELL'], 'second {files}',
+                                   parallel=False))
+        commands = registry.commands([(analyser, ' a.sh') for analyser
+                                      in registry.analysers(['SHELL'])])
+        self.assertEqual('RUN first  a.sh\nRUN second  a.sh', commands)
+
+    def test_plugin_language(self):
+        REGISTRY.register(NIM)
+        self.addCleanup(REGISTRY.unregister, NIM.name)
+        path_conf = self.resolve(['main.nim'])
+        self.assertEqual(['nim'], path_conf.path_components['NIM'][1])
+        commands, _, _ = path_conf.list_analysed_files('NIM')
+        self.assertEqual('RUN nim check  main.nim || true', commands)
+
+
+if __name__ == '__main__':
+    unittest.main()
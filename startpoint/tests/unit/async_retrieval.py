@@ -0,0 +1,86 @@
+""" This test module is created by Martin Vasko.
+    Results are retrieved by asynchronous commands that do not block event
+    loop, are killed after timeout and when retrieval is cancelled.
+"""
+
+import asyncio
+import pathlib
+import sys
+import tempfile
+import time
+import unittest
+from secpo.result_retriever import ResultRetriever
+
+
+class MockConfigCreator:
+    path_components = {}
+
+    def docker_workdir(self, key):
+        return '/usr/src/' + key.lower()
+
+
+class MockResultRetriever(ResultRetriever):
+    def __init__(self):
+        super(MockResultRetriever, self).__init__()
+        self.commands = []
+
+    async def _exec_cmd(self, cmd, input_cmds=None, timeout=None, **kwargs):
+        self.commands.append(cmd)
+        if cmd[1] == 'cp':
+            destination = pathlib.Path(cmd[3])
+            if not cmd[2].endswith('/.'):
+                destination = destination / cmd[2].rsplit('/', 1)[1]
+                destination.mkdir()
+            (destination / 'result.txt').write_text('finding')
+        return True
+
+
+class AsyncRetrieval(unittest.TestCase):
+    SLEEP = [sys.executable, '-c', 'import time; time.sleep(10)']
+
+    def test_exec_command(self):
+        retriever = ResultRetriever()
+        self.assertTrue(asyncio.run(retriever._exec_cmd(
+                [sys.executable, '-c', 'print("copied")'])))
+        self.assertFalse(asyncio.run(retriever._exec_cmd(
+                [sys.executable, '-c', 'import sys; sys.exit(1)'])))
+        self.assertFalse(asyncio.run(retriever._exec_cmd(
+                ['secpo-missing-command'])))
+
+    def test_timeout_kills_command(self):
+        retriever = ResultRetriever()
+        start = time.monotonic()
+        self.assertFalse(asyncio.run(retriever._exec_cmd(self.SLEEP,
+                                                         timeout=0.2)))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_cancel_kills_command(self):
+        async def scenario():
+            retriever = ResultRetriever()
+            task = asyncio.ensure_future(retriever._exec_cmd(self.SLEEP))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(scenario())
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_retrieve_docker(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory)
+            retriever = MockResultRetriever()
+            retriever.config_creator = MockConfigCreator()
+            self.assertTrue(asyncio.run(retriever.retrieve_docker(
+                    path, 'python0', 'PYTHON')))
+            # Only collected result artifacts are copied
+            self.assertEqual(retriever.commands[1],
+                             ['docker', 'cp', 'python0:/secpo/results/.',
+                              str(path / 'python')])
+            self.assertTrue((path / 'python' / 'result.txt').is_file())
+            # Whole working directory of language without manifest
+            self.assertTrue(asyncio.run(retriever.retrieve_docker(
+                    path, 'go0', 'GO')))
+            self.assertEqual(retriever.commands[3],
+                             ['docker', 'cp', 'go0:/usr/src/go', str(path)])
@@ -0,0 +1,117 @@
+""" This test module is created by Martin Vasko.
+    Findings of every run are stored in fingerprint index and compared with
+    index of baseline run, so only new findings are reported. Index of
+    target does not depend on numbering of path components.
+"""
+
+import pathlib
+import tempfile
+import unittest
+from secpo.baseline import BaselineStore
+from secpo.findings import Finding
+
+SOURCE = """int main() {
+    char *pointer = 0;
+    return *pointer;
+}
+"""
+MOVED_SOURCE = """#include <stdio.h>
+
+int main() {
+    char *pointer = 0;
+    return  *pointer;
+}
+"""
+
+
+def finding(rule, line, message='Message'):
+    return Finding('cppcheck', rule, 'error', './main.c', line, message)
+
+
+class BaselineDiffTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = pathlib.Path(self.directory.name)
+        self.store_directory = root / 'baselines'
+        self.target = root / 'target'
+        self.target.mkdir()
+        self.source = self.target / 'main.c'
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_store(self, run_id, findings, baseline=None):
+        store = BaselineStore(self.store_directory, run_id, baseline)
+        reported = list(store.stage(findings, self.target, 'CL'))
+        return store, reported
+
+    def test_only_new_findings_reported(self):
+        self.source.write_text(SOURCE)
+        store, reported = self.run_store('release', [
+                finding('nullPointer', 3), finding('unusedVariable', 2)])
+        self.assertEqual(2, len(reported))
+        self.assertEqual(0, store.new_findings)
+        # Code moved down and was reformatted
+        self.source.write_text(MOVED_SOURCE)
+        store, reported = self.run_store('current', [
+                finding('nullPointer', 5), finding('uninitvar', 4)],
+                baseline='release')
+        self.assertEqual(['uninitvar'], [item.rule for item in reported])
+        self.assertEqual(1, store.new_findings)
+        self.assertEqual(1, store.diff.unchanged)
+        self.assertEqual(['unusedVariable'],
+                         [item.rule for item in store.diff.fixed])
+        self.assertIn('1 new, 1 fixed, 1 unchanged', store.summary())
+        self.assertEqual(['current', 'release'], sorted(store.runs()))
+
+    def test_duplicate_findings_are_counted(self):
+        self.source.write_text(SOURCE)
+        self.run_store('release', [finding('nullPointer', 3)])
+        store, reported = self.run_store('current', [
+                finding('nullPointer', 3), finding('nullPointer', 3)],
+                baseline='release')
+        self.assertEqual(1, len(reported))
+        self.assertEqual(1, store.diff.unchanged)
+
+    def test_failed_stream_is_not_stored(self):
+        def findings():
+            yield finding('nullPointer', 3)
+            raise ValueError('broken result')
+        store = BaselineStore(self.store_directory, 'broken')
+        with self.assertRaises(ValueError):
+            list(store.stage(findings(), self.target, 'CL'))
+        target = store.target(self.target, 'CL')
+        self.assertEqual([], list(store.index_file('broken', target)
+                                  .parent.iterdir()))
+
+    def test_target_independent_of_group(self):
+        self.source.write_text(SOURCE)
+        root = self.target.parent
+        store = BaselineStore(self.store_directory, 'release')
+        list(store.stage([finding('nullPointer', 3)], self.target, 'CL',
+                         [root]))
+        # Another C directory was added and target became second group
+        store = BaselineStore(self.store_directory, 'current', 'release')
+        reported = list(store.stage([finding('nullPointer', 3)],
+                                    self.target, 'CL_1', [root]))
+        self.assertEqual([], reported)
+        self.assertEqual(1, store.diff.unchanged)
+        self.assertEqual('{}#target#CL'.format(root.resolve()),
+                         store.target(self.target, 'CL_1', [root]))
+        self.assertNotEqual(store.target(self.target, 'CL'),
+                            store.target(self.target, 'CPP'))
+
+    def test_prune_keeps_baseline(self):
+        for run in range(BaselineStore.MAX_RUNS + 3):
+            self.run_store('run{:02}'.format(run), [])
+        store = BaselineStore(self.store_directory, 'last', 'run00')
+        list(store.stage([], self.target, 'CL'))
+        store.prune()
+        runs = store.runs()
+        self.assertEqual(BaselineStore.MAX_RUNS, len(runs))
+        self.assertIn('run00', runs)
+        self.assertIn('last', runs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+""" This test module is created by Martin Vasko.
+    Batch analyses targets of manifest in one process. Targets with the same
+    content are analysed only once, base images and result cache are shared
+    by all targets and record of every target is written as JSON Lines.
+"""
+
+import asyncio
+import io
+import json
+import pathlib
+import tempfile
+import unittest
+from secpo.baseline import BaselineStore
+from secpo.batch import BatchRunner, BatchTarget
+from secpo.docker_backend import DockerBackend
+from secpo.path_operation import PathOperation
+from secpo.result_cache import ResultCache
+from secpo.run_facade import RunFacade, SharedSubsystems
+from tests.unit.source_discovery import command_line_args
+
+CPPCHECK = """<?xml version="1.0" encoding="UTF-8"?>
+<results version="2"><cppcheck version="1.90"/><errors>{errors}</errors>
+</results>
+"""
+ERROR = """<error id="nullPointer" severity="error" msg="Null pointer"
+       verbose="Null pointer dereference">
+    <location file="{file}" line="3" column="1"/>
+</error>"""
+
+
+class MockBackend(DockerBackend):
+    def __init__(self):
+        """ Initialize """
+        self.images = set()
+        self.base_builds = []
+        self.contexts = {}
+        self.removed = []
+
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        if dockerfile.startswith(PathOperation.BASE_DOCKERFILE):
+            self.base_builds.append(tag)
+            self.images.add(tag)
+        else:
+            self.contexts[tag] = [name for name, _ in context.names()]
+        return '', True
+
+    async def create(self, name, image):
+        return True
+
+    async def start(self, name, image, command):
+        return True
+
+    async def execute(self, container, command):
+        return True
+
+    async def put_archive(self, container, destination, context):
+        return True
+
+    async def copy_from(self, container, source, destination):
+        # Analysis reports every C file of build context of container
+        errors = ''.join(ERROR.format(file=name)
+                         for name in self.contexts[container]
+                         if name.endswith('.c'))
+        (destination / 'result.xml').write_text(CPPCHECK.format(
+                errors=errors))
+        return True
+
+    async def disconnect(self, network, container):
+        return True
+
+    async def remove(self, container):
+        self.removed.append(container)
+        return True
+
+    async def remove_image(self, tag):
+        self.images.discard(tag)
+        return True
+
+    async def prune(self, prune_type):
+        return True
+
+    async def image_exists(self, tag):
+        return tag in self.images
+
+
+class BatchAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        for name, text in [('a/main.c', 'int main() { return 0; }\n'),
+                           ('b/main.c', 'int main() { return 0; }\n'),
+                           ('c/io.c', 'int io() { return 1; }\n'),
+                           ('c/deploy.sh', 'echo deploy\n')]:
+            file = self.root / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text(text)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_batch(self, manifest, destroy_images=False):
+        args = command_line_args([])
+        args.destroy_images = destroy_images
+        shared = SharedSubsystems(args)
+        shared.run_subsystem.backend = MockBackend()
+        shared.result_cache = ResultCache(self.root / 'cache')
+        shared.baseline = BaselineStore(self.root / 'baselines')
+        output = io.StringIO()
+        runner = BatchRunner(args, shared, RunFacade, output)
+
+        async def run():
+            try:
+                return await runner.run(io.StringIO(manifest))
+            finally:
+                await shared.close()
+
+        succeeded = asyncio.run(run())
+        records = [json.loads(line) for line
+                   in output.getvalue().splitlines()]
+        return succeeded, {record['id']: record for record in records}, \
+            shared.run_subsystem.backend
+
+    def test_parse_targets(self):
+        target = BatchTarget.parse(
+                '{"id": "app", "path": "app", "languages": ["cl"], '
+                '"options": {"merge-groups": true, "shards": 2}}', 1)
+        self.assertIsNone(target.error)
+        self.assertEqual(['CL'], target.languages)
+        self.assertEqual({'merge_groups': True, 'shards': 2}, target.options)
+        self.assertEqual(1, BatchTarget.parse('{"path": "app"}', 1).id)
+        for line in ['{"path": ', '[]', '{"id": 2}',
+                     '{"path": "app", "options": {"jobs": 4}}',
+                     '{"path": "app", "options": {"shards": "2"}}',
+                     '{"path": "app", "languages": "cl"}']:
+            self.assertIsNotNone(BatchTarget.parse(line, 1).error, line)
+
+    def test_batch(self):
+        manifest = '\n'.join(json.dumps(target) for target in [
+                {'id': 'a', 'path': str(self.root / 'a')},
+                {'id': 'b', 'path': str(self.root / 'b')},
+                {'id': 'c', 'path': str(self.root / 'c'),
+                 'languages': ['cl']},
+                {'id': 'missing', 'path': str(self.root / 'missing')},
+                {'id': 'unknown', 'path': str(self.root / 'c'),
+                 'languages': ['cobol']}]) + '\n\n{"path"\n'
+        succeeded, records, backend = self.run_batch(manifest)
+        self.assertFalse(succeeded)
+        self.assertEqual([7, 'a', 'b', 'c', 'missing', 'unknown'],
+                         sorted(records, key=str))
+        # Identical targets are analysed only once
+        first, second = sorted([records['a'], records['b']],
+                               key=lambda record: 'duplicate_of' in record)
+        self.assertEqual(first['id'], second['duplicate_of'])
+        self.assertEqual(first['digest'], second['digest'])
+        self.assertEqual('done', second['state'])
+        self.assertNotIn('findings', second)
+        self.assertEqual([('.', 'main.c')],
+                         [(finding['target'], finding['file'])
+                          for finding in first['findings']])
+        # Only chosen languages of target are analysed
+        self.assertEqual({'CL': 'done'}, records['c']['targets'])
+        self.assertEqual(['io.c'], [finding['file'] for finding
+                                    in records['c']['findings']])
+        for identifier in ['missing', 'unknown', 7]:
+            self.assertEqual('error', records[identifier]['state'])
+        # Base image is shared and images of targets do not clash
+        self.assertEqual(1, len(backend.base_builds))
+        self.assertEqual(2, len(set(backend.contexts)
+                                - set(backend.base_builds)))
+        self.assertFalse(any((self.root / name / PathOperation.DOCKERFILE)
+                             .exists() for name in ['a', 'b', 'c']))
+        # Containers of targets are removed right after the target
+        self.assertEqual(sorted(backend.contexts), sorted(backend.removed))
+        self.assertEqual(set(backend.base_builds), backend.images)
+        # Next batch is served from shared result cache
+        succeeded, records, backend = self.run_batch(
+                json.dumps({'id': 'a', 'path': str(self.root / 'a')}))
+        self.assertTrue(succeeded)
+        self.assertEqual('cached', records['a']['state'])
+        self.assertEqual(1, len(records['a']['findings']))
+        self.assertEqual({}, backend.contexts)
+        # Base images are removed at the end when requested
+        _, records, backend = self.run_batch(json.dumps(
+                {'id': 'c', 'path': str(self.root / 'c'),
+                 'options': {'no_cache': True}}), destroy_images=True)
+        self.assertEqual('done', records['c']['state'])
+        self.assertEqual(2, len(backend.base_builds))
+        self.assertEqual(set(), backend.images)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+""" This test module is created by Martin Vasko.
+    Build context contains only analysed files, project manifests and
+    generated files, honours .secpoignore and is streamed to docker build
+    and to warm containers.
+"""
+
+import asyncio
+import pathlib
+import sys
+import tempfile
+import unittest
+from secpo.build_context import BuildContext, IgnoreRules
+from secpo.container_pool import ContainerPool
+from secpo.docker_backend import CliBackend
+from secpo.docker_configuration import ConfigCreator
+from secpo.path_operation import PathOperation
+from tests.unit.source_discovery import command_line_args
+
+# Fake docker client that lists archive read from standard input
+LIST_CONTEXT = ('import sys, tarfile\n'
+                'with tarfile.open(fileobj=sys.stdin.buffer, mode="r|") as t:\n'
+                '    print("Step 1/1 : " + ",".join(sorted(m.name for m in t)))\n'
+                'print("Successfully tagged python0")\n')
+# Fake docker client that writes names of extracted archive to file
+PUT_CONTEXT = ('import sys, tarfile\n'
+               'with tarfile.open(fileobj=sys.stdin.buffer, mode="r|") as t:\n'
+               '    names = sorted(m.name for m in t)\n'
+               'open(sys.argv[1], "w").write(",".join(names))\n')
+
+
+class MockCliBackend(CliBackend):
+    DOCKER_BUILD = [sys.executable, '-c', LIST_CONTEXT, '-t']
+    DOCKER_PUT = [sys.executable, '-c', PUT_CONTEXT, '{dst}']
+
+    def __init__(self):
+        """ Initialize """
+        super(MockCliBackend, self).__init__()
+        self.commands = []
+
+    async def start(self, name, image, command):
+        return True
+
+    async def execute(self, container, command):
+        self.commands.append(command)
+        return True
+
+    async def copy_from(self, container, source, destination):
+        return True
+
+    async def remove(self, container):
+        return True
+
+
+class BuildContexts(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        for name in ['main.py', 'lib/util.py', 'generated_api.py',
+                     'tests/test_main.py', 'pyproject.toml', 'disk.vmdk',
+                     '.vagrant/machines/box.py', 'vagrant_result/out.py']:
+            file = self.root / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text('')
+        (self.root / BuildContext.IGNORE_FILE).write_text(
+                '# generated code\ngenerated_*.py\n/tests/\n')
+        self.path_conf = PathOperation(command_line_args([str(self.root)]))
+        self.path_conf.resolve_containers()
+        self.path_conf.create_configuration_files()
+        self.path_conf.write_configuration(
+                ConfigCreator(self.path_conf).create_configuration())
+        self.path = self.path_conf.path_components['PYTHON'][0]
+        self.context = BuildContext.from_path(self.path_conf, self.path)
+
+    def tearDown(self):
+        self.path_conf.delete_configurations()
+        self.directory.cleanup()
+
+    def test_filtered_context(self):
+        self.assertEqual([name for name, _ in self.context.names()],
+                         ['Dockerfile', 'Dockerfile.base', 'lib/util.py',
+                          'main.py', 'pyproject.toml', 'requirements.txt'])
+
+    def test_ignored_files_not_analysed(self):
+        # Analysers get only files that are part of build context
+        self.assertEqual(['lib/util.py', 'main.py'], sorted(
+                file.relative_to(self.path).as_posix()
+                for file in self.path_conf.analysed_files(self.path)))
+        dockerfile = (self.path / PathOperation.DOCKERFILE).read_text()
+        self.assertIn('bandit.html  main.py lib/util.py', dockerfile)
+        self.assertNotIn('generated_api.py', dockerfile)
+        self.assertNotIn('test_main.py', dockerfile)
+
+    def test_ignore_rules(self):
+        rules = IgnoreRules(['build/', '/docs', '*.log', '!keep.log'])
+        self.assertTrue(rules.ignored('build/out.py'))
+        self.assertFalse(rules.ignored('build'))
+        self.assertTrue(rules.ignored('docs/index.py'))
+        self.assertFalse(rules.ignored('src/docs/index.py'))
+        self.assertTrue(rules.ignored('src/debug.log'))
+        self.assertFalse(rules.ignored('keep.log'))
+
+    def test_streamed_to_build(self):
+        events = []
+        last_line, success = asyncio.run(MockCliBackend().build(
+                self.path, 'python0', on_event=events.append,
+                context=self.context))
+        self.assertTrue(success)
+        self.assertEqual(events[0].text, 'Step 1/1 : Dockerfile,'
+                         'Dockerfile.base,lib/util.py,main.py,pyproject.toml,'
+                         'requirements.txt')
+        self.assertEqual(last_line, 'Successfully tagged python0')
+
+    def test_streamed_to_container(self):
+        backend = MockCliBackend()
+        listing = self.root / 'listing.txt'
+
+        async def run():
+            pool = ContainerPool(backend=backend)
+            # Extracted names are written to run directory of container
+            pool.RUN_DIR = str(listing)
+            try:
+                return await pool.run('secpo-base-python:0', self.context,
+                                      '/usr/src/app', ['bandit -r .'],
+                                      self.root / 'out')
+            finally:
+                await pool.close()
+
+        self.assertTrue(asyncio.run(run()))
+        # Vagrant state, old results and ignored files stay on host
+        self.assertEqual(listing.read_text(), 'Dockerfile,Dockerfile.base,'
+                         'lib/util.py,main.py,pyproject.toml,'
+                         'requirements.txt')
+        self.assertEqual(backend.commands[1],
+                         'cd {} && (bandit -r .)'.format(listing))
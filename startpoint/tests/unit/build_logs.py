@@ -0,0 +1,73 @@
+""" This test module is created by Martin Vasko.
+    Output of docker build is parsed line by line into events while both
+    pipes are read at the same time and memory of log stays bounded.
+"""
+
+import asyncio
+import sys
+import unittest
+from secpo.build_log import BuildLog
+
+CLASSIC_BUILD = [
+    'Step 1/3 : FROM secpo-base-python:0123456789ab',
+    ' ---> 0123456789ab',
+    'Step 2/3 : COPY . .',
+    ' ---> 1123456789ab',
+    'Step 3/3 : RUN bandit -r .',
+    "The command '/bin/sh -c bandit -r .' returned a non-zero code: 1",
+]
+BUILDKIT_BUILD = [
+    '#5 [1/2] FROM docker.io/library/python:3.8',
+    '#5 DONE 0.1s',
+    '#6 [2/2] COPY . .',
+    '#6 CACHED',
+    '#7 naming to docker.io/library/python0 done',
+]
+
+
+class BuildLogs(unittest.TestCase):
+    def parse(self, lines):
+        events = []
+        build_log = BuildLog(events.append, echo=False)
+        for line in lines:
+            build_log.feed(line)
+        return build_log, [(event.kind, event.step) for event in events]
+
+    def test_classic_builder(self):
+        build_log, events = self.parse(CLASSIC_BUILD)
+        self.assertEqual(events, [(BuildLog.STEP_STARTED, '1/3'),
+                                  (BuildLog.STEP_DONE, '1/3'),
+                                  (BuildLog.STEP_STARTED, '2/3'),
+                                  (BuildLog.STEP_DONE, '2/3'),
+                                  (BuildLog.STEP_STARTED, '3/3'),
+                                  (BuildLog.ERROR, '3/3')])
+        self.assertFalse(build_log.succeeded)
+
+    def test_buildkit(self):
+        build_log, events = self.parse(BUILDKIT_BUILD)
+        self.assertEqual([event[0] for event in events],
+                         [BuildLog.STEP_STARTED, BuildLog.STEP_DONE,
+                          BuildLog.STEP_STARTED, BuildLog.STEP_DONE,
+                          BuildLog.SUCCESS])
+        self.assertTrue(build_log.succeeded)
+
+    def test_concurrent_pipes_and_bounded_tail(self):
+        # Enough stderr output to fill pipe before stdout is written
+        script = ('import sys\n'
+                  'sys.stderr.write("warning\\n" * 100000)\n'
+                  'sys.stdout.write("x" * 200000 + "\\n")\n'
+                  'sys.stdout.write("Successfully tagged python0\\n")\n')
+
+        async def scenario(build_log):
+            process = await asyncio.create_subprocess_exec(
+                    sys.executable, '-c', script,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE)
+            return await asyncio.wait_for(build_log.follow(process), 30)
+
+        build_log = BuildLog(echo=False, tail_length=10)
+        self.assertTrue(asyncio.run(scenario(build_log)))
+        self.assertTrue(build_log.succeeded)
+        self.assertEqual(len(build_log.tail), 10)
+        self.assertLessEqual(max(len(line) for line in build_log.tail),
+                             BuildLog.MAX_LINE_LENGTH)
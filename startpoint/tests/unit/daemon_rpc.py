@@ -0,0 +1,88 @@
+""" This test module is created by Martin Vasko.
+    Daemon serves runs submitted over Unix socket. Findings and results of
+    targets are streamed back to client and subsystems of daemon are kept
+    alive between runs. Failed run ends with error event.
+"""
+
+import asyncio
+import pathlib
+import tempfile
+import unittest
+from secpo.baseline import BaselineStore
+from secpo.daemon import DaemonClient, SecpoDaemon
+from secpo.result_cache import ResultCache
+from secpo.run_facade import RunFacade, SharedSubsystems
+from tests.unit.batch_analysis import MockBackend
+from tests.unit.source_discovery import command_line_args
+
+
+class DaemonRpcTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        for name in ['app/main.c', 'app/lib/util.c']:
+            file = self.root / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text('int main() { return 0; }\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_runs_share_daemon(self):
+        args = command_line_args([])
+        shared = SharedSubsystems(args)
+        shared.run_subsystem.backend = MockBackend()
+        shared.result_cache = ResultCache(self.root / 'cache')
+        shared.baseline = BaselineStore(self.root / 'baselines')
+        socket = self.root / 'secpod.sock'
+        daemon = SecpoDaemon(args, shared, RunFacade, socket)
+        client = DaemonClient(socket)
+        request = {'method': SecpoDaemon.ANALYSE,
+                   'targets': [{'path': str(self.root / 'app')}]}
+
+        async def collect(request):
+            return [event async for event in client.request(request)]
+
+        async def run():
+            daemon.ready = asyncio.Event()
+            serving = asyncio.ensure_future(daemon.serve())
+            await daemon.ready.wait()
+            runs = [await collect(request), await collect(request),
+                    await collect({'method': 'unknown'}),
+                    await collect({'method': SecpoDaemon.ANALYSE,
+                                   'targets': 5}),
+                    await collect({'method': SecpoDaemon.PING})]
+            stopping = await collect({'method': SecpoDaemon.SHUTDOWN})
+            await serving
+            return runs, stopping
+
+        runs, stopping = asyncio.run(run())
+        first, second, unknown, failed, pong = runs
+        # Findings and progress are streamed before record of target
+        self.assertEqual(['finding', 'finding', 'progress', 'target',
+                          'finished'], [event['event'] for event in first])
+        self.assertEqual(['lib/util.c', 'main.c'],
+                         sorted(event['finding']['file']
+                                for event in first[:2]))
+        self.assertEqual({'pipeline': 'docker', 'target': 'cl',
+                          'state': 'done', 'finished': 1, 'total': 1},
+                         first[2]['progress'])
+        self.assertEqual('done', first[3]['record']['state'])
+        self.assertNotIn('findings', first[3]['record'])
+        self.assertEqual(0, first[-1]['status'])
+        # Result cache of daemon serves second run
+        self.assertEqual('cached', second[-2]['record']['state'])
+        self.assertEqual(2, len([event for event in second
+                                 if event['event'] == 'finding']))
+        self.assertEqual(1, len(shared.run_subsystem.backend.base_builds))
+        self.assertEqual('error', unknown[0]['event'])
+        # Connection survives failed run
+        self.assertEqual(['error'], [event['event'] for event in failed])
+        self.assertIn('failed', failed[0]['message'])
+        self.assertEqual(3, pong[0]['runs'])
+        self.assertEqual([{'event': 'stopping'}], stopping)
+        self.assertFalse(socket.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
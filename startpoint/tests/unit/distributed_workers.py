@@ -0,0 +1,276 @@
+""" This test module is created by Martin Vasko.
+    Coordinator queue distributes jobs to workers on more docker hosts.
+    Workers with warm base image of job are preferred and result artifacts
+    are sent back to coordinator, which processes them like results of
+    local containers.
+"""
+
+import asyncio
+import pathlib
+import tempfile
+import time
+import unittest
+import urllib.error
+from secpo.analyser_registry import REGISTRY
+from secpo.distributed import CoordinatorServer, HttpTransport, JobQueue, \
+    LocalTransport, Worker, create_job, pack_artifacts, unpack_artifacts
+from secpo.docker_backend import CliBackend
+from secpo.docker_configuration import ConfigCreator
+from secpo.path_operation import PathOperation
+from secpo.result_cache import ResultCache
+from secpo.result_retriever import ResultRetriever
+from secpo.virtual_starter import VirtualStarter
+from tests.unit.result_caching import MockConfigCreator
+from tests.unit.source_discovery import command_line_args
+
+ERROR = """<error id="nullPointer" severity="error" msg="Null pointer"
+       verbose="Null pointer dereference">
+    <location file="{file}" line="3" column="1"/>
+</error>"""
+CPPCHECK = """<?xml version="1.0" encoding="UTF-8"?>
+<results version="2"><cppcheck version="1.90"/><errors>{errors}</errors>
+</results>
+"""
+
+
+class MockBackend(CliBackend):
+    def __init__(self, images=None):
+        """ Initialize """
+        super(MockBackend, self).__init__()
+        self.images = set(images or [])
+        self.base_builds = []
+        self.contexts = {}
+        self.removed_images = []
+
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        if dockerfile == PathOperation.BASE_DOCKERFILE:
+            self.base_builds.append(tag)
+            self.images.add(tag)
+        else:
+            self.contexts[tag] = [name for name, _ in context.names()]
+        return '', True
+
+    async def image_exists(self, tag):
+        return tag in self.images
+
+    async def create(self, name, image):
+        return True
+
+    async def remove(self, container):
+        return True
+
+    async def remove_image(self, tag):
+        self.removed_images.append(tag)
+        return True
+
+    async def copy_from(self, container, source, destination):
+        # Analysis reports every C file of build context of container
+        errors = ''.join(ERROR.format(file=name)
+                         for name in self.contexts[container]
+                         if name.endswith('.c'))
+        (destination / 'result.xml').write_text(CPPCHECK.format(
+                errors=errors))
+        # Other files of results directory are not sent to coordinator
+        (destination / 'build.log').write_text('')
+        return True
+
+
+class FlakyTransport(LocalTransport):
+    """
+    Transport that loses first call of every method.
+    """
+    def __init__(self, queue):
+        """ Initialize """
+        super(FlakyTransport, self).__init__(queue)
+        self.failed = set()
+
+    async def call(self, method, payload):
+        if method != 'lease' and method not in self.failed:
+            self.failed.add(method)
+            raise urllib.error.URLError('connection refused')
+        return await super(FlakyTransport, self).call(method, payload)
+
+
+def job(base_tag):
+    return {'key': 'CL', 'base_tag': base_tag, 'results': '/secpo/results',
+            'context': '', 'dockerfile': 'Dockerfile',
+            'base_dockerfile': 'Dockerfile.base'}
+
+
+class DistributedWorkersTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_scheduling(self):
+        queue = JobQueue()
+        queue.register('warm', 1, ['base-cl'])
+        queue.register('cold', 2)
+        queue.submit(job('base-cl'))
+        queue.submit(job('base-sh'))
+        # Job of warm base image is left to warm worker
+        self.assertEqual('base-sh',
+                         queue.lease('cold', timeout=0)['job']['base_tag'])
+        self.assertIsNone(queue.lease('cold', timeout=0)['job'])
+        self.assertEqual('base-cl',
+                         queue.lease('warm', timeout=0)['job']['base_tag'])
+        second = queue.submit(job('base-cl'))
+        # Warm worker is full, so cold worker takes job
+        leased = queue.lease('cold', timeout=0)['job']
+        self.assertEqual('base-cl', leased['base_tag'])
+        self.assertIsNone(queue.lease('cold', timeout=0)['job'])
+        queue.complete('cold', leased['id'], True, ['base-cl'], 'archive')
+        self.assertEqual({'success': True, 'artifacts': 'archive'},
+                         second.result(0))
+        queue.close()
+        self.assertTrue(queue.lease('cold', timeout=0)['stop'])
+
+    def test_silent_worker_jobs_requeued(self):
+        queue = JobQueue(worker_timeout=0.05)
+        queue.register('lost', 1)
+        future = queue.submit(job('base-cl'))
+        leased = queue.lease('lost', timeout=0)['job']
+        time.sleep(0.1)
+        queue.register('alive', 1)
+        self.assertEqual(leased['id'],
+                         queue.lease('alive', timeout=0)['job']['id'])
+        self.assertFalse(queue.complete('lost', leased['id'], True)
+                         ['accepted'])
+        queue.complete('alive', leased['id'], True)
+        self.assertTrue(future.result(0)['success'])
+
+    def test_http_transport(self):
+        queue = JobQueue()
+        server = CoordinatorServer(queue, '127.0.0.1')
+        server.start()
+        try:
+            transport = HttpTransport(server.url)
+            queue.submit(job('base-cl'))
+            response = asyncio.run(transport.call(
+                    'register', {'worker': 'remote', 'capacity': 1}))
+            self.assertEqual({'registered': 'remote'}, response)
+            response = asyncio.run(transport.call(
+                    'lease', {'worker': 'remote', 'timeout': 0}))
+            self.assertEqual('base-cl', response['job']['base_tag'])
+        finally:
+            server.close()
+
+    def test_coordinator_token(self):
+        with self.assertRaises(ValueError):
+            CoordinatorServer(JobQueue(), '0.0.0.0')
+        queue = JobQueue()
+        server = CoordinatorServer(queue, '0.0.0.0', token='secret')
+        server.start()
+        try:
+            url = server.url
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                asyncio.run(HttpTransport(url).call(
+                        'register', {'worker': 'remote'}))
+            self.assertEqual(403, raised.exception.code)
+            response = asyncio.run(HttpTransport(url, 'secret').call(
+                    'register', {'worker': 'remote'}))
+            self.assertEqual({'registered': 'remote'}, response)
+        finally:
+            server.close()
+
+    def test_failed_job_reported(self):
+        queue = JobQueue()
+        starter = VirtualStarter({})
+        starter.backend = MockBackend()
+        worker = Worker(FlakyTransport(queue), 'flaky', 1, starter)
+        worker.RETRY = 0
+        broken = queue.submit(dict(job('base-cl'), context='not an archive'))
+
+        async def run():
+            running = asyncio.ensure_future(worker.run())
+            finished = await asyncio.wrap_future(broken)
+            queue.close()
+            await running
+            return finished
+
+        # Broken job fails alone and lost calls are repeated
+        self.assertFalse(asyncio.run(run())['success'])
+        self.assertEqual(1, worker.completed)
+        self.assertEqual({'register', 'complete'}, worker.transport.failed)
+
+    def test_workers_end_to_end(self):
+        for name in ['a/main.c', 'a/util.c', 'b/lib.c', 'c/io.c']:
+            file = self.root / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text('int main() { return 0; }\n')
+        path_conf = PathOperation(command_line_args([str(self.root)]))
+        path_conf.resolve_containers()
+        path_conf.create_configuration_files()
+        config_creator = ConfigCreator(path_conf)
+        path_conf.write_configuration(config_creator.create_configuration())
+        base_tag = config_creator.base_images['CL']
+        queue = JobQueue()
+        workers = []
+        for name, capacity, images in [('warm', 1, [base_tag]),
+                                       ('cold', 2, [])]:
+            starter = VirtualStarter({})
+            starter.backend = MockBackend(images)
+            workers.append(Worker(LocalTransport(queue), name, capacity,
+                                  starter))
+        keys = sorted(path_conf.path_components)
+        self.assertEqual(['CL', 'CL_1', 'CL_2'], keys)
+
+        async def run():
+            running = [asyncio.ensure_future(worker.run())
+                       for worker in workers]
+            futures = [queue.submit(create_job(
+                    path_conf, path_conf.path_components[key][0], key,
+                    base_tag, ResultRetriever.artifacts_directory(key)))
+                    for key in keys]
+            finished = await asyncio.gather(*[asyncio.wrap_future(future)
+                                              for future in futures])
+            queue.close()
+            await asyncio.gather(*running)
+            return finished
+
+        finished = asyncio.run(run())
+        path_conf.delete_configurations()
+        self.assertTrue(all(result['success'] for result in finished))
+        directories = [self.root / 'results' / key for key in keys]
+        for result, directory in zip(finished, directories):
+            unpack_artifacts(result['artifacts'], directory)
+        self.assertEqual([['result.xml']] * 3,
+                         [[file.name for file in directory.iterdir()]
+                          for directory in directories])
+        self.assertEqual([['main.c', 'util.c'], ['lib.c'], ['io.c']],
+                         [sorted(finding.file for finding
+                                 in REGISTRY.parse_results('CL', directory))
+                          for directory in directories])
+        self.assertEqual(3, sum(worker.completed for worker in workers))
+        # Warm worker never builds base image it already has
+        self.assertEqual([], workers[0].starter.backend.base_builds)
+        # Images of jobs are removed together with their containers
+        self.assertEqual(3, sum(len(worker.starter.backend.removed_images)
+                                for worker in workers))
+
+    def test_artifacts_collected_by_coordinator(self):
+        results = self.root / 'worker'
+        results.mkdir()
+        (results / 'result.xml').write_text(CPPCHECK.format(
+                errors=ERROR.format(file='main.c')))
+        artifacts = pack_artifacts(results, [results / 'result.xml'])
+        # Coordinator stores artifacts in cache like local results
+        cache = ResultCache(self.root / 'cache')
+        retriever = ResultRetriever(result_cache=cache)
+        retriever.config_creator = MockConfigCreator()
+        path = self.root / 'target'
+        unpack_artifacts(artifacts, retriever.result_directory(path, 'CL'))
+        retriever.collect_results(path, 'CL', 'k')
+        restored = cache.restore('k', self.root / 'restored')
+        self.assertEqual(['result.xml'], [file.name for file in restored])
+        self.assertEqual(['main.c'], [finding.file for finding in
+                                      REGISTRY.parse_results(
+                                              'CL', self.root / 'restored')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+""" This test module is created by Martin Vasko.
+    Generated Dockerfiles install toolchain inside analyser base image and
+    copy sources only right before analysis commands. Failed build of base
+    image is retried by next request.
+"""
+
+import asyncio
+import pathlib
+import tempfile
+import unittest
+from secpo.docker_configuration import ConfigCreator, \
+    DirectoryToImageAndTools
+from secpo.image_registry import BaseImageRegistry
+from secpo.path_operation import PathOperation
+from tests.unit.source_discovery import command_line_args
+
+
+class FailingImageRegistry(BaseImageRegistry):
+    def __init__(self, outcomes):
+        """ Initialize """
+        super(FailingImageRegistry, self).__init__(None)
+        self.outcomes = outcomes
+        self.builds = 0
+
+    async def _ensure(self, tag, path, recipe, toolset, dockerfile):
+        outcome = self.outcomes[self.builds]
+        self.builds += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class DockerfileLayers(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        for name in ['py/main.py', 'php/index.php']:
+            file = self.root / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text('')
+        self.path_conf = PathOperation(command_line_args([str(self.root)]))
+        self.path_conf.resolve_containers()
+        self.path_conf.create_configuration_files()
+        self.config_creator = ConfigCreator(self.path_conf)
+        self.path_conf.write_configuration(
+                self.config_creator.create_configuration())
+
+    def tearDown(self):
+        self.path_conf.delete_configurations()
+        self.directory.cleanup()
+
+    def read(self, key, name):
+        path = self.path_conf.path_components[key][0]
+        return (path / name).read_text()
+
+    def test_base_image_contains_toolchain(self):
+        recipe = self.read('PYTHON', PathOperation.BASE_DOCKERFILE)
+        self.assertIn('pip install bandit', recipe)
+        self.assertNotIn('COPY . .', recipe)
+        self.assertNotIn('bandit -f html', recipe)
+
+    def test_sources_copied_before_analysis(self):
+        dockerfile = self.read('PHP', PathOperation.DOCKERFILE)
+        self.assertTrue(dockerfile.startswith(
+                'FROM ' + self.config_creator.base_images['PHP']))
+        self.assertLess(dockerfile.index('COPY . .'),
+                        dockerfile.index('phpstan analyse'))
+        self.assertNotIn('composer install', dockerfile)
+
+    def test_result_artifacts_collected(self):
+        dockerfile = self.read('PYTHON', PathOperation.DOCKERFILE)
+        collect = dockerfile.strip().splitlines()[-1]
+        self.assertTrue(collect.startswith('RUN rm -rf /secpo/results'))
+        self.assertIn('bandit.html bandit2.html', collect)
+        self.assertLess(dockerfile.index('bandit -f html'),
+                        dockerfile.index(collect))
+
+    def test_base_image_tag(self):
+        tag = self.config_creator.base_images['PYTHON']
+        self.assertRegex(tag, r'^secpo-base-python:[0-9a-f]{12}$')
+        self.assertNotEqual(tag, self.config_creator.base_images['PHP'])
+
+    def test_registry_recipe_matches_configuration(self):
+        registry = BaseImageRegistry(None)
+        tag, recipe, _ = registry.recipe('PYTHON')
+        self.assertEqual(tag, self.config_creator.base_images['PYTHON'])
+        self.assertEqual(str(recipe),
+                         self.read('PYTHON', PathOperation.BASE_DOCKERFILE))
+        self.assertNotIn('CS', registry.recipes(['CS']))
+
+    def test_recipes_do_not_copy_sources(self):
+        # Context of base image contains only recipe and package files
+        _, recipe, _ = BaseImageRegistry(None).recipe('JAVA')
+        self.assertIn('RUN gradle init', str(recipe))
+        self.assertNotIn('COPY', str(recipe))
+        for language in [DirectoryToImageAndTools.JAVA,
+                         DirectoryToImageAndTools.KOTLIN]:
+            self.assertFalse([command for command
+                              in language.value['other']
+                              if command.startswith('COPY')])
+            self.assertIn('COPY build.gradle .',
+                          language.value['analysis'])
+
+    def test_failed_base_image_retried(self):
+        async def ensure(registry):
+            try:
+                return await registry.ensure('secpo-base-python:0')
+            except OSError:
+                return None
+
+        registry = FailingImageRegistry([OSError('daemon'), False, True])
+        self.assertIsNone(asyncio.run(ensure(registry)))
+        self.assertEqual(registry.tags(), [])
+        self.assertFalse(asyncio.run(ensure(registry)))
+        self.assertTrue(asyncio.run(ensure(registry)))
+        # Built image is not built again
+        self.assertTrue(asyncio.run(ensure(registry)))
+        self.assertEqual(registry.builds, 3)
+        self.assertEqual(registry.tags(), ['secpo-base-python:0'])
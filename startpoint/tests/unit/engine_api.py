@@ -0,0 +1,158 @@
+""" This test module is created by Martin Vasko.
+    Engine API backend streams build context, parses JSON progress of build,
+    copies results by archive endpoint and reuses pooled connections. Backend
+    talks to fake docker daemon listening on local Unix socket.
+"""
+
+import asyncio
+from http.server import BaseHTTPRequestHandler
+import io
+import json
+import os
+import pathlib
+import socketserver
+import tarfile
+import tempfile
+import threading
+import unittest
+from secpo.build_log import BuildLog
+from secpo.docker_backend import CliBackend, EngineApiBackend, create_backend
+
+
+class FakeDaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super(FakeDaemonHandler, self).setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _respond(self, status, body=b'', content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self._body()
+        self.server.requests.append((self.path, body))
+        if self.path.startswith('/build'):
+            with tarfile.open(fileobj=io.BytesIO(body)) as archive:
+                self.server.context = sorted(archive.getnames())
+            messages = [{'stream': 'Step 1/2 : FROM python\n'},
+                        {'stream': ' ---> 0123456789ab\n'},
+                        {'stream': 'Step 2/2 : COPY . .\n'}]
+            if 'broken' in self.path:
+                messages.append({'error': 'COPY failed: no source files',
+                                 'errorDetail': {}})
+            else:
+                messages.append({'stream': 'Successfully tagged python0\n'})
+            self._respond(200, b''.join(json.dumps(message).encode() + b'\r\n'
+                                        for message in messages))
+        elif self.path.startswith('/containers/create'):
+            self._respond(201, b'{"Id": "1"}')
+        else:
+            self._respond(200, b'{}')
+
+    def do_GET(self):
+        self.server.requests.append((self.path, b''))
+        if '/archive' in self.path:
+            archive = io.BytesIO()
+            with tarfile.open(fileobj=archive, mode='w') as tar:
+                for name, content in [('python/result.txt', b'finding'),
+                                      ('../escape.txt', b'bad')]:
+                    info = tarfile.TarInfo(name)
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+            self._respond(200, archive.getvalue(), 'application/x-tar')
+        else:
+            self._respond(404, b'{"message": "No such image"}')
+
+
+class FakeDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        socketserver.UnixStreamServer.__init__(self, path, FakeDaemonHandler)
+        self.connections = 0
+        self.requests = []
+        self.context = []
+
+
+class EngineApi(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        self.socket_path = str(self.root / 'docker.sock')
+        self.daemon = FakeDaemon(self.socket_path)
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        self.backend = EngineApiBackend(self.socket_path)
+
+    def tearDown(self):
+        self.backend.kill_processes()
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        self.thread.join()
+        self.directory.cleanup()
+
+    def test_build(self):
+        context = self.root / 'python'
+        context.mkdir()
+        (context / 'Dockerfile').write_text('FROM python\nCOPY . .\n')
+        (context / 'main.py').write_text('')
+        events = []
+        last_line, success = asyncio.run(self.backend.build(
+                context, 'python0', on_event=lambda event:
+                events.append(event.kind)))
+        self.assertTrue(success)
+        self.assertEqual(last_line, 'Successfully tagged python0')
+        self.assertEqual(self.daemon.context, ['Dockerfile', 'main.py'])
+        self.assertEqual(events, [BuildLog.STEP_STARTED, BuildLog.STEP_DONE,
+                                  BuildLog.STEP_STARTED, BuildLog.SUCCESS])
+        _, success = asyncio.run(self.backend.build(context, 'broken0'))
+        self.assertFalse(success)
+
+    def test_copy_results_and_pooled_connection(self):
+        destination = self.root / 'results'
+        destination.mkdir()
+
+        async def scenario():
+            await self.backend.disconnect('bridge', 'python0')
+            copied = await self.backend.copy_from('python0', '/usr/src/python',
+                                                  destination)
+            exists = await self.backend.image_exists('missing')
+            created = await self.backend.create('python0', 'python0')
+            # Content of directory without directory itself
+            await self.backend.copy_from('python0', '/secpo/results/.',
+                                         destination)
+            return copied, exists, created
+
+        copied, exists, created = asyncio.run(scenario())
+        self.assertTrue(copied)
+        self.assertFalse(exists)
+        self.assertTrue(created)
+        self.assertEqual((destination / 'python' / 'result.txt').read_text(),
+                         'finding')
+        self.assertTrue((destination / 'result.txt').is_file())
+        self.assertFalse((self.root / 'escape.txt').exists())
+        self.assertEqual(self.daemon.requests[0],
+                         ('/networks/bridge/disconnect',
+                          b'{"Container": "python0"}'))
+        # All requests were sent over one kept-alive connection
+        self.assertEqual(self.daemon.connections, 1)
+
+    def test_create_backend(self):
+        self.assertIsInstance(create_backend('auto', self.socket_path),
+                              EngineApiBackend)
+        self.assertIsInstance(create_backend('cli', self.socket_path),
+                              CliBackend)
+        self.assertIsInstance(create_backend(
+                'auto', os.path.join(self.directory.name, 'missing.sock')),
+                CliBackend)
@@ -0,0 +1,83 @@
+""" This test module is created by Martin Vasko.
+    Incremental analysis passes only changed files and their dependents to
+    analyser and merges findings of unchanged files from previous run.
+"""
+
+import pathlib
+import tempfile
+import unittest
+from secpo.incremental_analysis import IncrementalAnalysis
+
+RESULT = """<?xml version="1.0" encoding="UTF-8"?>
+<results version="2">
+    <cppcheck version="1.90"/>
+    <errors>
+{errors}
+    </errors>
+</results>
+"""
+ERROR = '<error id="{rule}" severity="style" msg="m" verbose="v">' \
+        '<location file="{file}" line="1" column="1"/></error>'
+
+
+class IncrementalRuns(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        self.source = self.root / 'app'
+        self.results = self.root / 'results'
+        (self.source / 'lib').mkdir(parents=True)
+        self.results.mkdir()
+        self.write('lib/util.h', 'int util(void);')
+        self.write('main.c', '#include "lib/util.h"\nint main(void);')
+        self.write('other.c', 'int other(void);')
+        self.incremental = IncrementalAnalysis(self.root / 'state')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        (self.source / name).write_text(content)
+
+    def files(self):
+        return sorted(self.source.glob('**/*.[ch]'))
+
+    def run_analysis(self, errors):
+        changed = self.incremental.changed_files(self.source, self.files())
+        (self.results / 'result.xml').write_text(RESULT.format(
+                errors='\n'.join(ERROR.format(rule=rule, file=file)
+                                 for rule, file in errors)))
+        self.assertTrue(self.incremental.merge(self.source, self.results))
+        return changed
+
+    def test_first_run_analyses_everything(self):
+        self.assertIsNone(self.run_analysis([('first', 'other.c')]))
+
+    def test_changed_header_analyses_dependents(self):
+        self.run_analysis([('old', 'main.c'), ('kept', 'other.c')])
+        self.write('lib/util.h', 'long util(void);')
+        changed = self.run_analysis([('new', 'main.c')])
+        self.assertEqual(changed, ['lib/util.h', 'main.c'])
+        result = (self.results / 'result.xml').read_text()
+        self.assertIn('id="new"', result)
+        self.assertIn('id="kept"', result)
+        self.assertNotIn('id="old"', result)
+
+    def test_unchanged_sources(self):
+        self.run_analysis([('kept', 'main.c'), ('kept', 'other.c')])
+        (self.results / 'result.xml').unlink()
+        # Analyser is skipped and stored findings are replayed
+        self.assertEqual([], self.incremental.changed_files(self.source,
+                                                            self.files()))
+        self.assertTrue(self.incremental.merge(self.source, self.results))
+        result = (self.results / 'result.xml').read_text()
+        self.assertIn('<cppcheck version="1.90" />', result)
+        self.assertEqual(2, result.count('id="kept"'))
+
+    def test_state_of_every_key(self):
+        self.run_analysis([('kept', 'main.c')])
+        # Other language of the same directory starts without state
+        self.assertIsNone(self.incremental.changed_files(
+                self.source, self.files(), 'CPP'))
+        self.assertEqual([], self.incremental.changed_files(self.source,
+                                                            self.files()))
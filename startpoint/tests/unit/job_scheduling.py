@@ -0,0 +1,76 @@
+""" This test module is created by Martin Vasko.
+    Scheduler never runs more jobs than its limit, starts new job as soon as
+    slot frees and runs result retrieval right behind the build of job.
+"""
+
+import asyncio
+import unittest
+from secpo.job_scheduler import JobScheduler
+
+
+class JobScheduling(unittest.TestCase):
+    def test_default_jobs(self):
+        self.assertGreaterEqual(JobScheduler.default_jobs(), 1)
+        self.assertEqual(JobScheduler(3).jobs, 3)
+
+    def test_bounded_concurrency(self):
+        running = []
+        maximum = []
+
+        async def build(delay):
+            running.append(delay)
+            maximum.append(len(running))
+            await asyncio.sleep(delay)
+            running.remove(delay)
+            return delay
+
+        async def scenario():
+            scheduler = JobScheduler(2)
+            for delay in [0.01, 0.02, 0.01, 0.03]:
+                scheduler.submit((build, delay))
+            return await scheduler.join()
+
+        self.assertEqual(asyncio.run(scenario()), [0.01, 0.02, 0.01, 0.03])
+        self.assertEqual(max(maximum), 2)
+
+    def test_slot_frees_behind_slow_job(self):
+        events = []
+
+        async def build(name, delay):
+            events.append('start ' + name)
+            await asyncio.sleep(delay)
+            events.append('built ' + name)
+
+        async def retrieve(name):
+            events.append('retrieved ' + name)
+
+        async def scenario():
+            scheduler = JobScheduler(2)
+            for name, delay in [('slow', 0.2), ('fast', 0.01),
+                                ('next', 0.01)]:
+                scheduler.submit((build, name, delay), (retrieve, name))
+            await scheduler.join()
+
+        asyncio.run(scenario())
+        # Results of fast job are retrieved and next job starts while
+        # slow job is still building
+        self.assertLess(events.index('start next'), events.index('built slow'))
+        self.assertEqual(events.index('retrieved fast'),
+                         events.index('built fast') + 1)
+
+    def test_failed_stage_skips_retrieval(self):
+        retrieved = []
+
+        async def build():
+            return False
+
+        async def retrieve():
+            retrieved.append(True)
+
+        async def scenario():
+            scheduler = JobScheduler(1)
+            scheduler.submit((build,), (retrieve,))
+            return await scheduler.join()
+
+        self.assertEqual(asyncio.run(scenario()), [False])
+        self.assertEqual(retrieved, [])
@@ -0,0 +1,140 @@
+""" This test module is created by Martin Vasko.
+    Result artifacts of analysers are parsed into normalized findings that
+    are exported as JSON Lines and SARIF log.
+"""
+
+import io
+import json
+import pathlib
+import tempfile
+import unittest
+from secpo.analyser_registry import REGISTRY
+from secpo.findings import Finding, FindingsExport, read_jsonl, write_jsonl
+from secpo.result_parsers import BanditParser, CppcheckParser, \
+    EslintParser, PhanParser, ReekParser, ShellcheckParser
+
+CPPCHECK = """<?xml version="1.0" encoding="UTF-8"?>
+<results version="2">
+    <cppcheck version="1.90"/>
+    <errors>
+        <error id="nullPointer" severity="error" msg="Null pointer"
+               verbose="Null pointer dereference">
+            <location file="./main.c" line="7" column="3"/>
+        </error>
+        <error id="unusedFunction" severity="style" msg="Unused"
+               verbose="The function is never used.">
+            <location file="lib/util.c" line="2" column="1"/>
+        </error>
+    </errors>
+</results>
+"""
+BANDIT = """<html><head><style>.x {}</style></head><body>
+<div id="results">
+<div id="issue-0">
+<div class="issue-block issue-sev-medium">
+    <b>hardcoded_sql_expressions: </b> Possible SQL injection vector.<br>
+    <b>Test ID:</b> B608<br>
+    <b>Severity: </b>MEDIUM<br>
+    <b>Confidence: </b>LOW<br>
+    <b>File: </b><a href="./app/db.py" target="_blank">./app/db.py</a><br>
+    <b>Line number: </b>12<br>
+    <b>More info: </b><a href="https://bandit.readthedocs.io/">docs</a><br>
+</div></div>
+<div id="issue-1">
+<div class="issue-block issue-sev-high">
+    <b>exec_used: </b> Use of exec detected.<br>
+    <b>Test ID:</b> B102<br>
+    <b>Severity: </b>HIGH<br>
+    <b>File: </b><a href="./main.py">./main.py</a><br>
+    <b>Line number: </b>3<br>
+</div></div></div></body></html>
+"""
+ESLINT = """
+/home/javascript/app/index.js
+  1:5   error    'x' is assigned a value but never used  no-unused-vars
+  3:1   warning  Unexpected console statement           no-console
+
+✖ 2 problems (1 error, 1 warning)
+"""
+PHAN = "index.php:4 PhanUndeclaredVariable Variable $x is undeclared\n"
+SHELLCHECK = """
+In a.sh line 3:
+echo $1
+     ^-- SC2086: Double quote to prevent globbing and word splitting.
+"""
+REEK = """<html><body><ul>
+<li>app.rb -- 1 warning:</li>
+<li>[4, 6]:DuplicateMethodCall: Foo#bar calls 'x' 2 times [https://x/y.md]</li>
+</ul></body></html>
+"""
+
+
+class NormalizedFindings(unittest.TestCase):
+    def parse(self, parser, text):
+        return list(parser().parse(io.StringIO(text)))
+
+    def test_compact_record(self):
+        finding = Finding('tool', 'rule', 'error', './a.c', '1', 'msg')
+        with self.assertRaises(AttributeError):
+            finding.target = 'app'
+        self.assertEqual(finding.file, 'a.c')
+        moved = Finding('tool', 'rule', 'error', 'a.c', 10, 'msg')
+        self.assertEqual(finding.fingerprint, moved.fingerprint)
+
+    def test_parsers(self):
+        cppcheck = self.parse(CppcheckParser, CPPCHECK)
+        self.assertEqual([(f.rule, f.severity, f.file, f.line)
+                          for f in cppcheck],
+                         [('nullPointer', 'error', 'main.c', 7),
+                          ('unusedFunction', 'note', 'lib/util.c', 2)])
+        bandit = self.parse(BanditParser, BANDIT)
+        self.assertEqual([(f.rule, f.severity, f.file, f.line, f.message)
+                          for f in bandit],
+                         [('B608', 'warning', 'app/db.py', 12,
+                           'Possible SQL injection vector.'),
+                          ('B102', 'error', 'main.py', 3,
+                           'Use of exec detected.')])
+        eslint = self.parse(EslintParser, ESLINT)
+        self.assertEqual([(f.rule, f.severity, f.line) for f in eslint],
+                         [('no-unused-vars', 'error', 1),
+                          ('no-console', 'warning', 3)])
+        self.assertEqual(eslint[0].file, '/home/javascript/app/index.js')
+        phan = self.parse(PhanParser, PHAN)
+        self.assertEqual((phan[0].rule, phan[0].file, phan[0].line),
+                         ('PhanUndeclaredVariable', 'index.php', 4))
+        shellcheck = self.parse(ShellcheckParser, SHELLCHECK)
+        self.assertEqual((shellcheck[0].rule, shellcheck[0].file,
+                          shellcheck[0].line), ('SC2086', 'a.sh', 3))
+        reek = self.parse(ReekParser, REEK)
+        self.assertEqual((reek[0].rule, reek[0].file, reek[0].line,
+                          reek[0].message),
+                         ('DuplicateMethodCall', 'app.rb', 4,
+                          "Foo#bar calls 'x' 2 times"))
+
+    def test_jsonl_round_trip(self):
+        findings = self.parse(CppcheckParser, CPPCHECK)
+        stream = io.StringIO()
+        self.assertEqual(write_jsonl(findings, stream, 'app'), 2)
+        stream.seek(0)
+        self.assertEqual(list(read_jsonl(stream)),
+                         [('app', finding) for finding in findings])
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            root = pathlib.Path(directory)
+            (root / 'result.xml').write_text(CPPCHECK)
+            (root / 'bandit.html').write_text(BANDIT)
+            export = FindingsExport(sarif_path=root / 'findings.sarif')
+            export.add(REGISTRY.parse_results('CL', root), 'c')
+            export.add(REGISTRY.parse_results('PYTHON', root), 'py')
+            export.close()
+            sarif = json.loads((root / 'findings.sarif').read_text())
+        self.assertEqual(sarif['version'], '2.1.0')
+        self.assertEqual([run['tool']['driver']['name']
+                          for run in sarif['runs']], ['cppcheck', 'bandit'])
+        result = sarif['runs'][0]['results'][0]
+        self.assertEqual(result['ruleId'], 'nullPointer')
+        self.assertEqual(result['locations'][0]['physicalLocation'],
+                         {'artifactLocation': {'uri': 'c/main.c'},
+                          'region': {'startLine': 7}})
+        self.assertEqual(len(sarif['runs'][1]['results']), 2)
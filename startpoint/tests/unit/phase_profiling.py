@@ -0,0 +1,104 @@
+""" This test module is created by Martin Vasko.
+    Phases of run are measured per target, printed as breakdown and written
+    as Chrome trace events.
+"""
+
+import asyncio
+import json
+import pathlib
+import tempfile
+import unittest
+from secpo.build_log import BuildLog
+from secpo.docker_backend import CliBackend
+from secpo.path_operation import PathOperation
+from secpo.profiler import Profiler, timed
+from secpo.virtual_starter import VirtualStarter
+
+CLASSIC_BUILD = ['Step 1/3 : FROM secpo-base-cl:0123456789ab',
+                 ' ---> 0123456789ab',
+                 'Step 2/3 : COPY main.c /cppcheck/',
+                 ' ---> 0123456789ac',
+                 'Step 3/3 : RUN cppcheck --xml . 2> result.xml',
+                 ' ---> 0123456789ad',
+                 'Successfully tagged cl0:latest']
+BUILDKIT_BUILD = ['#4 [1/2] FROM docker.io/library/ubuntu:latest',
+                  '#4 DONE 0.1s',
+                  '#5 [2/2] RUN apt-get install -y cppcheck',
+                  '#5 DONE 1.0s',
+                  '#6 naming to docker.io/library/base done']
+
+
+class MockBackend(CliBackend):
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        build_log = BuildLog(on_event, echo=False)
+        lines = BUILDKIT_BUILD if dockerfile else CLASSIC_BUILD
+        for line in lines:
+            build_log.feed(line)
+        return build_log.last_line, build_log.succeeded
+
+
+class MockPhases:
+    def __init__(self, profiler):
+        """ Initialize """
+        self.profiler = profiler
+
+    @timed(Profiler.DISCOVERY)
+    def discover(self, value):
+        return value
+
+
+class PhaseProfilingTest(unittest.TestCase):
+    def test_build_phases(self):
+        starter = VirtualStarter({})
+        starter.backend = MockBackend()
+        starter.profiler = Profiler()
+        events = []
+        asyncio.run(starter.docker_build('target', 'cl0',
+                                         on_event=events.append))
+        asyncio.run(starter.docker_build('base', 'base',
+                                         PathOperation.BASE_DOCKERFILE))
+        breakdown = starter.profiler.breakdown()
+        self.assertEqual([Profiler.IMAGE_PULL, Profiler.COPY_SOURCES,
+                          Profiler.ANALYSIS], list(breakdown['target']))
+        self.assertEqual([Profiler.IMAGE_PULL, Profiler.TOOL_INSTALL],
+                         list(breakdown['base']))
+        # Events are passed to other callback as well
+        self.assertIn(BuildLog.SUCCESS, [event.kind for event in events])
+
+    def test_report_and_trace(self):
+        profiler = Profiler()
+        self.assertEqual('done', MockPhases(profiler).discover('done'))
+        with profiler.span(Profiler.DOCKER_CP, 'target'):
+            pass
+        with profiler.span(Profiler.DOCKER_CP, 'target'):
+            pass
+        report = profiler.report()
+        self.assertIn(Profiler.DISCOVERY, report)
+        self.assertEqual(2, profiler.breakdown()['target'][
+                Profiler.DOCKER_CP][0])
+        with tempfile.TemporaryDirectory() as directory:
+            trace_file = pathlib.Path(directory) / 'trace.json'
+            profiler.write_trace(trace_file)
+            trace = json.loads(trace_file.read_text())
+        events = trace['traceEvents']
+        spans = [event for event in events if event['ph'] == 'X']
+        self.assertEqual(3, len(spans))
+        self.assertTrue(all(event['dur'] >= 0 and event['ts'] >= 0
+                            for event in spans))
+        names = {event['args']['name'] for event in events
+                 if event['ph'] == 'M'}
+        self.assertEqual({Profiler.RUN, 'target'}, names)
+
+    def test_disabled_profiler(self):
+        profiler = Profiler(enabled=False)
+        with profiler.span(Profiler.CLEANUP):
+            pass
+        phases = profiler.build_phases('target', Profiler.ANALYSIS)
+        phases(BuildLog(echo=False).feed(CLASSIC_BUILD[0]))
+        phases.finish()
+        self.assertEqual([], profiler.spans)
+
+
+if __name__ == '__main__':
+    unittest.main()
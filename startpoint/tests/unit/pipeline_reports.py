@@ -0,0 +1,51 @@
+""" This test module is created by Martin Vasko.
+    Docker and vagrant pipelines run at the same time with own budgets and
+    their jobs are collected into one combined report.
+"""
+
+import asyncio
+import unittest
+from secpo.job_scheduler import JobScheduler
+from secpo.pipeline_report import PipelineReport
+
+
+class PipelineReports(unittest.TestCase):
+    def test_vm_budget(self):
+        self.assertLessEqual(
+                JobScheduler.default_jobs(JobScheduler.VM_MEMORY_PER_JOB,
+                                          JobScheduler.VM_CPUS_PER_JOB),
+                JobScheduler.default_jobs())
+
+    def test_combined_report(self):
+        async def job(result, delay=0):
+            await asyncio.sleep(delay)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        async def pipeline(report, name, jobs, results):
+            scheduler = JobScheduler(jobs)
+            for target, result in results:
+                report.track(name, target,
+                             scheduler.submit((job, result, 0.01)))
+            await scheduler.join()
+
+        async def scenario(report):
+            report.cached(report.DOCKER, 'PHP')
+            await asyncio.gather(
+                    pipeline(report, report.DOCKER, 2,
+                             [('PYTHON', None), ('CL', False)]),
+                    pipeline(report, report.VAGRANT, 1,
+                             [('CL', None), ('CPP', OSError('vagrant'))]))
+
+        report = PipelineReport()
+        asyncio.run(scenario(report))
+        self.assertEqual(report.states(report.DOCKER),
+                         {'PHP': report.CACHED, 'PYTHON': report.DONE,
+                          'CL': report.FAILED})
+        self.assertEqual(report.states(report.VAGRANT),
+                         {'CL': report.DONE, 'CPP': report.FAILED})
+        self.assertFalse(report.succeeded())
+        summary = report.summary().splitlines()
+        self.assertEqual(summary[1].split(), ['docker', '3', '1', '1', '1'])
+        self.assertEqual(summary[2].split(), ['vagrant', '2', '1', '0', '1'])
@@ -0,0 +1,79 @@
+""" This test module is created by Martin Vasko.
+    Results are cached by content of analysed files and rendered
+    configuration. Check hits, misses and eviction of least recently used
+    entries.
+"""
+
+import os
+import pathlib
+import tempfile
+import unittest
+from secpo.result_cache import ResultCache
+from secpo.result_retriever import ResultRetriever
+
+
+class MockConfigCreator:
+    path_components = {}
+
+    def docker_workdir(self, key):
+        return '/usr/src/app'
+
+
+class ResultCaching(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        self.source = self.root / 'app'
+        self.source.mkdir()
+        self.file = self.source / 'main.c'
+        self.file.write_text('int main() { return 0; }')
+        self.result = self.root / 'result.xml'
+        self.result.write_text('<results/>')
+        self.cache = ResultCache(self.root / 'cache')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key_changes_with_content(self):
+        key = self.cache.key(self.source, [self.file], 'FROM ubuntu')
+        self.assertEqual(key, self.cache.key(self.source, [self.file],
+                                             'FROM ubuntu'))
+        self.assertNotEqual(key, self.cache.key(self.source, [self.file],
+                                                'FROM debian'))
+        self.file.write_text('int main() { return 1; }')
+        self.assertNotEqual(key, self.cache.key(self.source, [self.file],
+                                                'FROM ubuntu'))
+
+    def test_store_and_restore(self):
+        key = self.cache.key(self.source, [self.file])
+        self.assertIsNone(self.cache.restore(key, self.root / 'out'))
+        self.cache.store(key, [self.result])
+        restored = self.cache.restore(key, self.root / 'out')
+        self.assertEqual([file.name for file in restored], ['result.xml'])
+        self.assertEqual(restored[0].read_text(), '<results/>')
+
+    def test_disabled_cache(self):
+        cache = ResultCache(self.root / 'cache', enabled=False)
+        cache.store('key', [self.result])
+        self.assertIsNone(cache.lookup('key'))
+
+    def test_least_recently_used_eviction(self):
+        self.result.write_bytes(b'x' * 600 * 1024)
+        cache = ResultCache(self.root / 'cache', max_size=1)
+        cache.store('old', [self.result])
+        os.utime(str(cache.directory / 'old'), (0, 0))
+        cache.store('new', [self.result])
+        self.assertIsNone(cache.lookup('old'))
+        self.assertIsNotNone(cache.lookup('new'))
+
+    def test_declared_artifacts_stored(self):
+        retriever = ResultRetriever(result_cache=self.cache)
+        retriever.config_creator = MockConfigCreator()
+        results = retriever.result_directory(self.source, 'PYTHON')
+        results.mkdir()
+        (results / 'bandit.html').write_text('<html></html>')
+        (results / 'notes.txt').write_text('not an artifact')
+        key = self.cache.key(self.source, [self.file])
+        retriever.collect_results(self.source, 'PYTHON', key)
+        restored = self.cache.restore(key, self.root / 'out')
+        self.assertEqual(['bandit.html'], [file.name for file in restored])
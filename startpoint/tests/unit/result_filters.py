@@ -0,0 +1,96 @@
+""" This test module is created by Martin Vasko.
+    Result filters are compiled into indexed rule set which suppresses
+    findings of analysers while they are streamed.
+"""
+
+import pathlib
+import tempfile
+import unittest
+from secpo.findings import Finding
+from secpo.result_filter import FilterEngine, FilterRule
+from secpo.result_retriever import ResultHighlighter
+
+FILTERS = """<?xml version="1.0" encoding="UTF-8"?>
+<filters>
+    <filter name="tests" path="tests/*"/>
+    <filter name="unused" tool="cppcheck" rule="unusedFunction"/>
+</filters>
+"""
+LINES = """# Suppressed by message
+tool=bandit message="(?i)assert used"
+"""
+
+
+class MockFilterRule(FilterRule):
+    def __init__(self, *args, **kwargs):
+        """ Initialize """
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def matches(self, finding):
+        self.calls += 1
+        return super().matches(finding)
+
+
+def findings():
+    return [Finding('cppcheck', 'unusedFunction', 'note', 'lib/a.c', 2,
+                    'Unused'),
+            Finding('cppcheck', 'nullPointer', 'error', './tests/b.c', 7,
+                    'Null pointer'),
+            Finding('bandit', 'B101', 'note', 'app/main.py', 3,
+                    'Assert used in code'),
+            Finding('cppcheck', 'nullPointer', 'error', 'src/c.c', 9,
+                    'Null pointer')]
+
+
+class ResultFilterTest(unittest.TestCase):
+    def test_load_rules(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory = pathlib.Path(directory)
+            filters_file = directory / 'filters.xml'
+            filters_file.write_text(FILTERS)
+            filter_dir = directory / 'result_filters'
+            filter_dir.mkdir()
+            (filter_dir / 'bandit.txt').write_text(LINES)
+            rules = FilterEngine.load(filters_file, filter_dir)
+        self.assertEqual(['tests', 'unused', 'tool=bandit message=(?i)assert '
+                          'used'], [rule.name for rule in rules])
+        engine = FilterEngine(rules)
+        kept = list(engine.apply(findings()))
+        self.assertEqual(['src/c.c'], [finding.file for finding in kept])
+        self.assertEqual(1, engine.hits['tests'])
+        self.assertEqual(1, engine.hits['unused'])
+        self.assertEqual(4, engine.evaluated)
+        self.assertIn('suppressed 3', engine.summary())
+
+    def test_rules_are_indexed(self):
+        unused = MockFilterRule('unused', tool='cppcheck',
+                                rule='unusedFunction')
+        fingerprint = MockFilterRule('known',
+                                     fingerprint=findings()[3].fingerprint)
+        bandit = MockFilterRule('bandit', tool='bandit', rule='B101')
+        engine = FilterEngine([unused, fingerprint, bandit])
+        kept = list(engine.apply(findings()))
+        self.assertEqual(['tests/b.c'], [finding.file for finding in kept])
+        self.assertEqual(1, unused.calls)
+        self.assertEqual(1, bandit.calls)
+        self.assertEqual(1, fingerprint.calls)
+
+    def test_rule_without_criterion(self):
+        with self.assertRaises(ValueError):
+            FilterRule('empty')
+
+    def test_highlighter_applies_engine(self):
+        calls = []
+        engine = FilterEngine([FilterRule(rule='nullPointer')])
+        highlighter = ResultHighlighter(calls.append, 'config',
+                                        filter_engine=engine)
+        kept = list(highlighter.highlight(findings()))
+        self.assertEqual(['unusedFunction', 'B101'],
+                         [finding.rule for finding in kept])
+        self.assertEqual(['config'], calls)
+        self.assertEqual(2, engine.hits['rule=nullPointer'])
+
+
+if __name__ == '__main__':
+    unittest.main()
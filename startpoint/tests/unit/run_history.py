@@ -0,0 +1,74 @@
+""" This test module is created by Martin Vasko.
+    Runs with their targets and findings are recorded in SQLite history
+    which is queried without reading any result files.
+"""
+
+import pathlib
+import tempfile
+import unittest
+from secpo.findings import Finding
+from secpo.history_store import HistoryStore
+
+
+def findings(count, rule='nullPointer'):
+    return [Finding('cppcheck', rule, 'error', 'src/file{}.c'.format(index),
+                    index + 1, 'Message') for index in range(count)]
+
+
+class RunHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = pathlib.Path(self.directory.name) / 'history.sqlite3'
+        self.target = pathlib.Path(self.directory.name) / 'target'
+        self.store = HistoryStore(self.database)
+        self.store.BATCH_SIZE = 10
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def record_run(self, run_id, count, rule='nullPointer', status=0):
+        self.store.start_run(run_id, {'input': [str(self.target)]})
+        passed = list(self.store.stage(findings(count, rule), self.target))
+        self.assertEqual(count, len(passed))
+        self.store.record_targets([('docker', HistoryStore.target(
+                self.target), 'CL', 'cl0', 'done', 1.0, 2.0)])
+        self.store.finish_run(status)
+
+    def test_history_and_query(self):
+        self.record_run('first', 25)
+        self.record_run('second', 3, rule='uninitvar', status=1)
+        history = self.store.history()
+        self.assertEqual(['second', 'first'],
+                         [run['run_id'] for run in history])
+        self.assertEqual([3, 25], [run['findings'] for run in history])
+        self.assertEqual([1, 0], [run['status'] for run in history])
+        self.assertEqual(1, history[0]['targets'])
+        target = HistoryStore.target(self.target)
+        self.assertEqual(2, len(self.store.history(target=target)))
+        self.assertEqual([], self.store.history(target='/other'))
+        rows = self.store.query(rule='uninitvar')
+        self.assertEqual(3, len(rows))
+        self.assertEqual({'second'}, {row['run_id'] for row in rows})
+        rows = self.store.query(target=target, file='src/file7.c')
+        self.assertEqual(['first'], [row['run_id'] for row in rows])
+        self.assertEqual(5, len(self.store.query(run_id='first', limit=5)))
+
+    def test_same_run_is_replaced(self):
+        self.record_run('release', 5)
+        self.record_run('release', 2)
+        self.assertEqual(1, len(self.store.history()))
+        self.assertEqual(2, len(self.store.query()))
+
+    def test_wal_and_indexes(self):
+        connection = self.store._connection
+        self.assertEqual('wal', connection.execute(
+                'PRAGMA journal_mode').fetchone()[0])
+        plan = ' '.join(str(row) for row in connection.execute(
+                'EXPLAIN QUERY PLAN ' + HistoryStore.QUERY.format(
+                        where='WHERE findings.rule = ?'), ['rule', 10]))
+        self.assertIn('findings_rule', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
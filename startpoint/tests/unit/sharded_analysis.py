@@ -0,0 +1,217 @@
+""" This test module is created by Martin Vasko.
+    Analysed files of large directory are split into balanced shards that
+    are analysed in parallel containers and their findings are merged
+    without duplicates. Merged artifacts are stored in result cache.
+"""
+
+import asyncio
+import io
+import json
+import pathlib
+import tempfile
+import unittest
+from secpo.batch import BatchRunner
+from secpo.docker_backend import CliBackend
+from secpo.docker_configuration import ConfigCreator
+from secpo.findings import FindingsExport, read_jsonl
+from secpo.path_operation import PathOperation
+from secpo.result_cache import ResultCache
+from secpo.result_retriever import ResultRetriever
+from secpo.run_facade import RunFacade, SharedSubsystems
+from secpo.sharding import ShardPlanner
+from secpo.virtual_starter import VirtualStarter
+from tests.unit.batch_analysis import MockBackend as BatchBackend
+from tests.unit.result_caching import MockConfigCreator
+from tests.unit.source_discovery import command_line_args
+
+CPPCHECK = """<?xml version="1.0" encoding="UTF-8"?>
+<results version="2">
+    <cppcheck version="1.90"/>
+    <errors>
+        <error id="nullPointer" severity="error" msg="Null pointer"
+               verbose="Null pointer dereference">
+            <location file="{file}" line="7" column="3"/>
+        </error>
+        <error id="unusedStructMember" severity="style" msg="Unused"
+               verbose="Struct member is never used.">
+            <location file="common.h" line="2" column="1"/>
+        </error>
+    </errors>
+</results>
+"""
+
+
+class MockBackend(CliBackend):
+    def __init__(self):
+        """ Initialize """
+        super(MockBackend, self).__init__()
+        self.dockerfiles = []
+
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        self.dockerfiles.append(dockerfile)
+        return '', True
+
+    async def create(self, name, image):
+        return True
+
+    async def disconnect(self, network, container):
+        return True
+
+    async def copy_from(self, container, source, destination):
+        # Every shard reports its own file and the shared header
+        number = container[-1]
+        (destination / 'result.xml').write_text(
+                CPPCHECK.format(file='main{}.c'.format(number)))
+        return True
+
+
+class SlotBackend(BatchBackend):
+    def __init__(self):
+        """ Initialize """
+        super(SlotBackend, self).__init__()
+        self.running = set()
+        self.most_running = 0
+
+    async def build(self, path, tag, dockerfile=None, on_event=None,
+                    context=None):
+        if not dockerfile.startswith(PathOperation.BASE_DOCKERFILE):
+            self.running.add(tag)
+            self.most_running = max(self.most_running, len(self.running))
+        await asyncio.sleep(0.01)
+        return await super(SlotBackend, self).build(
+                path, tag, dockerfile, on_event, context)
+
+    async def copy_from(self, container, source, destination):
+        self.running.discard(container)
+        return await super(SlotBackend, self).copy_from(
+                container, source, destination)
+
+
+class ShardedAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, size):
+        file = self.root / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text('x' * size)
+        return file
+
+    def test_balanced_shards(self):
+        files = [self.write('file{}.c'.format(size), size)
+                 for size in [3, 9, 4, 7, 5, 6]]
+        shards = ShardPlanner(2).plan(files)
+        self.assertEqual([17, 17], [shard.weight for shard in shards])
+        self.assertEqual(sorted(files), sorted(shards[0].files +
+                                               shards[1].files))
+        # Files of shard keep order of input
+        self.assertEqual(['file3.c', 'file9.c', 'file5.c'],
+                         [file.name for file in shards[0].files])
+        # Empty shards are left out
+        self.assertEqual(1, len(ShardPlanner(4).plan(files[:1])))
+        lines = self.write('lines.c', 1)
+        lines.write_text('a\nb\nc\n')
+        self.assertEqual(3, ShardPlanner(2, ShardPlanner.LINES)
+                         .weight_of(lines))
+
+    def test_shard_dockerfiles(self):
+        for number in range(4):
+            self.write('main{}.c'.format(number), 100 * (number + 1))
+        self.write('deploy.sh', 10)
+        args = command_line_args([str(self.root)])
+        args.shards = 2
+        path_conf = PathOperation(args)
+        path_conf.resolve_containers()
+        path_conf.create_configuration_files()
+        path_conf.write_configuration(
+                ConfigCreator(path_conf).create_configuration())
+        path = path_conf.path_components['CL'][0]
+        # Languages of the same directory have their own Dockerfiles
+        dockerfiles = path_conf.shard_dockerfiles('CL')
+        self.assertEqual(['Dockerfile.shard0.cl', 'Dockerfile.shard1.cl'],
+                         dockerfiles)
+        self.assertEqual([], path_conf.shard_dockerfiles('SHELL'))
+        analysed = []
+        for dockerfile in dockerfiles:
+            text = (path / dockerfile).read_text()
+            self.assertIn('mkdir -p /secpo/results', text)
+            analysed.append(sorted(
+                    name for name in ['main0.c', 'main1.c', 'main2.c',
+                                      'main3.c', 'deploy.sh']
+                    if ' ' + name in text))
+        self.assertEqual([['main0.c', 'main3.c'], ['main1.c', 'main2.c']],
+                         analysed)
+        path_conf.delete_configurations()
+        self.assertFalse(any(path.glob('Dockerfile*')))
+
+    def test_merged_findings(self):
+        starter = VirtualStarter({})
+        starter.backend = MockBackend()
+        cache = ResultCache(self.root / 'cache')
+        retriever = ResultRetriever(result_cache=cache)
+        retriever.config_creator = MockConfigCreator()
+        retriever.backend = starter.backend
+        jsonl = self.root / 'findings.jsonl'
+        retriever.findings_export = FindingsExport(jsonl)
+        directories = [self.root / 'shard{}'.format(number)
+                       for number in range(2)]
+
+        async def analyse_shards():
+            async def analyse_shard(number):
+                tag = ShardPlanner.tag('cl0', number)
+                await starter.create_container(
+                        self.root, tag,
+                        dockerfile=ShardPlanner.dockerfile(number))
+                return await retriever.copy_results(self.root, tag, 'CL',
+                                                    directories[number])
+            return await asyncio.gather(*[analyse_shard(number)
+                                          for number in range(2)])
+
+        self.assertEqual([True, True], asyncio.run(analyse_shards()))
+        self.assertEqual(['Dockerfile.shard0', 'Dockerfile.shard1'],
+                         starter.backend.dockerfiles)
+        retriever.collect_shards(self.root, 'CL', directories, 'k')
+        retriever.findings_export.close()
+        with jsonl.open() as stream:
+            findings = [finding for _, finding in read_jsonl(stream)]
+        self.assertEqual(['main0.c', 'common.h', 'main1.c'],
+                         [finding.file for finding in findings])
+        # Cached result contains findings of all shards only once
+        restored = cache.restore('k', self.root / 'restored')
+        self.assertEqual(['result.xml'], [file.name for file in restored])
+        merged = (self.root / 'restored' / 'result.xml').read_text()
+        self.assertEqual(1, merged.count('common.h'))
+        self.assertEqual(1, merged.count('<cppcheck '))
+        self.assertIn('main0.c', merged)
+        self.assertIn('main1.c', merged)
+
+    def test_shards_take_own_slots(self):
+        for number in range(4):
+            self.write('app/main{}.c'.format(number), 100 * (number + 1))
+        args = command_line_args([])
+        args.jobs = 1
+        shared = SharedSubsystems(args)
+        backend = shared.run_subsystem.backend = SlotBackend()
+        shared.result_cache = ResultCache(self.root / 'cache')
+        output = io.StringIO()
+        runner = BatchRunner(args, shared, RunFacade, output)
+        manifest = json.dumps({'id': 'app', 'path': str(self.root / 'app'),
+                               'options': {'shards': 2}})
+        self.assertTrue(asyncio.run(runner.run(io.StringIO(manifest))))
+        record = json.loads(output.getvalue())
+        # Single slot of scheduler runs only one shard at once
+        self.assertEqual(1, backend.most_running)
+        self.assertEqual(2, len(backend.contexts))
+        self.assertEqual({'CL': 'done'}, record['targets'])
+        self.assertEqual(['main0.c', 'main1.c', 'main2.c', 'main3.c'],
+                         sorted(finding['file']
+                                for finding in record['findings']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+""" This test module is created by Martin Vasko.
+    Source discovery walks --input directories only once and creates index
+    of files based on the extension. Check that index is used by containers
+    resolution and listing of analysed files.
+"""
+
+import argparse
+import os
+import pathlib
+import tempfile
+import unittest
+from secpo.path_operation import PathOperation
+
+
+def command_line_args(inputs, merge_groups=False):
+    return argparse.Namespace(input=inputs, list_filters=False,
+                              disable_logging=True, result_filter=False,
+                              add_configuration=None, destroy_images=False,
+                              destroy_boxes=False, destroy_everything=False,
+                              merge_groups=merge_groups, no_cache=False,
+                              cache_size=512, incremental=False,
+                              warm_containers=False, pool_size=4,
+                              pool_idle_timeout=300, jobs=2,
+                              vm_jobs=1, docker_backend='cli',
+                              jsonl=None, sarif=None,
+                              baseline=None, run_id=None,
+                              no_history=True, profile=None,
+                              shards=1, shard_weight='size',
+                              coordinator=None)
+
+
+class SourceDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.directory.name)
+        for name in ['app/main.c', 'app/lib/util.h', 'app/script.sh',
+                     'web/index.php', '.vagrant/machines/box.c',
+                     'app/vagrant_result/out.c', 'tools/deploy.sh',
+                     'tools/ci/check.sh']:
+            file = self.root / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text('')
+        self.path_conf = PathOperation(command_line_args([str(self.root)]))
+        self.path_conf.resolve_containers()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ignored_directories(self):
+        files = self.path_conf.indexed_files(['.c', '.h'])
+        names = sorted(file.name for file in files)
+        self.assertEqual(names, ['main.c', 'util.h'])
+
+    def test_resolved_languages(self):
+        self.assertIn('CL', self.path_conf.path_components)
+        self.assertIn('SHELL', self.path_conf.path_components)
+        self.assertIn('PHP', self.path_conf.path_components)
+        self.assertNotIn('PYTHON', self.path_conf.path_components)
+
+    def test_indexed_files_under_path(self):
+        path = self.path_conf.path_components['PHP'][0]
+        files = self.path_conf.indexed_files(['.php', '.c'], path)
+        self.assertEqual([file.name for file in files], ['index.php'])
+        self.assertTrue(all(os.path.isabs(str(file)) for file in files))
+
+    def test_directory_groups(self):
+        components = self.path_conf.path_components
+        self.assertIn('SHELL_1', components)
+        groups = sorted(components[key][0].name for key in components
+                        if self.path_conf.language(key) == 'SHELL')
+        # Nested directory tools/ci is part of tools group
+        self.assertEqual(groups, ['app', 'tools'])
+        self.assertEqual(self.path_conf.language('SHELL_1'), 'SHELL')
+
+    def test_merged_groups(self):
+        path_conf = PathOperation(command_line_args([str(self.root)],
+                                                    merge_groups=True))
+        path_conf.resolve_containers()
+        self.assertNotIn('SHELL_1', path_conf.path_components)
+        self.assertEqual(path_conf.path_components['SHELL'][0], self.root)
+
+    def test_analysed_files_of_group(self):
+        commands, _, _ = self.path_conf.list_analysed_files('SHELL_1')
+        self.assertIn('ci/check.sh', commands)
+        self.assertIn('deploy.sh', commands)
+        self.assertNotIn('script.sh', commands)
+
+    def test_analysis_commands_of_path_language(self):
+        commands, _, _ = self.path_conf.list_analysed_files('CL')
+        self.assertIn('cppcheck', commands)
+        commands, _, _ = self.path_conf.list_analysed_files('SHELL')
+        self.assertIn('shellcheck', commands)
@@ -0,0 +1,52 @@
+""" This test module is created by Martin Vasko.
+    Cppcheck results are parsed incrementally, findings are produced while
+    document is still arriving and processed elements are dropped.
+"""
+
+import io
+import unittest
+from secpo.result_parsers import CppcheckParser
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<results version="2">
+    <cppcheck version="1.90"/>
+    <errors>
+"""
+ERROR = """        <error id="rule{0}" severity="warning" msg="Message {0}">
+            <location file="./src/file{0}.c" line="{0}" column="1"/>
+        </error>
+"""
+FOOTER = """    </errors>
+</results>
+"""
+
+
+class StreamingCppcheckTest(unittest.TestCase):
+    def test_findings_before_document_end(self):
+        parser = CppcheckParser()
+        findings = list(parser.feed(HEADER + ERROR.format(1) +
+                                     ERROR.format(2)[:30]))
+        self.assertEqual(['rule1'], [finding.rule for finding in findings])
+        self.assertEqual('src/file1.c', findings[0].file)
+        findings = list(parser.feed(ERROR.format(2)[30:] + ERROR.format(3)))
+        self.assertEqual(['rule2', 'rule3'],
+                         [finding.rule for finding in findings])
+        self.assertEqual([], list(parser.feed(FOOTER)))
+        self.assertEqual([], list(parser.close()))
+
+    def test_processed_errors_are_removed(self):
+        parser = CppcheckParser()
+        # Only errors started by current chunk stay in tree
+        parser.CHUNK_SIZE = 256
+        document = HEADER + ''.join(ERROR.format(index)
+                                    for index in range(1000)) + FOOTER
+        count = 0
+        for _ in parser.parse(io.BytesIO(document.encode('utf-8'))):
+            count += 1
+            self.assertLessEqual(len(parser._errors), 3)
+        self.assertEqual(1000, count)
+        self.assertEqual(0, len(parser._errors))
+
+
+if __name__ == '__main__':
+    unittest.main()
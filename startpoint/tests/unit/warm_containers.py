@@ -0,0 +1,77 @@
+""" This test module is created by Martin Vasko.
+    Warm containers are reused by targets of the same analyser base image,
+    pool never grows over its maximal size and idle containers are stopped.
+"""
+
+import asyncio
+import unittest
+from secpo.container_pool import ContainerPool, WarmContainer
+
+
+class MockContainerPool(ContainerPool):
+    def __init__(self, max_size, idle_timeout=ContainerPool.IDLE_TIMEOUT):
+        super(MockContainerPool, self).__init__(max_size, idle_timeout)
+        self.started = []
+        self.stopped = []
+
+    async def _start(self, tag):
+        container = WarmContainer('warm' + str(len(self.started)), tag)
+        self.started.append(container)
+        return container
+
+    async def _stop(self, container):
+        self.stopped.append(container)
+
+
+class WarmContainers(unittest.TestCase):
+    def test_analysis_commands(self):
+        dockerfile = 'FROM secpo-base-shell:0\nCOPY . .\n' \
+                     'RUN shellcheck a.sh > result.txt || true\n'
+        self.assertEqual(ContainerPool.analysis_commands(dockerfile),
+                         ['shellcheck a.sh > result.txt || true'])
+
+    def test_reuse_container(self):
+        async def scenario(pool):
+            first = await pool.acquire('php')
+            await pool.release(first)
+            second = await pool.acquire('php')
+            await pool.release(second)
+            await pool.close()
+            return first, second
+
+        pool = MockContainerPool(2)
+        first, second = asyncio.run(scenario(pool))
+        self.assertIs(first, second)
+        self.assertEqual(len(pool.started), 1)
+
+    def test_maximal_size(self):
+        async def scenario(pool):
+            first = await pool.acquire('php')
+            waiting = asyncio.ensure_future(pool.acquire('php'))
+            await asyncio.sleep(0)
+            self.assertFalse(waiting.done())
+            await pool.release(first)
+            second = await waiting
+            await pool.release(second)
+            # Idle container of other image is replaced
+            third = await pool.acquire('bash')
+            await pool.release(third)
+            await pool.close()
+            return first, second, third
+
+        pool = MockContainerPool(1)
+        first, second, third = asyncio.run(scenario(pool))
+        self.assertIs(first, second)
+        self.assertEqual(third.tag, 'bash')
+        self.assertIn(first, pool.stopped)
+
+    def test_idle_timeout(self):
+        async def scenario(pool):
+            container = await pool.acquire('php')
+            await pool.release(container)
+            await asyncio.sleep(1.5)
+            return container
+
+        pool = MockContainerPool(1, idle_timeout=0)
+        container = asyncio.run(scenario(pool))
+        self.assertEqual(pool.stopped, [container])